@@ -1,10 +1,12 @@
-import requests
-import json
-import pandas as pd
-from datetime import datetime
 import time
 import math
 
+import bar_store
+import kis_client
+import kis_trace
+import order_queue
+import reconcile
+
 # =========================================================
 # [사용자 설정] 키 값 및 보유 달러 입력
 # =========================================================
@@ -14,94 +16,75 @@ APP_SECRET = "ilAbHXcqmvdzZmmXjl/xdBGCaR4hEo8wL7COom87V6POUMuQP8XvdFpzaPE4KUKDqH
 CANO = "63775153"        # 계좌번호 앞 8자리
 ACNT_PRDT_CD = "01"      # 계좌번호 뒤 2자리
 
-# [중요] 봇이 돈을 못 찾을 때를 대비한 수동 입력값
+# [중요] 봇이 돈을 못 찾을 때를 대비한 수동 입력값 (주문 가능 금액 조회가 실패할 때만 사용)
 MANUAL_CASH = 1922.39  
 # =========================================================
 
-URL_BASE = "https://openapi.koreainvestment.com:9443"
+ORDER_MARKUP = 0.05   # 지정가를 현재가보다 5% 불리하게 (매수 +5%, 매도 -5%) -> 시장가처럼 체결
+SETTLE_WAIT = 60      # 매도 후 대금이 주문 가능 금액에 잡히기를 기다리는 최대 시간 (초)
+SETTLE_POLL = 3
+STRATEGY_TICKERS = ("UPRO", "SPY")   # 봇이 사고파는 종목 (다른 보유 종목은 건드리지 않음)
 
-def get_access_token():
-    headers = {"content-type": "application/json"}
-    body = {"grant_type": "client_credentials", "appkey": APP_KEY, "appsecret": APP_SECRET}
-    try:
-        res = requests.post(f"{URL_BASE}/oauth2/tokenP", headers=headers, data=json.dumps(body))
-        return res.json()['access_token']
-    except: return None
+def get_client():
+    """토큰(디스크 캐시)과 연결을 재사용하는 KIS 클라이언트 (접속 주소: KIS_URL_BASE)"""
+    return kis_client.get_client(APP_KEY, APP_SECRET)
 
-def get_hashkey(datas):
-    url = f"{URL_BASE}/uapi/hashkey"
-    headers = {"content-type": "application/json", "appKey": APP_KEY, "appSecret": APP_SECRET}
-    res = requests.post(url, headers=headers, data=datas)
-    return res.json()["HASH"]
+def get_access_token(client):
+    try:
+        return client.token()
+    except Exception as e:
+        print(f"❌ 토큰 발급 실패: {e}")
+        return None
 
-def get_current_price(token, ticker):
+def get_current_price(client, ticker):
     """현재가 조회"""
-    headers = {
-        "content-type": "application/json",
-        "authorization": f"Bearer {token}",
-        "appKey": APP_KEY,
-        "appSecret": APP_SECRET,
-        "tr_id": "HHDFS76200200"
-    }
-    # 시세 조회는 AMS, NAS, NYS 순으로 확인
-    for exchange in ["AMS", "NAS", "NYS"]:
+    # 기억한 거래소 먼저, 없으면 AMS, NAS, NYS 순으로 확인
+    exchanges = kis_client.get_exchange_map()
+    for exchange in exchanges.candidates(ticker, ["AMS", "NAS", "NYS"]):
         params = {"AUTH": "", "EXCD": exchange, "SYMB": ticker}
-        res = requests.get(f"{URL_BASE}/uapi/overseas-price/v1/quotations/price", headers=headers, params=params)
+        res = client.get("/uapi/overseas-price/v1/quotations/price", "HHDFS76200200", params)
         if res.status_code == 200:
             data = res.json()
             if data['output'] and data['output']['last']:
-                # 시세 조회된 거래소와 상관없이 가격만 리턴
+                exchanges.learn(ticker, exchange)
                 return float(data['output']['last'])
     return None
 
-def get_spy_ma200(token):
+def get_spy_ma200(client):
+    """SPY 마지막 종가와 200일선 (로컬에 저장한 일봉 + KIS에서 새 봉만 받음)"""
     print("📊 SPY 차트 분석 중...")
-    headers = {
-        "content-type": "application/json",
-        "authorization": f"Bearer {token}",
-        "appKey": APP_KEY,
-        "appSecret": APP_SECRET,
-        "tr_id": "HHDFS76240000"
-    }
-    today = datetime.now().strftime("%Y%m%d")
-    
-    for exc in ["NYS", "AMS", "NAS"]:
-        params = {"EXCD": exc, "SYMB": "SPY", "GUBN": "D", "BYMD": today, "MODP": "1"}
-        res = requests.get(f"{URL_BASE}/uapi/overseas-price/v1/quotations/dailyprice", headers=headers, params=params)
-        data = res.json()
-        
-        if res.status_code == 200 and 'output2' in data and len(data['output2']) > 0:
-            df = pd.DataFrame(data['output2'])
-            df['clos'] = pd.to_numeric(df['clos'])
-            ma200 = df['clos'].head(200).mean() if len(df) >= 200 else df['clos'].mean()
-            current_price = float(data['output2'][0]['clos'])
-            print(f"✅ 차트 조회 성공 ({exc})")
-            return current_price, ma200
-            
-    print("❌ SPY 차트 데이터 조회 실패")
-    return None, None
-
-def send_order_robust(token, ticker, qty, side):
-    """[핵심] 거래소를 바꿔가며 주문이 될 때까지 시도"""
+    store = bar_store.get_store(bar_store.KIS_BAR_DIR)
+    signal = store.ma_signal("SPY", 200, bar_store.kis_reader(client), refresh_hours=0)
+    if not signal['fresh']:
+        print(f"   ⚠️ 새 봉 조회 실패 - 저장된 봉({signal['date']})으로 계산: {signal['error']}")
+
+    if signal['ma'] is None:
+        print(f"❌ SPY 차트 데이터 부족 ({signal['bars']}일)")
+        return None, None
+    print(f"✅ 차트 조회 성공 ({signal['bars']}봉, 마지막 {signal['date']})")
+    return signal['price'], signal['ma']
+
+def send_order_robust(client, ticker, qty, side, price=None):
+    """[핵심] 거래소를 바꿔가며 주문이 될 때까지 시도 (price: 방금 조회한 현재가가 있으면 재조회 생략)"""
     side_str = "매수" if side == "buy" else "매도"
     tr_id = "TTTT1002U" if side == "buy" else "TTTT1006U"
     
     # 1. 현재가 조회
-    curr_price = get_current_price(token, ticker)
+    curr_price = price or get_current_price(client, ticker)
     if not curr_price:
         print(f"❌ {ticker} 가격 조회 실패")
         return False
 
     # 지정가 (매수+5%) -> 시장가처럼 체결됨
-    if side == "buy": order_price = round(curr_price * 1.05, 2)
-    else: order_price = round(curr_price * 0.95, 2)
+    if side == "buy": order_price = round(curr_price * (1 + ORDER_MARKUP), 2)
+    else: order_price = round(curr_price * (1 - ORDER_MARKUP), 2)
     
     print(f"   ㄴ 💰 현재가: ${curr_price} -> 넉넉한 주문가: ${order_price}")
 
-    # 2. [핵심] 거래소 3곳 모두 시도 (NAS -> NYS -> AMS)
-    exchanges_to_try = ["NAS", "NYS", "AMS"]
+    # 2. 기억한 거래소로 바로 주문, 거절되면 나머지 거래소 시도 (NAS -> NYS -> AMS)
+    exchanges = kis_client.get_exchange_map()
     
-    for exchange in exchanges_to_try:
+    for exchange in exchanges.candidates(ticker, ["NAS", "NYS", "AMS"]):
         print(f"🔄 [{ticker}] ({exchange}) {side_str} 시도... ({qty}주)")
 
         order_dict = {
@@ -115,23 +98,12 @@ def send_order_robust(token, ticker, qty, side):
             "ORD_DVSN": "00"
         }
 
-        json_body = json.dumps(order_dict, separators=(',', ':'))
-        hashkey = get_hashkey(json_body)
-
-        headers = {
-            "content-type": "application/json; charset=utf-8",
-            "authorization": f"Bearer {token}",
-            "appKey": APP_KEY,
-            "appSecret": APP_SECRET,
-            "tr_id": tr_id,
-            "hashkey": hashkey
-        }
-
-        res = requests.post(f"{URL_BASE}/uapi/overseas-stock/v1/trading/order", headers=headers, data=json_body)
+        res = client.post("/uapi/overseas-stock/v1/trading/order", tr_id, order_dict, hashkey=True)
         result = res.json()
 
         if result['rt_cd'] == '0':
-            print(f"✅ {ticker} {side_str} 성공! (거래소: {exchange}, 번호: {result['output']['ODNO']})")
+            exchanges.learn(ticker, exchange)
+            print(f"✅ {ticker} {side_str} 주문 접수! (거래소: {exchange}, 번호: {result['output']['ODNO']})")
             return True
         else:
             print(f"   ㄴ 실패: {result['msg1']}")
@@ -140,44 +112,118 @@ def send_order_robust(token, ticker, qty, side):
     print(f"❌ {ticker} 최종 주문 실패 (모든 거래소 거절됨)")
     return False
 
-def main():
-    print(f"🤖 [SPY 200일선 봇] 가동 (현금: ${MANUAL_CASH})")
-    token = get_access_token()
-    if not token: return
+def place_leg(client):
+    """order_queue용 주문 함수 (leg 하나 -> send_order_robust)"""
+    return lambda leg: send_order_robust(client, leg.symbol, leg.qty, leg.side, price=leg.price)
+
+def size_buys(client, cash_before):
+    """
+    order_queue용: 매도를 보낸 뒤 매수 전에 주문 가능 금액을 다시 조회해서 매수 수량을 맞춤
+    매도 대금이 잡힐 때까지 최대 SETTLE_WAIT초 기다리고, 그래도 모자라면 비율대로 줄입니다.
+    (기다리는 기준: 필요 금액, 또는 매도 지정가로 받을 최소 대금이 현금에 더해진 금액 중 작은 쪽)
+    """
+    def resize(buys, sells):
+        needed = sum(leg.qty * leg.price * (1 + ORDER_MARKUP) for leg in buys)
+        proceeds = sum(leg.qty * leg.price * (1 - ORDER_MARKUP) for leg in sells if leg.ok)
+        expected = min(needed, cash_before + proceeds * 0.99)  # 수수료 여유
+        deadline = time.time() + SETTLE_WAIT
+        cash = None
+        while True:
+            try:
+                cash = reconcile.fetch_cash(client, CANO, ACNT_PRDT_CD)
+            except kis_client.KisError as e:
+                print(f"   ⚠️ 주문 가능 금액 조회 실패: {e}")
+            if (cash is not None and cash >= expected) or time.time() >= deadline:
+                break
+            time.sleep(SETTLE_POLL)
+
+        if cash is None:
+            print("❌ 매도 후 주문 가능 금액을 확인하지 못해 매수를 보류합니다.")
+            return []
+        if cash < needed:
+            scale = cash / needed
+            for leg in buys:
+                leg.qty = int(leg.qty * scale)
+            print(f"💵 매도 후 주문 가능 ${cash:,.2f} (필요 ${needed:,.2f}) -> 매수 수량 조정")
+        return buys
+    return resize
+
+def verify_legs(client, before):
+    """결과를 모르는 주문을 잔고로 확인 (before: 주문 전 보유 수량, 수량이 그만큼 바뀌었으면 체결된 것)"""
+    def verify(legs):
+        after = reconcile.get_snapshot(client, CANO, ACNT_PRDT_CD, refresh=True).quantities()
+        out = []
+        for leg in legs:
+            change = after.get(leg.symbol, 0) - before.get(leg.symbol, 0)
+            out.append((change if leg.side == "buy" else -change) >= leg.qty or None)
+        return out
+    return verify
 
-    # 1. 시장 판단
-    spy_price, ma200 = get_spy_ma200(token)
-    if not spy_price: return
+def main():
+    print("🤖 [SPY 200일선 봇] 가동")
+    client = get_client()
+    if not get_access_token(client): return
+
+    # 1. 시장 판단 + 후보 종목 시세 + 잔고를 동시에 조회 (가장 느린 호출 하나만큼만 기다림)
+    results = kis_client.fetch_all({
+        "chart": (get_spy_ma200, client),
+        "UPRO": (get_current_price, client, "UPRO"),
+        "SPY": (get_current_price, client, "SPY"),
+        "account": (reconcile.get_snapshot, client, CANO, ACNT_PRDT_CD),
+    })
+    for name, value in results.items():
+        if isinstance(value, Exception):
+            print(f"❌ {name} 조회 오류: {value}")
+    if isinstance(results["chart"], Exception): return
+    spy_close, ma200 = results["chart"]
+    if not spy_close: return
+    prices = {t: (None if isinstance(results[t], Exception) else results[t]) for t in ("UPRO", "SPY")}
+    spy_price = prices["SPY"] or spy_close  # 현재가가 없으면 마지막 종가
 
     print(f"📊 SPY 현재가: ${spy_price} | 200일선: ${ma200:.2f}")
     is_bull_market = spy_price >= ma200
     
-    # 잔고 표시는 생략 (API 오류 방지)
-
-    # 3. 매매 실행
-    if is_bull_market:
-        print("🚀 [상승장] -> UPRO 매수")
-        
-        # UPRO 풀매수 시도
-        upro_price = get_current_price(token, "UPRO")
-        if upro_price:
-            buy_qty = int(MANUAL_CASH / (upro_price * 1.05))
-            if buy_qty > 0:
-                print(f"💵 현금 ${MANUAL_CASH} -> UPRO {buy_qty}주 매수 시작")
-                send_order_robust(token, "UPRO", buy_qty, "buy")
-            else:
-                print(f"❌ 현금 부족")
-        else:
-            print("❌ UPRO 시세 조회 실패")
-            
+    # 2. 잔고 (주문 가능 금액 조회가 실패하면 MANUAL_CASH)
+    account = results["account"]
+    if isinstance(account, Exception) or account.cash is None:
+        cash = MANUAL_CASH
+        print(f"⚠️ 주문 가능 금액 조회 실패 -> 수동 입력값 ${cash} 사용")
     else:
-        print("🛡️ [하락장] -> SPY 매수")
-        spy_price_curr = get_current_price(token, "SPY")
-        if spy_price_curr:
-            buy_qty = int(MANUAL_CASH / (spy_price_curr * 1.05))
-            if buy_qty > 0:
-                print(f"💵 현금 ${MANUAL_CASH} -> SPY {buy_qty}주 매수 시작")
-                send_order_robust(token, "SPY", buy_qty, "buy")
+        cash = account.cash
+        print(f"💼 보유: {account.quantities() or '없음'} | 주문 가능: ${cash:,.2f}")
+
+    # 3. 매매 실행 (매도 -> 매수 순서, 초당 한도 안에서 동시 주문)
+    before = None if isinstance(account, Exception) else account.quantities()
+    queue = order_queue.OrderQueue(place_leg(client), verify_legs(client, before) if before is not None else None,
+                                   before_buys=size_buys(client, cash))
+    # 목표 종목 100% (다른 쪽 보유분은 매도 -> 그 대금까지 합쳐서 매수)
+    target = "UPRO" if is_bull_market else "SPY"
+    print("🚀 [상승장] -> UPRO" if is_bull_market else "🛡️ [하락장] -> SPY")
+    if not prices[target]:
+        print(f"❌ {target} 시세 조회 실패")
+        return
+
+    # 잔고를 다 읽지 못했으면 보유 종목을 모르므로 매도하지 않고 현금으로만 매수
+    holdings = {}
+    if before is not None and account.complete:
+        holdings = {t: q for t, q in before.items() if t in STRATEGY_TICKERS}
+    elif before is not None:
+        print(f"⚠️ 일부 잔고 조회 실패 {account.errors} -> 매도 없이 현금으로만 매수")
+    legs = order_queue.plan_rebalance({target: 1.0}, holdings, {t: p for t, p in prices.items() if p},
+                                      cash, markup=ORDER_MARKUP)
+    for leg in legs:
+        print(f"💵 {leg.symbol} {leg.qty}주 {'매수' if leg.side == 'buy' else '매도'} 예정 (현재가 ${leg.price})")
+    if not legs:
+        print(f"✅ 이미 {target} 목표 비중입니다. (또는 현금 부족)")
+    queue.extend(legs)
+
+    if queue.legs:
+        queue.run()
+        reconcile.invalidate()  # 잔고가 바뀌었으므로 점검은 새로 조회
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    kis_trace.start_run("auto_trade")
+    try:
+        main()
+    finally:
+        kis_trace.finish()
\ No newline at end of file
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+import pandas as pd
+
+from price_store import PriceStore
+
+# -----------------------------------------------------------------------------
+# 미국 종목 일봉 저장소 + 이동평균 신호 (아침 점검 / 자동매매)
+# -----------------------------------------------------------------------------
+# 예전에는 아침마다 yfinance로 SPY 2년치를 통째로 받아서 200일 평균 하나를 계산했습니다.
+# - 일봉은 price_store.PriceStore(종목별 파일)에 저장하고, 마지막 날짜 이후만 새로 받습니다.
+# - 최근 window개 종가와 그 합을 작은 JSON에 따로 저장해 두고, 새 봉 하나마다 합을 O(1)로 갱신합니다.
+# - 최근에 확인했으면 네트워크 없이 JSON만 읽고 끝납니다. Yahoo가 느리거나 실패하면 저장된 봉으로 계산합니다.
+# 종가는 수정주가가 아닌 실제 종가(auto_adjust=False)를 씁니다. (배당 때 과거 값이 바뀌지 않도록)
+# 자동매매는 같은 방식으로 KIS 일봉(kis_reader)을 KIS_BAR_DIR에 따로 저장합니다.
+
+BAR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "bars")
+KIS_BAR_DIR = os.path.join(
+    os.environ.get("KIS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "kis")),
+    "bars",
+)
+REFRESH_HOURS = float(os.environ.get("BAR_REFRESH_HOURS", "6"))
+YF_TIMEOUT = 5
+HISTORY_YEARS = 2
+MARKET_TZ = 'America/New_York'
+MARKET_CLOSE_HOUR = 16
+
+
+def _session_cutoff():
+    """
+    이 날짜 이전 봉만 끝난 봉 (뉴욕 기준)
+    장 마감(16:00) 전에는 오늘, 마감 후에는 내일 -> 16:10 신호 작업은 방금 끝난 오늘 봉까지 씁니다.
+    """
+    now = pd.Timestamp.now(tz=MARKET_TZ)
+    today = now.normalize().tz_localize(None)
+    return today + pd.Timedelta(days=1) if now.hour >= MARKET_CLOSE_HOUR else today
+
+
+def yf_reader(ticker, start, timeout=YF_TIMEOUT):
+    """
+    yfinance 일봉 (Close, Volume)
+    장중에 받으면 오늘 봉의 종가 자리에 현재가가 들어오므로 장 마감 전에는 뉴욕 기준 오늘 봉을 저장하지 않습니다.
+    """
+    import yfinance as yf
+
+    df = yf.download(ticker, start=start, auto_adjust=False, progress=False, timeout=timeout)
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.xs(ticker, axis=1, level=-1) if ticker in df.columns.get_level_values(-1) else df.droplevel(-1, axis=1)
+    df.index = pd.DatetimeIndex(df.index).tz_localize(None)
+    df = df[[c for c in ('Close', 'Volume') if c in df.columns]].dropna(subset=['Close'])
+    return df.loc[df.index < _session_cutoff()]
+
+
+def kis_reader(client):
+    """
+    KIS 일봉 reader (PriceStore.update용, 여러 페이지)
+    뉴욕 기준 오늘 봉은 장 마감(16:00) 전에는 아직 끝나지 않았으므로 저장하지 않습니다.
+    """
+    import kis_client
+
+    def reader(ticker, start):
+        df = kis_client.daily_history(client, ticker, start=start)
+        return df.loc[df.index < _session_cutoff()]
+    return reader
+
+
+class RunningMean:
+    """최근 window개 값과 그 합 (새 값 하나당 O(1) 갱신)"""
+
+    def __init__(self, window, values=(), last_date=None, checked_at=0.0):
+        self.window = window
+        self.values = deque(values, maxlen=window)
+        self.total = float(sum(self.values))
+        self.last_date = last_date
+        self.checked_at = checked_at
+
+    def push(self, date, value):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+        self.last_date = date
+
+    @property
+    def ready(self):
+        return len(self.values) == self.window
+
+    @property
+    def mean(self):
+        return self.total / len(self.values) if self.values else None
+
+    @property
+    def last(self):
+        return self.values[-1] if self.values else None
+
+    def to_dict(self):
+        return {
+            'window': self.window,
+            'values': list(self.values),
+            'total': self.total,
+            'last_date': self.last_date,
+            'checked_at': self.checked_at,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        rm = cls(d['window'], d['values'], d['last_date'], d.get('checked_at', 0.0))
+        rm.total = float(d.get('total', rm.total))
+        return rm
+
+
+class BarStore:
+    """일봉 파일 + 종목별 이동평균 상태"""
+
+    def __init__(self, directory=BAR_DIR):
+        self.directory = directory
+        self.prices = PriceStore(directory)
+        self._lock = threading.Lock()
+
+    def _state_path(self, ticker, window):
+        return os.path.join(self.directory, f"{ticker}_ma{window}.json")
+
+    def _load_state(self, ticker, window):
+        try:
+            with open(self._state_path(ticker, window), "r", encoding="utf-8") as f:
+                state = RunningMean.from_dict(json.load(f))
+            return state if state.window == window else None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_state(self, ticker, state):
+        path = self._state_path(ticker, state.window)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp, path)
+
+    def _rebuild(self, closes, window):
+        """저장된 봉에서 처음부터 (상태 파일이 없거나 날짜가 맞지 않을 때)"""
+        tail = closes.iloc[-window:]
+        last = tail.index[-1].strftime('%Y-%m-%d') if len(tail) else None
+        return RunningMean(window, tail.tolist(), last)
+
+    def ma_signal(self, ticker, window=200, reader=yf_reader, refresh_hours=REFRESH_HOURS):
+        """
+        종가와 window일 이동평균
+        반환: dict (price, ma, date, bars, fresh, error)
+        - fresh=False: 새 봉을 받지 못해 저장된 봉으로 계산함 (error에 이유)
+        """
+        with self._lock:
+            state = self._load_state(ticker, window)
+            error = None
+
+            # 1. 최근에 확인했으면 저장된 상태만 사용 (네트워크 없음)
+            recent = state is not None and time.time() - state.checked_at < refresh_hours * 3600
+            if not recent:
+                start = pd.Timestamp.today().normalize() - pd.DateOffset(years=HISTORY_YEARS)
+                try:
+                    self.prices.update(ticker, reader, start)
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+
+                # 2. 새 봉만 합에 반영 (상태가 저장소와 맞지 않거나 마지막 봉 값이 바뀌었으면 다시 만듦)
+                closes = self.prices.load(ticker)['Close'].dropna().astype(float)
+                if (state is None or state.last_date is None or pd.Timestamp(state.last_date) not in closes.index
+                        or closes[pd.Timestamp(state.last_date)] != state.last):
+                    state = self._rebuild(closes, window)
+                else:
+                    for date, value in closes.loc[closes.index > pd.Timestamp(state.last_date)].items():
+                        state.push(date.strftime('%Y-%m-%d'), float(value))
+                if error is None:
+                    state.checked_at = time.time()
+                self._save_state(ticker, state)
+
+            return {
+                'price': state.last,
+                'ma': state.mean if state.ready else None,
+                'date': state.last_date,
+                'bars': len(state.values),
+                'fresh': error is None,
+                'error': error,
+            }
+
+
+_stores = {}
+_store_lock = threading.Lock()
+
+
+def get_store(directory=BAR_DIR):
+    """프로세스 전역 일봉 저장소 (yfinance: BAR_DIR, KIS: KIS_BAR_DIR)"""
+    with _store_lock:
+        if directory not in _stores:
+            _stores[directory] = BarStore(directory)
+        return _stores[directory]
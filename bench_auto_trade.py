@@ -0,0 +1,86 @@
+import os
+import io
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+# -----------------------------------------------------------------------------
+# auto_trade.py 주문 경로 벤치마크 (kis_mock_server 사용, 실계좌 불필요)
+# -----------------------------------------------------------------------------
+# 모의 서버를 띄우고 auto_trade.main()을 여러 번 실행해서 실행 시간과 엔드포인트별 요청 수를 잽니다.
+# - 1회차: 캐시 없음 (토큰 발급 + 일봉 전체 조회)
+# - 2회차부터: 새 프로세스처럼 메모리 상태만 비우고 디스크 캐시(토큰/거래소/일봉)는 그대로 사용
+# 캐시는 임시 폴더(KIS_CACHE_DIR)에 만들어서 실제 캐시를 건드리지 않습니다.
+#
+# 예: python bench_auto_trade.py --runs 5 --latency 0.03 --order-latency 0.1
+
+COLUMNS = ["token", "hashkey", "price", "daily", "order", "balance", "psamount", "total"]
+
+
+def _reset_process_state(kis_client, bar_store):
+    """모듈 전역 객체 초기화 (새 프로세스로 다시 실행한 것과 같게)"""
+    kis_client._clients.clear()
+    kis_client._exchanges = None
+    bar_store._stores.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="auto_trade.py 벤치마크 (KIS 모의 서버)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.03, help="요청마다 지연 (초)")
+    parser.add_argument("--order-latency", type=float, default=None, help="주문 요청 지연 (초)")
+    parser.add_argument("--rate-limit", type=int, default=20, help="초당 요청 수 (0이면 제한 없음)")
+    parser.add_argument("--order-error-rate", type=float, default=0.0)
+    parser.add_argument("--cash", type=float, default=10000.0)
+    parser.add_argument("--verbose", action="store_true", help="봇 출력도 보여줌")
+    args = parser.parse_args()
+
+    import kis_mock_server
+
+    endpoint_latency = {"order": args.order_latency} if args.order_latency is not None else {}
+    server, url = kis_mock_server.serve(latency=args.latency, endpoint_latency=endpoint_latency,
+                                        rate_limit=args.rate_limit, order_error_rate=args.order_error_rate,
+                                        cash=args.cash)
+    cache_dir = tempfile.mkdtemp(prefix="kis_bench_")
+    os.environ["KIS_URL_BASE"] = url
+    os.environ["KIS_CACHE_DIR"] = cache_dir
+
+    # 환경 변수를 읽도록 설정 후에 import
+    import kis_client
+    import bar_store
+    import auto_trade
+
+    print(f"🧪 모의 서버 {url} | 지연 {args.latency}s | 초당 {args.rate_limit or '무제한'}회 | 캐시 {cache_dir}")
+    print(f"{'run':>3} {'seconds':>8} {'ordered':>7} " + " ".join(f"{c:>7}" for c in COLUMNS))
+
+    failed = 0
+    try:
+        for run in range(1, args.runs + 1):
+            _reset_process_state(kis_client, bar_store)
+            server.state.reset(cash=args.cash)
+
+            out = io.StringIO()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(out):
+                auto_trade.main()
+            elapsed = time.perf_counter() - start
+
+            stats = server.state.stats()
+            ordered = "주문 접수!" in out.getvalue()
+            failed += not ordered
+            print(f"{run:>3} {elapsed:>8.3f} {'yes' if ordered else 'no':>7} "
+                  + " ".join(f"{stats.get(c, 0):>7}" for c in COLUMNS))
+            if args.verbose:
+                print(out.getvalue())
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import calendar
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 월별 / 연도별 수익률 표
+# -----------------------------------------------------------------------------
+# resample('ME').apply(lambda x: (1 + x).prod() - 1)은 월마다 파이썬 함수를 한 번씩 부릅니다.
+# 로그 수익률 누적합을 한 번 만들어 두면 어떤 기간의 수익률이든
+#   expm1(누적합[끝] - 누적합[시작])
+# 으로 바로 나옵니다. 기간 경계(월/연 시작 위치)도 날짜 배열에서 한 번에 구하므로
+# 여러 전략(컬럼)을 한 번에 계산할 수 있습니다.
+
+MONTHS_KO = [f"{m}월" for m in range(1, 13)]
+MONTHS_EN = list(calendar.month_abbr)[1:]
+
+
+def _as_frame(returns):
+    if isinstance(returns, pd.Series):
+        return returns.to_frame(returns.name if returns.name is not None else 0)
+    return returns
+
+
+def _log_prefix(frame):
+    """로그 수익률 누적합 (맨 앞에 0 한 줄 추가, 행 개수 = 날짜 수 + 1)"""
+    r = frame.to_numpy(dtype=np.float64)
+    r = np.where(np.isfinite(r), r, 0.0)
+    csum = np.zeros((len(r) + 1, r.shape[1]))
+    np.cumsum(np.log1p(r), axis=0, out=csum[1:])
+    return csum
+
+
+def boundaries(index, freq='M'):
+    """
+    기간 경계 계산
+    반환: (기간 키, 시작 위치, 끝 위치) - 끝은 다음 기간 시작 (slice 기준)
+    - freq='M': 키 = 연도*12 + (월-1), freq='Y': 키 = 연도
+    """
+    idx = pd.DatetimeIndex(index)
+    if freq == 'M':
+        keys = idx.year.to_numpy() * 12 + idx.month.to_numpy() - 1
+    elif freq == 'Y':
+        keys = idx.year.to_numpy()
+    else:
+        raise ValueError(f"지원하지 않는 주기입니다: {freq}")
+
+    if len(keys) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return keys[starts], starts, ends
+
+
+def period_returns(returns, freq='M'):
+    """
+    일간 수익률(Series/DataFrame) -> 기간 수익률
+    인덱스는 각 기간의 마지막 거래일입니다.
+    """
+    frame = _as_frame(returns)
+    _, starts, ends = boundaries(frame.index, freq)
+    csum = _log_prefix(frame)
+    out = pd.DataFrame(np.expm1(csum[ends] - csum[starts]),
+                       index=frame.index[ends - 1], columns=frame.columns)
+    if isinstance(returns, pd.Series):
+        return out.iloc[:, 0].rename(returns.name)
+    return out
+
+
+def yearly_returns(returns):
+    """연도별 수익률 (인덱스 = 연도)"""
+    out = period_returns(returns, 'Y')
+    out.index = pd.Index(out.index.year, name='Year')
+    return out
+
+
+def monthly_table(returns, month_names=MONTHS_KO, total='Year_Total'):
+    """
+    월별 수익률 표 (연도 x 월) + 연간 합계 컬럼
+    - returns: 일간 수익률 Series 또는 여러 전략의 DataFrame
+    - total: 연간 수익률 컬럼 이름 (None이면 생략)
+    반환: Series면 표 하나, DataFrame이면 {컬럼: 표}
+    """
+    frame = _as_frame(returns)
+    csum = _log_prefix(frame)
+    m_keys, m_start, m_end = boundaries(frame.index, 'M')
+    years, y_start, y_end = boundaries(frame.index, 'Y')
+
+    monthly = np.expm1(csum[m_end] - csum[m_start])
+    yearly = np.expm1(csum[y_end] - csum[y_start])
+
+    # (전략, 연도, 월) 격자에 한 번에 배치
+    grid = np.full((frame.shape[1], len(years), 12), np.nan)
+    grid[:, np.searchsorted(years, m_keys // 12), m_keys % 12] = monthly.T
+    months = np.flatnonzero(np.isin(np.arange(12), m_keys % 12))
+
+    tables = {}
+    for j, name in enumerate(frame.columns):
+        table = pd.DataFrame(grid[j][:, months], index=pd.Index(years, name='Year'),
+                             columns=[month_names[m] for m in months])
+        if total is not None:
+            table[total] = yearly[:, j]
+        tables[name] = table
+
+    if isinstance(returns, pd.Series):
+        return next(iter(tables.values()))
+    return tables
@@ -0,0 +1,233 @@
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from result_cache import ResultCache, data_version, make_key
+
+# -----------------------------------------------------------------------------
+# 차트 축소(decimation) + 그림 캐시
+# -----------------------------------------------------------------------------
+# 16x12인치 2x2 차트에 20년치 일별 데이터를 모두 그리면, 화면 해상도보다 훨씬 많은 점을
+# 매 재실행마다 다시 그리게 됩니다.
+# - LTTB(Largest-Triangle-Three-Buckets): 곡선 모양을 유지하면서 점 개수를 줄입니다.
+# - min/max: 구간마다 최저/최고점을 남깁니다. (낙폭 차트의 바닥이 사라지지 않도록)
+# 그린 결과(PNG/SVG)는 데이터 해시 + 차트 설정으로 캐시해서, 입력이 바뀐 차트만 다시 그립니다.
+
+MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "2000"))
+CHART_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "charts")
+
+
+def _fill(y):
+    """선택용 값 (NaN은 앞/뒤 값으로 채움 - 그릴 때는 원래 값을 씁니다)"""
+    return pd.Series(np.asarray(y, dtype=np.float64)).ffill().bfill().fillna(0.0).to_numpy()
+
+
+def lttb_indices(y, n_out):
+    """LTTB로 남길 점의 위치 (처음/끝 점 포함, 오름차순)"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = _fill(y)
+    x = np.arange(n, dtype=np.float64)
+
+    # 처음/끝 점을 뺀 나머지를 n_out-2개 구간으로 나눕니다
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        # 직전 선택점 - 후보 - 다음 구간 평균점이 이루는 삼각형 넓이가 가장 큰 후보
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n_out):
+    """구간마다 최저/최고점을 남기는 위치 (처음/끝 점 포함)"""
+    n = len(y)
+    buckets = n_out // 2
+    if n_out >= n or buckets < 1:
+        return np.arange(n)
+    y = _fill(y)
+
+    starts = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(buckets), np.diff(np.r_[starts, n]))
+    lows = np.minimum.reduceat(y, starts)[bucket]
+    highs = np.maximum.reduceat(y, starts)[bucket]
+
+    # 구간별 첫 번째 최저/최고점 위치
+    lo_pos = np.flatnonzero(y == lows)
+    hi_pos = np.flatnonzero(y == highs)
+    lo_pos = lo_pos[np.unique(bucket[lo_pos], return_index=True)[1]]
+    hi_pos = hi_pos[np.unique(bucket[hi_pos], return_index=True)[1]]
+    return np.unique(np.r_[0, lo_pos, hi_pos, n - 1])
+
+
+def decimate(series, n_out=MAX_POINTS, method='lttb'):
+    """Series 점 개수 줄이기 (method: 'lttb' 또는 'minmax')"""
+    pick = minmax_indices if method == 'minmax' else lttb_indices
+    return series.iloc[pick(series.to_numpy(), n_out)]
+
+
+def decimate_frame(df, n_out=MAX_POINTS, minmax=()):
+    """
+    여러 컬럼을 같은 날짜 축으로 줄입니다. (컬럼별로 고른 점의 합집합)
+    fill_between처럼 두 선의 x가 같아야 하는 경우에 씁니다.
+    - minmax: 바닥/꼭대기를 보존할 컬럼 (낙폭 등)
+    """
+    if len(df) <= n_out:
+        return df
+    per_col = max(n_out // max(len(df.columns), 1), 100)
+    picks = []
+    for col in df.columns:
+        pick = minmax_indices if col in minmax else lttb_indices
+        picks.append(pick(df[col].to_numpy(), per_col))
+    return df.iloc[np.unique(np.concatenate(picks))]
+
+
+# -----------------------------------------------------------------------------
+# 그림 캐시
+# -----------------------------------------------------------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_chart_cache():
+    """프로세스 전역 그림 캐시 (결과 캐시와 같은 LRU, 별도 폴더)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(directory=CHART_DIR)
+    return _cache
+
+
+def _version(data):
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        data = (data,)
+    parts = []
+    for d in data:
+        if isinstance(d, pd.Series):
+            d = d.to_frame()
+        parts.append(data_version(d) if isinstance(d, pd.DataFrame) else repr(d))
+    return "|".join(parts)
+
+
+def cached_figure(name, spec, data, draw, fmt='png', dpi=100):
+    """
+    draw()가 만든 matplotlib Figure를 이미지로 저장/재사용합니다.
+    - spec: 제목/파라미터 등 그림 모양을 바꾸는 값 (dict)
+    - data: 그림에 쓰인 원본 데이터 (DataFrame/Series 또는 그 묶음) - 해시만 계산
+    draw()는 캐시에 없을 때만 호출되므로 축소(decimate)도 그 안에서 합니다.
+    반환: (이미지 bytes, 캐시 적중 여부)
+    """
+    import matplotlib.pyplot as plt
+
+    cache = get_chart_cache()
+    key = make_key(f"chart:{name}", {"spec": spec, "fmt": fmt, "dpi": dpi}, _version(data))
+    image = cache.get(key)
+    if image is not None:
+        return image, True
+
+    fig = draw()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi)
+    plt.close(fig)
+    image = buffer.getvalue()
+    cache.put(key, image)
+    return image, False
+
+
+def show_figure(name, spec, data, draw, fmt='png', dpi=100):
+    """캐시된 차트 이미지 표시 (st.pyplot 대신)"""
+    import streamlit as st
+
+    image, _ = cached_figure(name, spec, data, draw, fmt, dpi)
+    if fmt == 'svg':
+        st.image(image.decode('utf-8'), width="stretch")
+    else:
+        st.image(image, width="stretch")
+
+
+# -----------------------------------------------------------------------------
+# 인터랙티브 차트 (Vega-Lite)
+# -----------------------------------------------------------------------------
+# 브라우저에서 확대/이동이 되므로 기간을 보려고 시작일을 바꿔 다시 돌릴 필요가 없습니다.
+# 브라우저로는 줄인(decimate) float32 데이터만 보냅니다. (Streamlit이 Arrow로 전송)
+# 위쪽 전체 구간 차트에서 범위를 드래그하면, 그 구간만 원본에서 다시 줄여서
+# 아래 상세 차트에 더 촘촘하게 보여줍니다.
+
+OVERVIEW_POINTS = 400
+
+
+def chart_payload(df, n_out=MAX_POINTS, minmax=(), start=None, end=None):
+    """(start~end 구간) 줄인 float32 데이터 (Date 컬럼 + 값 컬럼)"""
+    part = df.loc[start:end] if start is not None or end is not None else df
+    out = decimate_frame(part, n_out, minmax).astype(np.float32)
+    out.index.name = 'Date'
+    return out.reset_index()
+
+
+def _selected_range(event, name):
+    """altair 구간 선택 결과 -> (시작, 끝) 또는 (None, None)"""
+    try:
+        bounds = event.selection[name]['Date']
+    except (AttributeError, KeyError, TypeError):
+        return None, None
+    if not bounds:
+        return None, None
+    unit = 'ms' if isinstance(bounds[0], (int, float)) else None
+    lo, hi = (pd.to_datetime(b, unit=unit) for b in bounds[:2])
+    return lo, hi
+
+
+def show_interactive(df, key, minmax=(), log=False, height=320, title=None):
+    """
+    df의 컬럼들을 인터랙티브 선 차트로 표시합니다.
+    - minmax: 바닥/꼭대기를 보존할 컬럼 (낙폭 등)
+    - key: 구간 선택 상태를 유지할 위젯 키 (페이지마다 고유)
+    """
+    import altair as alt
+    import streamlit as st
+
+    cols = [str(c) for c in df.columns]
+    df = df.set_axis(cols, axis=1)
+    y_scale = alt.Scale(type='log') if log else alt.Scale(zero=False)
+    color = alt.Color('Series:N', title=None)
+
+    brush = alt.selection_interval(name='range', encodings=['x'])
+    overview = (
+        alt.Chart(chart_payload(df, OVERVIEW_POINTS, minmax))
+        .transform_fold(cols, as_=['Series', 'Value'])
+        .mark_line(strokeWidth=1)
+        .encode(x=alt.X('Date:T', title=None), y=alt.Y('Value:Q', scale=y_scale, title=None), color=color)
+        .add_params(brush)
+        .properties(height=80)
+    )
+    if title:
+        st.caption(title)
+    event = st.altair_chart(overview, on_select="rerun", selection_mode='range', key=key, width="stretch")
+
+    start, end = _selected_range(event, 'range')
+    detail = (
+        alt.Chart(chart_payload(df, MAX_POINTS, minmax, start, end))
+        .transform_fold(cols, as_=['Series', 'Value'])
+        .mark_line()
+        .encode(
+            x=alt.X('Date:T', title=None),
+            y=alt.Y('Value:Q', scale=y_scale, title=None),
+            color=color,
+            tooltip=[alt.Tooltip('Date:T'), 'Series:N', alt.Tooltip('Value:Q', format=',.4f')],
+        )
+        .properties(height=height)
+        .interactive(bind_y=False)
+    )
+    st.altair_chart(detail, width="stretch")
@@ -1,15 +1,15 @@
 import time
 import sys
+import traceback
 
 # [안전장치] 프로그램 시작부터 에러를 잡기 위한 설정
 try:
-    import requests
-    import json
-    import pandas as pd
     from datetime import datetime
     import ctypes
-    import traceback
-    import yfinance as yf # 여기서 에러나면 바로 잡힘
+    import bar_store # yfinance는 새 봉을 받을 때만 불러옴
+    import kis_client
+    import kis_trace
+    import reconcile
 
     # =========================================================
     # [사용자 설정]
@@ -19,83 +19,82 @@ try:
     CANO = "63775153"
     ACNT_PRDT_CD = "01"
     MA_WINDOW = 200
-    URL_BASE = "https://openapi.koreainvestment.com:9443"
     # =========================================================
 
     def show_popup(title, message):
+        if not hasattr(ctypes, 'windll'): return  # 윈도우가 아니면 (데몬/리눅스) 출력만
         ctypes.windll.user32.MessageBoxW(0, message, title, 0x40 | 0x1 | 0x1000)
 
-    def get_access_token():
-        headers = {"content-type": "application/json"}
-        body = {"grant_type": "client_credentials", "appkey": APP_KEY, "appsecret": APP_SECRET}
-        res = requests.post(f"{URL_BASE}/oauth2/tokenP", headers=headers, data=json.dumps(body))
-        return res.json()['access_token']
+    def get_client():
+        """토큰(디스크 캐시)과 연결을 재사용하는 KIS 클라이언트 (접속 주소: KIS_URL_BASE)"""
+        return kis_client.get_client(APP_KEY, APP_SECRET)
 
     def get_spy_ma200():
-        print("📊 시장 데이터 분석 중 (yfinance)...")
-        df = yf.download(['SPY'], period='2y', progress=False)
-        if df.empty: raise Exception("yfinance 데이터 다운로드 실패")
-        
-        # 컬럼 처리 (yfinance 버전 차이 대응)
-        if isinstance(df.columns, pd.MultiIndex):
-            series = df['Close']['SPY']
-        elif 'Close' in df.columns:
-            series = df['Close']
-        else:
-            series = df
-
-        if len(series) < MA_WINDOW: raise Exception(f"데이터 부족 ({len(series)}일)")
-
-        ma200 = float(series.rolling(window=MA_WINDOW).mean().iloc[-1])
-        current_price = float(series.iloc[-1])
-        return current_price, ma200
-
-    def get_holdings(token):
-        print("💼 잔고 조회 중...")
-        headers = {
-            "content-type": "application/json", "authorization": f"Bearer {token}",
-            "appKey": APP_KEY, "appSecret": APP_SECRET, "tr_id": "JTTT3012R"
-        }
-        params = {
-            "CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": "NAS",
-            "TR_CRCY_CD": "USD", "CTX_AREA_FK100": "", "CTX_AREA_NK100": ""
-        }
-        res = requests.get(f"{URL_BASE}/uapi/overseas-stock/v1/trading/inquire-balance", headers=headers, params=params)
-        
+        print("📊 시장 데이터 분석 중 (로컬 일봉 + yfinance 새 봉만)...")
+        with kis_trace.span('bar_store.ma_signal', symbol='SPY'):
+            signal = bar_store.get_store().ma_signal('SPY', MA_WINDOW)
+        if not signal['fresh']:
+            print(f"   ⚠️ 새 봉 받기 실패 - 저장된 봉({signal['date']})으로 계산: {signal['error']}")
+        if signal['ma'] is None: raise Exception(f"데이터 부족 ({signal['bars']}일)")
+        return signal['price'], signal['ma']
+
+    def get_holdings(client):
+        print("💼 잔고 조회 중 (전체 거래소, 연속 조회)...")
+        snapshot = reconcile.get_snapshot(client, CANO, ACNT_PRDT_CD)
+        for where, error in snapshot.errors.items():
+            print(f"   ⚠️ {where}: {error}")
+        positions = [k for k in snapshot.errors if k != 'cash']
+        if positions and len(positions) == len(kis_client.EXCHANGES):
+            raise Exception("모든 거래소 잔고 조회 실패")
+        # SPY/UPRO가 있는 거래소를 못 읽었으면 0주로 보고 "매매 실패"로 진단하면 안 됨 -> 조회 실패로 보고
+        exchanges = kis_client.get_exchange_map()
+        missing = set()
+        for ticker in ("SPY", "UPRO"):
+            known = exchanges.get(ticker)  # 모르는 종목이면 어느 거래소든 실패하면 알 수 없음
+            missing.update(e for e in ([known] if known else kis_client.EXCHANGES) if e in positions)
+        if missing:
+            raise Exception(f"SPY/UPRO 거래소({', '.join(sorted(missing))}) 잔고 조회 실패 - 보유 수량을 알 수 없음")
+
         holdings = {"SPY": 0, "UPRO": 0}
-        if res.status_code == 200:
-            data = res.json()
-            if 'output1' in data:
-                for item in data['output1']:
-                    sym = item['ovrs_pdno']
-                    qty = int(item['ovrs_cblc_qty'])
-                    if sym in holdings: holdings[sym] = qty
+        holdings.update(snapshot.quantities())
+        others = {s: q for s, q in holdings.items() if s not in ("SPY", "UPRO") and q}
+        if others:
+            print(f"   - 그 밖의 보유: {others}")
         return holdings
 
     def main():
+        kis_trace.start_run('check_morning')
+        try:
+            check()
+        finally:
+            kis_trace.finish()
+
+    def check():
         print(f"\n⏰ [아침 점검] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
+        # 1~2. 시장 분석(yfinance)과 잔고 조회를 동시에 실행
+        results = kis_client.fetch_all({
+            'market': (get_spy_ma200,),
+            'holdings': (get_holdings, get_client()),
+        }, timeout=30)
+
         # 1. 시장 분석
-        try:
-            spy_price, ma200 = get_spy_ma200()
-            is_bull = spy_price >= ma200
-            market_status = "상승장 (UPRO 매수)" if is_bull else "하락장 (SPY 매수)"
-            print(f"   - SPY: ${spy_price:.2f} | 200일선: ${ma200:.2f}")
-            print(f"   -> 시장: {market_status}")
-        except Exception as e:
-            print(f"❌ 시장 데이터 오류: {e}")
+        if isinstance(results['market'], Exception):
+            print(f"❌ 시장 데이터 오류: {results['market']}")
             return
+        spy_price, ma200 = results['market']
+        is_bull = spy_price >= ma200
+        market_status = "상승장 (UPRO 매수)" if is_bull else "하락장 (SPY 매수)"
+        print(f"   - SPY: ${spy_price:.2f} | 200일선: ${ma200:.2f}")
+        print(f"   -> 시장: {market_status}")
 
         # 2. 잔고 확인
-        try:
-            token = get_access_token()
-            if not token: raise Exception("토큰 발급 실패")
-            my_stocks = get_holdings(token)
-            spy_qty = my_stocks['SPY']
-            upro_qty = my_stocks['UPRO']
-        except Exception as e:
-            print(f"❌ 계좌 조회 오류: {e}")
+        if isinstance(results['holdings'], Exception):
+            print(f"❌ 계좌 조회 오류: {results['holdings']}")
             return
+        my_stocks = results['holdings']
+        spy_qty = my_stocks['SPY']
+        upro_qty = my_stocks['UPRO']
 
         # 3. 진단
         current_holding = "현금"
@@ -129,10 +128,13 @@ try:
             print('\a')
             show_popup("⚠️ 자동매매 긴급 점검", msg)
 
+    # scheduler_daemon.py가 import해서 쓸 때는 실행하지 않음
+    if __name__ == "__main__":
+        main()
+
 except Exception as e:
     print("\n❌ [치명적 오류 발생] ❌")
     print(traceback.format_exc())
     print("-" * 40)
 
-# [중요] 어떤 상황에서도 엔터키를 누르기 전까진 안 꺼짐
-input("\n👉 엔터 키를 누르면 종료합니다...")
\ No newline at end of file
+# 콘솔 창 유지는 .bat의 pause가 담당 (여기서 input()으로 멈추면 데몬/예약 작업이 끝나지 않음)
\ No newline at end of file
@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# -----------------------------------------------------------------------------
+# Float32 컴팩트 모드 (유니버스 단위 가격 패널용)
+# -----------------------------------------------------------------------------
+# 500종목 x 수천 일 가격 패널을 float64로 들고 있으면 사용자 여러 명이 동시에 열 때
+# 메모리와 캐시가 금방 찹니다. 컴팩트 모드에서는 가격/수익률을 float32로 저장하고,
+# 오차가 누적되는 자산 곡선(누적곱)만 float64로 계산합니다.
+#
+# 기본값은 환경변수 BACKTEST_COMPACT=1 로 켤 수 있고, 페이지에서 체크박스로 바꿀 수 있습니다.
+
+COMPACT_DTYPE = np.float32
+FULL_DTYPE = np.float64
+
+
+def default_enabled():
+    """서버 기본 설정 (환경변수)"""
+    return os.environ.get("BACKTEST_COMPACT", "0").lower() in ("1", "true", "yes")
+
+
+def panel_dtype(compact):
+    return COMPACT_DTYPE if compact else FULL_DTYPE
+
+
+def compact_panel(df, compact=True):
+    """실수형 컬럼을 float32(또는 float64)로 변환합니다."""
+    if df is None or df.empty:
+        return df
+    dtype = panel_dtype(compact)
+    float_cols = df.select_dtypes(include=[np.floating]).columns
+    if len(float_cols) == len(df.columns):
+        return df.astype(dtype, copy=False)
+    return df.astype({c: dtype for c in float_cols}, copy=False)
+
+
+def accumulate_equity(returns):
+    """수익률(float32 가능) -> 누적 자산 배수 (항상 float64로 누적)"""
+    values = np.asarray(returns, dtype=FULL_DTYPE)
+    equity = np.cumprod(1.0 + values)
+    if isinstance(returns, pd.Series):
+        return pd.Series(equity, index=returns.index, name=returns.name)
+    return equity
+
+
+def panel_nbytes(df):
+    """패널 메모리 사용량 (MB)"""
+    if df is None:
+        return 0.0
+    return df.memory_usage(deep=False).sum() / 1024 / 1024
+
+
+def _cagr_mdd(returns):
+    stats = metrics.compute(returns)
+    return stats.total_return, stats.cagr, stats.mdd
+
+
+def precision_report(returns_compact, returns_full, panel_compact=None, panel_full=None):
+    """
+    float32 실행과 float64 실행의 성과 지표 차이를 표로 만듭니다.
+    반환: DataFrame (지표 x [float64, float32, 차이(bp)])
+    """
+    full = _cagr_mdd(returns_full)
+    comp = _cagr_mdd(returns_compact)
+    rows = ['Total Return', 'CAGR', 'MDD']
+
+    report = pd.DataFrame({
+        'float64': full,
+        'float32': comp,
+    }, index=rows)
+    report['Diff (bp)'] = (report['float32'] - report['float64']) * 10000
+
+    if panel_compact is not None and panel_full is not None:
+        report.attrs['memory_mb'] = (panel_nbytes(panel_full), panel_nbytes(panel_compact))
+    return report
+
+
+def show_precision_report(report):
+    """정밀도 리포트 화면 표시"""
+    import streamlit as st
+
+    with st.expander("🔬 Float32 정밀도 리포트 (float64 실행 대비)", expanded=False):
+        st.dataframe(report.style.format({'float64': '{:.4%}', 'float32': '{:.4%}', 'Diff (bp)': '{:+.3f}'}))
+        if 'memory_mb' in report.attrs:
+            full_mb, comp_mb = report.attrs['memory_mb']
+            st.caption(f"가격 패널 메모리: float64 {full_mb:,.1f} MB → float32 {comp_mb:,.1f} MB")
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 거래비용 모델 (수수료 + 스프레드 + 거래량 기반 시장충격)
+# -----------------------------------------------------------------------------
+# 거래대금이 작은 코스닥 소형주를 수억 원씩 사고팔면 호가를 밀어 올리게 됩니다.
+# 시장충격은 제곱근 모형으로 추정합니다.
+#
+#   비용률 = 수수료 + 스프레드/2 + 계수 x 일간 변동성 x sqrt(주문금액 / 평균 거래대금)
+#
+# 평균 거래대금(ADV)과 변동성은 prepare()에서 한 번만 계산해 두고,
+# 백테스트가 끝난 뒤 전체 매매를 배열 한 번으로 계산합니다.
+# 참여율은 자르지 않습니다. (ADV보다 큰 주문도 sqrt 그대로 비용을 물림)
+# max_participation을 넘는 주문은 비용과 별도로 "과대 주문"으로 표시만 합니다.
+
+
+class SquareRootImpact:
+    """제곱근 시장충격 비용 모델"""
+
+    def __init__(self, commission=0.00015, half_spread_bp=5.0, impact_coef=1.0,
+                 adv_window=20, vol_window=20, max_participation=0.3, missing_participation=1.0):
+        self.commission = commission
+        self.half_spread = half_spread_bp / 10000
+        self.impact_coef = impact_coef
+        self.adv_window = adv_window
+        self.vol_window = vol_window
+        self.max_participation = max_participation      # 이 참여율을 넘으면 과대 주문으로 표시
+        self.missing_participation = missing_participation  # 거래량 정보가 없을 때 가정할 참여율
+        self._adv = None
+        self._sigma = None
+
+    def prepare(self, prices, volumes):
+        """가격/거래량 패널로 평균 거래대금과 일간 변동성을 미리 계산합니다."""
+        volumes = volumes.reindex(index=prices.index, columns=prices.columns)
+        prices64 = prices.astype(np.float64)
+
+        # 당일 거래량을 미리 알 수 없으므로 전일까지의 평균을 씁니다
+        traded_value = prices64 * volumes.astype(np.float64)
+        adv = traded_value.rolling(self.adv_window, min_periods=1).mean().shift(1)
+        sigma = prices64.pct_change().rolling(self.vol_window, min_periods=2).std().shift(1)
+
+        self._adv = adv.to_numpy()
+        self._sigma = sigma.to_numpy()
+        # 변동성 이력이 없는 종목(신규 상장 등)은 전체 중앙값을 씁니다
+        finite = self._sigma[np.isfinite(self._sigma)]
+        self._default_sigma = float(np.median(finite)) if len(finite) else 0.02
+        return self
+
+    def estimate(self, rows, cols, notional):
+        """
+        매매별 비용률 계산 (배열 단위)
+        - rows, cols: 가격 패널의 행(날짜)/열(종목) 번호
+        - notional: 주문 금액 (절댓값)
+        반환: (비용률 배열, 거래대금 대비 참여율 배열)
+        참여율이 max_participation을 넘어도 비용은 그대로 계산합니다. (oversized()로 따로 확인)
+        """
+        if self._adv is None:
+            raise ValueError("prepare()를 먼저 호출하세요.")
+
+        adv = self._adv[rows, cols]
+        sigma = self._sigma[rows, cols]
+        notional = np.abs(np.asarray(notional, dtype=np.float64))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            participation = notional / adv
+        # 거래량 정보가 없거나 0이면 하루 거래대금 전체를 사는 것으로 간주 (보수적으로)
+        participation = np.where(np.isfinite(participation), participation, self.missing_participation)
+
+        sigma = np.where(np.isfinite(sigma), sigma, self._default_sigma)
+        impact = self.impact_coef * sigma * np.sqrt(participation)
+        return self.commission + self.half_spread + impact, participation
+
+    def oversized(self, participation):
+        """평균 거래대금 대비 너무 큰 주문 (실제로는 하루에 다 체결하기 어려움)"""
+        return np.asarray(participation) > self.max_participation
+
+
+def apply_costs(gross_returns, book, index, cost_model, capital):
+    """
+    희소 매매 장부(book.trade_arrays)에 비용 모델을 한 번에 적용합니다.
+    리밸런싱일 종가에 매매한다고 보고, 그날 수익률에서 비용을 차감합니다.
+    주문 금액은 비용 차감 전 자산 기준으로 잡습니다. (한 번만 계산)
+    반환: (비용 차감 후 수익률 Series, 매매별 비용 DataFrame)
+    """
+    reb, cols, delta = book.trade_arrays()
+    if len(reb) == 0 or gross_returns.empty:
+        return gross_returns, pd.DataFrame()
+
+    reb_dates = pd.DatetimeIndex(book.dates)
+    rows = index.searchsorted(reb_dates[reb], side='right') - 1
+
+    equity = capital * np.cumprod(1.0 + gross_returns.to_numpy(dtype=np.float64))
+    pos = gross_returns.index.searchsorted(reb_dates, side='right') - 1
+    equity_at = np.where(pos >= 0, equity[np.maximum(pos, 0)], capital)
+
+    notional = np.abs(delta) * equity_at[reb]
+    cost_rate, participation = cost_model.estimate(rows, cols, notional)
+
+    # 리밸런싱별 비용 (자산 대비 비율)
+    drag = np.bincount(reb, weights=np.abs(delta) * cost_rate, minlength=len(reb_dates))
+
+    ok = pos >= 0
+    factor = np.ones(len(gross_returns))
+    np.multiply.at(factor, pos[ok], 1 - drag[ok])
+    net = (1 + gross_returns.to_numpy(dtype=np.float64)) * factor - 1
+
+    codes = [book.tickers[j] for j in cols]
+    cost_log = pd.DataFrame({
+        'Date': reb_dates[reb].strftime('%Y-%m-%d'),
+        'Code': codes,
+        'Name': [book.code_map.get(c, c) for c in codes],
+        'Weight_Change': delta,
+        'Notional': notional,
+        'Participation': participation,
+        'Oversized': cost_model.oversized(participation),
+        'Cost_bp': cost_rate * 10000,
+    })
+    return pd.Series(net, index=gross_returns.index, name=gross_returns.name), cost_log
+
+
+def cost_summary(cost_log):
+    """비용 요약 (누적 비용 영향, 가중 평균 비용, 최대 참여율, 과대 주문 수)"""
+    if cost_log is None or cost_log.empty:
+        return {}
+    per_reb = (cost_log['Weight_Change'].abs() * cost_log['Cost_bp'] / 10000).groupby(cost_log['Date']).sum()
+    w = cost_log['Notional']
+    return {
+        'drag': np.prod(1 - per_reb.to_numpy()) - 1,
+        'avg_cost_bp': np.average(cost_log['Cost_bp'], weights=w) if w.sum() > 0 else 0.0,
+        'max_participation': cost_log['Participation'].max(),
+        'trades': len(cost_log),
+        'oversized': int(cost_log['Oversized'].sum()) if 'Oversized' in cost_log else 0,
+    }
+
+
+def show_cost_caption(book):
+    """거래비용 요약 표시 (비용 모델을 쓴 경우에만)"""
+    import streamlit as st
+
+    summary = cost_summary(book.cost_log)
+    if summary:
+        st.caption(f"💸 거래비용 차감: 누적 {summary['drag']*100:.2f}% · 평균 {summary['avg_cost_bp']:.1f} bp"
+                   f" · 최대 거래대금 참여율 {summary['max_participation']*100:.1f}% ({summary['trades']}건)")
+        if summary['oversized']:
+            st.caption(f"⚠️ 평균 거래대금 대비 과대 주문 {summary['oversized']}건 - 운용 금액이 이 유니버스에 비해 큽니다. "
+                       "(비용은 참여율을 자르지 않고 그대로 반영)")
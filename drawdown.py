@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+import result_cache
+
+# -----------------------------------------------------------------------------
+# 낙폭 구간 분석 (고점 -> 저점 -> 회복)
+# -----------------------------------------------------------------------------
+# MDD 숫자 하나로는 "얼마나 자주, 얼마나 오래" 물려 있었는지 알 수 없습니다.
+# 자산 곡선을 한 번 훑어서 모든 낙폭 구간을 찾고, 깊이/기간 순 상위 N개를 보여줍니다.
+#
+# 구간 = 고점 다음날 처음 고점 아래로 내려간 날부터 고점을 회복한 날까지
+# 아직 회복하지 못한 구간은 Recovery가 비어 있습니다. (진행 중)
+
+COLUMNS = ['Peak', 'Trough', 'Recovery', 'Depth', 'Decline_Days', 'Recovery_Days', 'Duration_Days']
+
+
+def episodes(equity):
+    """
+    모든 낙폭 구간 표 (고점 날짜 순)
+    - Depth: 고점 대비 최저 하락률 (음수)
+    - *_Days: 거래일 수 (회복 전이면 Recovery_Days는 NaN, Duration은 마지막 날까지)
+    """
+    values = np.asarray(equity, dtype=np.float64)
+    index = equity.index if isinstance(equity, pd.Series) else pd.RangeIndex(len(values))
+    n = len(values)
+    if n == 0:
+        return pd.DataFrame(columns=COLUMNS)
+
+    peak = np.maximum.accumulate(values)
+    dd = values / peak - 1
+    under = dd < 0
+
+    prev = np.r_[False, under[:-1]]
+    begins = under & ~prev
+    starts = np.flatnonzero(begins)                 # 고점 아래로 처음 내려간 날
+    ends = np.flatnonzero(~under & prev)            # 고점을 회복한 날
+    if len(starts) == 0:
+        return pd.DataFrame(columns=COLUMNS)
+    is_open = len(ends) < len(starts)
+
+    # 구간 번호를 붙여서 구간별 최저점을 한 번에 찾습니다
+    episode = np.cumsum(begins) - 1
+    depth = np.full(len(starts), 0.0)
+    np.minimum.at(depth, episode[under], dd[under])
+    at_trough = under & (dd == depth[np.maximum(episode, 0)])
+    first = np.unique(episode[at_trough], return_index=True)[1]
+    trough = np.flatnonzero(at_trough)[first]
+
+    peak_pos = starts - 1
+    end_pos = np.r_[ends, n - 1] if is_open else ends
+    recovered = np.ones(len(starts), dtype=bool)
+    recovered[-1] = not is_open
+
+    recovery_days = (end_pos - trough).astype(np.float64)
+    recovery_days[~recovered] = np.nan
+    return pd.DataFrame({
+        'Peak': index[peak_pos],
+        'Trough': index[trough],
+        'Recovery': pd.Series(index[end_pos]).where(recovered).to_numpy(),
+        'Depth': depth,
+        'Decline_Days': trough - peak_pos,
+        'Recovery_Days': recovery_days,
+        'Duration_Days': end_pos - peak_pos,
+    }, columns=COLUMNS)
+
+
+def top_episodes(table, n=5, by='depth'):
+    """상위 N개 구간 (by='depth': 깊은 순, 'duration': 긴 순)"""
+    if table.empty:
+        return table
+    if by == 'duration':
+        return table.sort_values('Duration_Days', ascending=False).head(n)
+    return table.sort_values('Depth').head(n)
+
+
+def cached_episodes(equity):
+    """자산 곡선 해시로 낙폭 구간 표를 캐시합니다. (같은 결과면 다시 계산하지 않음)"""
+    frame = equity.to_frame() if isinstance(equity, pd.Series) else equity
+    table, _, _ = result_cache.cached_run(
+        'drawdown_episodes', {}, result_cache.data_version(frame),
+        lambda: episodes(equity),
+    )
+    return table
+
+
+def show_episodes(curves, n=5):
+    """
+    낙폭 구간 Top N 표시
+    - curves: {이름: 자산 곡선 Series} (전략, 벤치마크 등)
+    """
+    import streamlit as st
+
+    curves = {k: v.dropna() for k, v in curves.items() if v is not None and len(v.dropna()) > 0}
+    if not curves:
+        return
+    fmt = {'Depth': '{:.2%}', 'Decline_Days': '{:,.0f}', 'Recovery_Days': '{:,.0f}', 'Duration_Days': '{:,.0f}'}
+
+    with st.expander(f"📉 낙폭 구간 Top {n} (깊이 / 기간)", expanded=False):
+        tabs = st.tabs(list(map(str, curves)))
+        for tab, (name, curve) in zip(tabs, curves.items()):
+            table = cached_episodes(curve)
+            with tab:
+                st.caption(f"전체 {len(table)}개 구간 · 미회복 구간은 Recovery가 비어 있습니다.")
+                for by, label in (('depth', '깊이 순'), ('duration', '기간 순')):
+                    top = top_episodes(table, n, by).copy()
+                    for col in ('Peak', 'Trough', 'Recovery'):
+                        top[col] = pd.to_datetime(top[col]).dt.strftime('%Y-%m-%d')
+                    st.markdown(f"**{label}**")
+                    st.dataframe(top.style.format(fmt, na_rep='-'), hide_index=True)
@@ -0,0 +1,113 @@
+import io
+
+# -----------------------------------------------------------------------------
+# 결과 파일 내보내기 (다운로드 버튼을 누를 때만 생성)
+# -----------------------------------------------------------------------------
+# 예전에는 매 실행마다 BytesIO에 엑셀 전체(일별 데이터 시트 포함)를 만든 뒤 버튼에 넘겼습니다.
+# 이제 버튼에는 "파일을 만드는 함수"만 넘기고, 실제 생성은 클릭했을 때 한 번 합니다.
+# 엑셀은 xlsxwriter constant_memory 모드로 한 행씩 써서 메모리에 시트 전체를 들고 있지 않습니다.
+# 일별 데이터는 엑셀 대신 Parquet / CSV.gz로 따로 받을 수도 있습니다. (더 작고 빠름)
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CHUNK_ROWS = 5000
+
+
+def _write_frame(ws, df, index, header_fmt):
+    """DataFrame을 위에서 아래로 한 행씩 씁니다. (constant_memory는 행 순서대로만 쓸 수 있음)"""
+    header = [str(c) for c in df.columns]
+    if index:
+        header = [df.index.name or ''] + header
+    ws.write_row(0, 0, header, header_fmt)
+
+    for start in range(0, len(df), CHUNK_ROWS):
+        block = df.iloc[start:start + CHUNK_ROWS]
+        # object 배열로 바꾸면 numpy 숫자가 파이썬 숫자가 되어 xlsxwriter가 바로 씁니다
+        values = block.to_numpy(dtype=object)
+        labels = block.index.to_numpy(dtype=object)
+        for i, row in enumerate(values):
+            cells = [None if v != v else v for v in row]  # NaN/NaT -> 빈 칸
+            if index:
+                cells.insert(0, labels[i])
+            ws.write_row(start + i + 1, 0, cells)
+
+
+def excel_bytes(sheets, no_index=(), formats=None):
+    """
+    여러 시트를 스트리밍 방식으로 엑셀 파일(bytes)로 만듭니다.
+    - sheets: {시트 이름: DataFrame} (순서대로 시트 생성)
+    - no_index: 인덱스를 쓰지 않을 시트 이름들
+    - formats: {시트 이름: [(열 범위 'B:N', 너비, 숫자 형식), ...]}
+    """
+    import xlsxwriter
+
+    formats = formats or {}
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        'strings_to_urls': False,
+    })
+    header_fmt = workbook.add_format({'bold': True})
+    num_fmts = {}
+
+    for name, df in sheets.items():
+        ws = workbook.add_worksheet(name)
+        for cols, width, num_format in formats.get(name, []):
+            if num_format not in num_fmts:
+                num_fmts[num_format] = workbook.add_format({'num_format': num_format})
+            ws.set_column(cols, width, num_fmts[num_format])
+        _write_frame(ws, df, name not in no_index, header_fmt)
+
+    workbook.close()
+    return buffer.getvalue()
+
+
+def parquet_bytes(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer)
+    return buffer.getvalue()
+
+
+def csv_gz_bytes(df):
+    buffer = io.BytesIO()
+    df.to_csv(buffer, compression='gzip')
+    return buffer.getvalue()
+
+
+def download_buttons(label, file_name, sheets, daily_sheet=None, no_index=(), formats=None, key='export'):
+    """
+    엑셀 다운로드 버튼 (클릭 시 생성, 화면 재실행 없음)
+    daily_sheet를 주면 그 시트를 Parquet / CSV.gz로 받는 버튼도 함께 보여줍니다.
+    """
+    import streamlit as st
+
+    cols = st.columns(3) if daily_sheet is not None else [st.container()]
+    cols[0].download_button(
+        label=label,
+        data=lambda: excel_bytes(sheets, no_index, formats),
+        file_name=file_name,
+        mime=XLSX_MIME,
+        on_click="ignore",
+        key=f"{key}_xlsx",
+    )
+    if daily_sheet is None:
+        return
+
+    daily = sheets[daily_sheet]
+    stem = file_name.rsplit('.', 1)[0]
+    cols[1].download_button(
+        f"📦 {daily_sheet} (Parquet)",
+        data=lambda: parquet_bytes(daily),
+        file_name=f"{stem}_{daily_sheet}.parquet",
+        mime="application/octet-stream",
+        on_click="ignore",
+        key=f"{key}_parquet",
+    )
+    cols[2].download_button(
+        f"🗜️ {daily_sheet} (CSV.gz)",
+        data=lambda: csv_gz_bytes(daily),
+        file_name=f"{stem}_{daily_sheet}.csv.gz",
+        mime="application/gzip",
+        on_click="ignore",
+        key=f"{key}_csv",
+    )
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 희소(sparse) 보유 종목 기록
+# -----------------------------------------------------------------------------
+# 모멘텀 전략은 최대 505개 종목 중 top_n(예: 10)개만 보유합니다.
+# 리밸런싱마다 (종목 열 번호, 비중) 배열만 저장하고, 전체 종목 x 날짜 표가 필요할 때만
+# 펼칩니다. 메모리와 계산량이 유니버스 크기가 아니라 보유 종목 수에 비례합니다.
+#
+# 저장 구조는 CSR 방식입니다. (리밸런싱 i의 보유 종목 = idx[ptr[i]:ptr[i+1]])
+
+
+class SparseHoldings:
+    """리밸런싱별 (종목 번호, 비중, 점수) 희소 기록"""
+
+    def __init__(self, tickers, code_map=None):
+        self.tickers = list(tickers)
+        self.code_map = code_map or {}
+        self.dates = []
+        self._ptr = [0]
+        self._idx = []
+        self._weight = []
+        self._score = []
+        self.cost_log = None  # 거래비용 모델 적용 시 매매별 비용 내역
+
+    def __len__(self):
+        return len(self.dates)
+
+    def append(self, date, idx, weight, score=None):
+        """리밸런싱 한 번의 보유 종목 추가 (idx: 종목 열 번호 배열)"""
+        idx = np.asarray(idx, dtype=np.int32)
+        weight = np.broadcast_to(np.asarray(weight, dtype=np.float64), idx.shape)
+        score = np.full(idx.shape, np.nan) if score is None else np.asarray(score, dtype=np.float64)
+
+        self.dates.append(pd.Timestamp(date))
+        self._idx.append(idx)
+        self._weight.append(weight)
+        self._score.append(score)
+        self._ptr.append(self._ptr[-1] + len(idx))
+
+    # -------------------------------------------------------------------------
+    # 조회
+    # -------------------------------------------------------------------------
+    def _flat(self):
+        if not self._idx:
+            empty = np.array([], dtype=np.int32)
+            return empty, empty.astype(np.float64), empty.astype(np.float64)
+        return np.concatenate(self._idx), np.concatenate(self._weight), np.concatenate(self._score)
+
+    def at(self, i):
+        """i번째 리밸런싱 (종목 번호 배열, 비중 배열)"""
+        return self._idx[i], self._weight[i]
+
+    def codes(self, i):
+        return [self.tickers[j] for j in self._idx[i]]
+
+    def nnz(self):
+        """저장된 (종목, 비중) 쌍의 개수"""
+        return self._ptr[-1]
+
+    # -------------------------------------------------------------------------
+    # 변환 (필요할 때만 펼치기)
+    # -------------------------------------------------------------------------
+    def to_dense(self):
+        """리밸런싱 날짜 x 전체 종목 비중 표"""
+        dense = np.zeros((len(self.dates), len(self.tickers)))
+        idx, weight, _ = self._flat()
+        rows = np.repeat(np.arange(len(self.dates)), np.diff(self._ptr))
+        dense[rows, idx] = weight
+        return pd.DataFrame(dense, index=pd.DatetimeIndex(self.dates), columns=self.tickers)
+
+    def history_frame(self):
+        """매매 기록 표 (Date, Code, Name, Momentum)"""
+        idx, _, score = self._flat()
+        rows = np.repeat(np.arange(len(self.dates)), np.diff(self._ptr))
+        codes = [self.tickers[j] for j in idx]
+        return pd.DataFrame({
+            'Date': [self.dates[r].strftime('%Y-%m-%d') for r in rows],
+            'Code': codes,
+            'Name': [self.code_map.get(c, c) for c in codes],
+            'Momentum': score,
+        })
+
+    def trade_arrays(self):
+        """
+        직전 리밸런싱 대비 비중 변화를 배열로 돌려줍니다.
+        반환: (리밸런싱 번호, 종목 번호, 비중 변화) - 변화가 없는 종목은 빠집니다.
+        """
+        reb, cols, deltas = [], [], []
+        prev_idx = np.array([], dtype=np.int32)
+        prev_w = np.array([], dtype=np.float64)
+
+        for i in range(len(self.dates)):
+            idx, w = self.at(i)
+            # 두 희소 벡터의 합집합 위에서만 차이를 계산합니다
+            union = np.union1d(prev_idx, idx)
+            old = np.zeros(len(union))
+            new = np.zeros(len(union))
+            old[np.searchsorted(union, prev_idx)] = prev_w
+            new[np.searchsorted(union, idx)] = w
+            delta = new - old
+
+            changed = delta != 0
+            reb.append(np.full(changed.sum(), i, dtype=np.int32))
+            cols.append(union[changed].astype(np.int32))
+            deltas.append(delta[changed])
+            prev_idx, prev_w = idx, w
+
+        if not reb:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.int32), np.array([])
+        return np.concatenate(reb), np.concatenate(cols), np.concatenate(deltas)
+
+    def trades(self):
+        """
+        직전 리밸런싱 대비 비중 변화 (매수/매도 장부)
+        반환: DataFrame (Date, Code, Name, Action, Weight_Change)
+        """
+        reb, cols, delta = self.trade_arrays()
+        codes = [self.tickers[j] for j in cols]
+        return pd.DataFrame({
+            'Date': [self.dates[r].strftime('%Y-%m-%d') for r in reb],
+            'Code': codes,
+            'Name': [self.code_map.get(c, c) for c in codes],
+            'Action': np.where(delta > 0, 'BUY', 'SELL'),
+            'Weight_Change': delta,
+        }, columns=['Date', 'Code', 'Name', 'Action', 'Weight_Change'])
@@ -0,0 +1,429 @@
+import os
+import json
+import asyncio
+import time
+import hashlib
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import kis_trace
+
+# -----------------------------------------------------------------------------
+# 한국투자증권(KIS) Open API 클라이언트 (토큰 캐시 + 연결 재사용)
+# -----------------------------------------------------------------------------
+# 예전에는 실행할 때마다 새 토큰을 발급받고, 호출마다 requests.get/post로 새 연결을 맺었습니다.
+# - 토큰: 약 하루 유효하고 발급 횟수 제한이 있으므로 디스크에 저장해 두고, 만료 전에 미리 갱신합니다.
+# - 연결: requests.Session 하나를 시세/잔고/hashkey/주문이 같이 써서 keep-alive 연결을 재사용합니다.
+#   (주문 직전에 TLS 핸드셰이크 + 토큰 발급 왕복이 추가로 생기지 않습니다)
+# KIS_URL_BASE 환경 변수로 접속 주소를 바꿀 수 있습니다. (모의투자 / 테스트 서버 - kis_mock_server.py)
+# KIS_CACHE_DIR로 토큰/거래소/일봉 캐시 폴더를 바꿀 수 있습니다. (벤치마크가 실제 캐시를 건드리지 않도록)
+
+URL_BASE = os.environ.get("KIS_URL_BASE", "https://openapi.koreainvestment.com:9443")
+TOKEN_DIR = os.environ.get(
+    "KIS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "kis"),
+)
+REFRESH_MARGIN = 60 * 60        # 만료 1시간 전부터 새로 발급
+DEFAULT_TTL = 24 * 60 * 60      # 응답에 expires_in이 없을 때
+TIMEOUT = 10
+EXPIRED_CODES = ("EGW00123", "EGW00121")  # 만료/유효하지 않은 토큰
+THROTTLE_CODES = ("EGW00201",)             # 초당 거래건수 초과
+TPS = float(os.environ.get("KIS_TPS", "18"))  # 실전 계좌 초당 20건 한도에서 여유를 둠 (모의투자는 2)
+THROTTLE_RETRIES = 3
+THROTTLE_BACKOFF = 0.25
+
+
+class KisError(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    초당 rate개, 최대 burst개까지 몰아 쓸 수 있는 요청 한도 (스레드 공유)
+    서버는 "최근 1초 동안 N건"으로 세므로 기본 burst=1 (요청 간격을 1/rate초로 고르게)
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """토큰 하나를 쓸 때까지 기다립니다 (rate <= 0이면 제한 없음)"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class KisClient:
+    """토큰과 HTTP 연결을 재사용하는 KIS API 호출기"""
+
+    def __init__(self, app_key, app_secret, url_base=None, token_dir=TOKEN_DIR, timeout=TIMEOUT, tps=TPS):
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.url_base = (url_base or URL_BASE).rstrip("/")
+        self.timeout = timeout
+        self.limiter = TokenBucket(tps)  # 같은 appkey의 모든 호출(시세/주문/hashkey/토큰)이 공유
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+
+        # 같은 키라도 접속 주소(실전/모의)가 다르면 토큰이 다르므로 파일을 나눕니다
+        ident = hashlib.sha256(f"{self.url_base}|{app_key}".encode()).hexdigest()[:16]
+        self.token_path = os.path.join(token_dir, f"token_{ident}.json")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "content-type": "application/json; charset=utf-8",
+            "appKey": app_key,
+            "appSecret": app_secret,
+        })
+
+    # -------------------------------------------------------------------------
+    # 토큰
+    # -------------------------------------------------------------------------
+    def _load_token(self):
+        try:
+            with open(self.token_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            return saved["access_token"], float(saved["expires_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, 0.0
+
+    def _save_token(self, token, expires_at):
+        os.makedirs(os.path.dirname(self.token_path), exist_ok=True)
+        tmp = f"{self.token_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"access_token": token, "expires_at": expires_at}, f)
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.token_path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _fresh(self, expires_at):
+        return expires_at - REFRESH_MARGIN > time.time()
+
+    def _issue_token(self):
+        body = {"grant_type": "client_credentials", "appkey": self.app_key, "appsecret": self.app_secret}
+        res = self._send("POST", "/oauth2/tokenP", data=json.dumps(body))
+        data = res.json()
+        if "access_token" not in data:
+            raise KisError(f"토큰 발급 실패: {data.get('error_description') or data}")
+        ttl = float(data.get("expires_in") or DEFAULT_TTL)
+        return data["access_token"], time.time() + ttl
+
+    def token(self, refresh=False):
+        """유효한 접근 토큰 (메모리 -> 디스크 -> 새로 발급 순)"""
+        with self._lock:
+            if not refresh and self._token and self._fresh(self._expires_at):
+                return self._token
+            if not refresh:
+                token, expires_at = self._load_token()
+                if token and self._fresh(expires_at):
+                    self._token, self._expires_at = token, expires_at
+                    return token
+            token, expires_at = self._issue_token()
+            self._save_token(token, expires_at)
+            self._token, self._expires_at = token, expires_at
+            return token
+
+    def invalidate(self):
+        """서버가 토큰을 거절했을 때 (메모리/디스크 모두 버림)"""
+        with self._lock:
+            self._token, self._expires_at = None, 0.0
+            try:
+                os.remove(self.token_path)
+            except OSError:
+                pass
+
+    # -------------------------------------------------------------------------
+    # 호출
+    # -------------------------------------------------------------------------
+    def headers(self, tr_id, **extra):
+        """요청별 헤더 (appKey/appSecret/content-type은 세션 기본값)"""
+        h = {"authorization": f"Bearer {self.token()}", "tr_id": tr_id}
+        h.update(extra)
+        return h
+
+    def _send(self, method, path, tr_id=None, attempt=1, target=None, **kwargs):
+        """HTTP 한 번 (실행 추적 중이면 시간/상태/거래소를 기록)"""
+        self.limiter.acquire()
+        tracer = kis_trace.get_tracer()
+        if tracer is None:
+            return self.session.request(method, f"{self.url_base}{path}", timeout=self.timeout, **kwargs)
+
+        start = time.perf_counter()
+        exchange, symbol = target or (None, None)
+        try:
+            res = self.session.request(method, f"{self.url_base}{path}", timeout=self.timeout, **kwargs)
+        except Exception as e:
+            tracer.http(path, method, time.perf_counter() - start, attempt=attempt, tr_id=tr_id,
+                        exchange=exchange, symbol=symbol, error=str(e) or type(e).__name__)
+            raise
+        seconds = time.perf_counter() - start
+        try:
+            data = res.json()
+        except ValueError:
+            data = {}
+        data = data if isinstance(data, dict) else {}
+        tracer.http(path, method, seconds, status=res.status_code, rt_cd=data.get("rt_cd"),
+                    msg_cd=data.get("msg_cd") or data.get("error_code"), attempt=attempt, tr_id=tr_id,
+                    exchange=exchange, symbol=symbol)
+        return res
+
+    def _request(self, method, path, tr_id, extra, target=None, **kwargs):
+        """
+        토큰이 거절되면 한 번 새로 발급, 초당 한도에 걸리면 잠시 뒤 다시 (거절된 요청은 처리되지 않음)
+        tr_id=None이면 인증 헤더 없이 보냅니다. (hashkey)
+        """
+        renewed, throttled, attempt = False, 0, 0
+        while True:
+            attempt += 1
+            headers = self.headers(tr_id, **extra) if tr_id else extra
+            res = self._send(method, path, tr_id, attempt, target, headers=headers, **kwargs)
+            if tr_id and not renewed and _token_rejected(res):
+                renewed = True
+                self.invalidate()
+                continue
+            if throttled < THROTTLE_RETRIES and _msg_cd(res) in THROTTLE_CODES:
+                throttled += 1
+                time.sleep(THROTTLE_BACKOFF * throttled)
+                continue
+            return res
+
+    def get(self, path, tr_id, params=None, **extra):
+        params = params or {}
+        target = (params.get("EXCD") or params.get("OVRS_EXCG_CD"), params.get("SYMB") or params.get("PDNO"))
+        return self._request("GET", path, tr_id, extra, target, params=params)
+
+    def post(self, path, tr_id, body, hashkey=False, **extra):
+        """body(dict)를 JSON으로 보냄 - hashkey=True면 주문용 hashkey 헤더를 붙입니다"""
+        json_body = json.dumps(body, separators=(',', ':'))
+        if hashkey:
+            extra["hashkey"] = self.hashkey(json_body)
+        target = (body.get("OVRS_EXCG_CD"), body.get("PDNO"))
+        return self._request("POST", path, tr_id, extra, target, data=json_body)
+
+    def hashkey(self, json_body):
+        res = self._request("POST", "/uapi/hashkey", None, {}, data=json_body)
+        return res.json()["HASH"]
+
+
+def _msg_cd(res):
+    try:
+        data = res.json()
+    except ValueError:
+        return None
+    return data.get("msg_cd") if isinstance(data, dict) else None
+
+
+def _token_rejected(res):
+    return res.status_code == 401 or _msg_cd(res) in EXPIRED_CODES
+
+
+# -----------------------------------------------------------------------------
+# 프로세스 전역 클라이언트
+# -----------------------------------------------------------------------------
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(app_key, app_secret, url_base=None):
+    """같은 키/주소면 같은 클라이언트(세션, 토큰)를 돌려줍니다"""
+    key = (app_key, url_base or URL_BASE)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = KisClient(app_key, app_secret, url_base)
+        return _clients[key]
+
+
+# -----------------------------------------------------------------------------
+# 종목 -> 거래소 캐시
+# -----------------------------------------------------------------------------
+# 시세/주문 API는 거래소 코드를 알아야 해서, 예전에는 거래소 3곳을 차례로 시도했습니다.
+# (주문은 거래소마다 hashkey + 주문 요청 -> 최대 6번 헛 왕복)
+# 처음 성공한 거래소를 파일에 기억해 두고 다음부터는 그 거래소부터 시도합니다.
+# 기억한 거래소가 실패할 때만 나머지 거래소로 넘어갑니다.
+
+EXCHANGES = ("NAS", "NYS", "AMS")
+SEED_EXCHANGES = {"SPY": "AMS", "UPRO": "AMS", "SSO": "AMS", "TQQQ": "NAS"}
+EXCHANGE_PATH = os.path.join(TOKEN_DIR, "exchanges.json")
+
+
+class ExchangeMap:
+    """종목별 거래소 (디스크 저장, 미리 알려진 종목은 기본값으로 채움)"""
+
+    def __init__(self, path=EXCHANGE_PATH, seed=SEED_EXCHANGES):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map = dict(seed)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._map.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def get(self, symbol):
+        return self._map.get(symbol)
+
+    def candidates(self, symbol, order=EXCHANGES):
+        """시도할 거래소 순서 (기억한 거래소 먼저, 나머지는 order 순)"""
+        known = self._map.get(symbol)
+        rest = [e for e in order if e != known]
+        return [known] + rest if known else rest
+
+    def learn(self, symbol, exchange):
+        with self._lock:
+            if self._map.get(symbol) == exchange:
+                return
+            self._map[symbol] = exchange
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._map, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+_exchanges = None
+
+
+def get_exchange_map():
+    """프로세스 전역 종목 -> 거래소 캐시"""
+    global _exchanges
+    with _clients_lock:
+        if _exchanges is None:
+            _exchanges = ExchangeMap()
+        return _exchanges
+
+
+# -----------------------------------------------------------------------------
+# 일봉 (여러 페이지)
+# -----------------------------------------------------------------------------
+# dailyprice 한 번의 응답은 약 100개 봉뿐이라 200일 평균을 계산하기에 부족합니다.
+# 응답에서 가장 오래된 날짜 전날로 BYMD를 옮겨 가며, 원하는 날짜/개수에 닿을 때까지 받습니다.
+
+DAILY_PATH = "/uapi/overseas-price/v1/quotations/dailyprice"
+DAILY_TR_ID = "HHDFS76240000"
+MAX_PAGES = 40
+
+
+def _daily_page(client, symbol, exchange, bymd):
+    params = {"AUTH": "", "EXCD": exchange, "SYMB": symbol, "GUBN": "D", "BYMD": bymd, "MODP": "1"}
+    res = client.get(DAILY_PATH, DAILY_TR_ID, params)
+    if res.status_code != 200:
+        return []
+    return [r for r in res.json().get("output2") or [] if r.get("xymd") and r.get("clos")]
+
+
+def daily_history(client, symbol, start=None, depth=None, bymd=None):
+    """
+    해외 종목 일봉을 BYMD를 과거로 옮겨 가며 받습니다.
+    start 이전 날짜에 닿거나, depth개를 채우거나, 더 이상 데이터가 없으면 멈춥니다.
+    반환: DataFrame (Close, Volume) 날짜 오름차순
+    """
+    exchanges = get_exchange_map()
+    bymd = bymd or time.strftime("%Y%m%d")
+    start = pd.Timestamp(start) if start is not None else None
+    exchange, rows = None, []
+
+    for _ in range(MAX_PAGES):
+        if exchange is None:
+            # 첫 페이지에서 거래소를 정함 (기억한 거래소 먼저)
+            for exc in exchanges.candidates(symbol):
+                page = _daily_page(client, symbol, exc, bymd)
+                if page:
+                    exchange = exc
+                    exchanges.learn(symbol, exc)
+                    break
+        else:
+            page = _daily_page(client, symbol, exchange, bymd)
+        if not page:
+            break
+        rows.extend(page)
+
+        oldest = pd.Timestamp(min(r["xymd"] for r in page))
+        if start is not None and oldest <= start:
+            break
+        if depth is not None and len({r["xymd"] for r in rows}) >= depth:
+            break
+        bymd = (oldest - pd.Timedelta(days=1)).strftime("%Y%m%d")
+
+    if not rows:
+        return pd.DataFrame(columns=["Close", "Volume"])
+    df = pd.DataFrame({
+        "Close": pd.to_numeric([r["clos"] for r in rows], errors="coerce"),
+        "Volume": pd.to_numeric([r.get("tvol") for r in rows], errors="coerce"),
+    }, index=pd.to_datetime([r["xymd"] for r in rows], format="%Y%m%d"))
+    df = df[~df.index.duplicated(keep="first")].sort_index().dropna(subset=["Close"])
+    if start is not None:
+        df = df.loc[start:]
+    return df.iloc[-depth:] if depth is not None else df
+
+
+# -----------------------------------------------------------------------------
+# 동시 호출 (asyncio)
+# -----------------------------------------------------------------------------
+# 장 시작 직후 판단 -> 주문까지 걸리는 시간이 호출 시간의 "합"이 아니라 "가장 느린 호출 하나"가
+# 되도록, 서로 독립적인 조회(차트, 후보 종목 시세, 잔고 등)를 동시에 실행합니다.
+# 각 호출은 스레드에서 돌고(같은 Session의 연결 풀 공유), 호출마다 시간 제한이 있습니다.
+# 시간이 지나면 기다리기를 멈추고 KisError를 돌려줍니다. (스레드 쪽 요청은 requests timeout으로 끝남)
+# asyncio.to_thread는 asyncio.run()이 끝날 때 남은 스레드를 기다리므로 별도 스레드 풀을 씁니다.
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="kis")  # 동시 호출 안에서 또 동시 호출(잔고 조회)해도 모자라지 않게
+
+
+async def run(fn, *args, timeout=TIMEOUT, **kwargs):
+    """동기 함수 하나를 스레드에서 실행 (timeout 초 제한)"""
+    try:
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        raise KisError(f"{getattr(fn, '__name__', fn)} 시간 초과 ({timeout}초)") from None
+
+
+async def gather(calls, timeout=TIMEOUT):
+    """
+    {이름: (함수, 인자...)}를 동시에 실행합니다.
+    반환: {이름: 결과 또는 예외} - 하나가 실패해도 나머지 결과는 그대로 받습니다.
+    """
+    names = list(calls)
+    results = await asyncio.gather(*(run(*calls[n], timeout=timeout) for n in names), return_exceptions=True)
+    return dict(zip(names, results))
+
+
+def fetch_all(calls, timeout=TIMEOUT):
+    """gather()의 동기 버전 (스크립트용)"""
+    return asyncio.run(gather(calls, timeout))
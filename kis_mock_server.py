@@ -0,0 +1,306 @@
+import json
+import time
+import zlib
+import random
+import hashlib
+import argparse
+import threading
+from datetime import date, timedelta
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------------------------------------------------------
+# KIS Open API 모의 서버 (로컬 벤치마크 / 회귀 테스트용)
+# -----------------------------------------------------------------------------
+# 실계좌 없이 auto_trade.py의 주문 경로(tokenP, hashkey, 현재가, 일봉, 주문, 잔고, 주문가능금액)를 돌려 보기 위한 서버입니다.
+# 응답 모양은 실제 API에서 봇이 읽는 필드만 흉내 냅니다.
+# - latency: 요청마다 지연 (초, 엔드포인트별로 따로 줄 수 있음)
+# - rate_limit: 초당 요청 수 제한 (넘으면 EGW00201, 실제 서버처럼 HTTP 500)
+# - order_error_rate: 주문을 rt_cd='1'로 거절할 확률
+# - token_interval: 토큰 재발급 최소 간격 (실제 서버는 1분에 1회)
+# 가격은 종목 이름으로 시드를 정한 랜덤워크라서 실행할 때마다 같습니다.
+#
+# 실행: KIS_URL_BASE=http://127.0.0.1:8765 python auto_trade.py  (서버: python kis_mock_server.py)
+
+EXCHANGES = {"SPY": "AMS", "UPRO": "AMS", "SSO": "AMS", "TQQQ": "NAS", "QQQ": "NAS"}
+HISTORY_DAYS = 1500
+DAILY_PAGE = 100
+BALANCE_PAGE = 20
+
+ENDPOINTS = {
+    ("POST", "/oauth2/tokenP"): "token",
+    ("POST", "/uapi/hashkey"): "hashkey",
+    ("GET", "/uapi/overseas-price/v1/quotations/price"): "price",
+    ("GET", "/uapi/overseas-price/v1/quotations/dailyprice"): "daily",
+    ("POST", "/uapi/overseas-stock/v1/trading/order"): "order",
+    ("GET", "/uapi/overseas-stock/v1/trading/inquire-balance"): "balance",
+    ("GET", "/uapi/overseas-stock/v1/trading/inquire-psamount"): "psamount",
+}
+
+
+def _history(symbol):
+    """종목별 고정 일봉 (최근 날짜 먼저) - [(YYYYMMDD, 종가), ...]"""
+    rng = random.Random(zlib.crc32(symbol.encode()))
+    price = 50.0 + rng.random() * 400
+    day = date.today()
+    rows = []
+    while len(rows) < HISTORY_DAYS:
+        if day.weekday() < 5:
+            rows.append((day.strftime("%Y%m%d"), round(price, 2)))
+            price /= 1 + rng.gauss(0.0004, 0.012)
+        day -= timedelta(days=1)
+    return rows
+
+
+class MockState:
+    """서버 설정 + 계좌/토큰/통계 (요청 스레드들이 공유)"""
+
+    def __init__(self, latency=0.0, endpoint_latency=None, rate_limit=0, order_error_rate=0.0,
+                 token_ttl=86400, token_interval=0.0, cash=10000.0, holdings=None, seed=0):
+        self.latency = latency
+        self.endpoint_latency = dict(endpoint_latency or {})
+        self.rate_limit = rate_limit
+        self.order_error_rate = order_error_rate
+        self.token_ttl = token_ttl
+        self.token_interval = token_interval
+        self.cash = cash
+        self.holdings = dict(holdings or {})   # {종목: 수량}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._histories = {}
+        self._tokens = {}                      # 토큰 -> 만료 시각
+        self._last_token = 0.0
+        self._window = []                      # 최근 1초 요청 시각
+        self._order_no = 0
+        self.counts = {}
+
+    def reset(self, cash=None, holdings=None):
+        """통계 초기화 (cash를 주면 계좌도 초기화)"""
+        with self._lock:
+            self.counts = {}
+            if cash is not None:
+                self.cash = cash
+                self.holdings = dict(holdings or {})
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, total=sum(self.counts.values()))
+
+    def history(self, symbol):
+        with self._lock:
+            if symbol not in self._histories:
+                self._histories[symbol] = _history(symbol)
+            return self._histories[symbol]
+
+    def hit(self, name):
+        """통계 + 초당 요청 제한 (넘으면 False)"""
+        now = time.time()
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            if not self.rate_limit:
+                return True
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.rate_limit:
+                return False
+            self._window.append(now)
+            return True
+
+    def delay(self, name):
+        wait = self.endpoint_latency.get(name, self.latency)
+        if wait:
+            time.sleep(wait)
+
+    def issue_token(self):
+        with self._lock:
+            now = time.time()
+            if self.token_interval and now - self._last_token < self.token_interval:
+                return None
+            self._last_token = now
+            token = hashlib.sha256(f"{now}-{len(self._tokens)}".encode()).hexdigest()
+            self._tokens[token] = now + self.token_ttl
+            return token
+
+    def valid(self, token):
+        with self._lock:
+            return self._tokens.get(token, 0) > time.time()
+
+    def order(self, symbol, exchange, side, qty, price):
+        with self._lock:
+            if EXCHANGES.get(symbol, "NAS") != exchange:
+                return False, "해당 거래소에 없는 종목입니다."
+            if self._rng.random() < self.order_error_rate:
+                return False, "주문 처리 중 오류가 발생했습니다. (모의)"
+            cost = qty * price
+            if side == "buy":
+                if cost > self.cash:
+                    return False, "주문가능금액을 초과 하였습니다."
+                self.cash -= cost
+                self.holdings[symbol] = self.holdings.get(symbol, 0) + qty
+            else:
+                if self.holdings.get(symbol, 0) < qty:
+                    return False, "매도가능수량을 초과 하였습니다."
+                self.cash += cost
+                self.holdings[symbol] -= qty
+            self._order_no += 1
+            return True, f"{self._order_no:010d}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive (클라이언트 Session 재사용 확인용)
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, obj, status=200, headers=None):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, msg_cd, msg1, status=500):
+        self._send({"rt_cd": "1", "msg_cd": msg_cd, "msg1": msg1}, status)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n) if n else b""
+        return raw, (json.loads(raw) if raw else {})
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        raw, body = self._body() if method == "POST" else (b"", {})
+        if method == "POST" and url.path == "/__reset":
+            self.state.reset()
+            return self._send({"ok": True})
+        if method == "GET" and url.path == "/__stats":
+            return self._send(self.state.stats())
+
+        name = ENDPOINTS.get((method, url.path))
+        if name is None:
+            return self._send({"error": "not found"}, 404)
+        if not self.state.hit(name):
+            return self._error("EGW00201", "초당 거래건수를 초과하였습니다.")
+        self.state.delay(name)
+
+        if name == "token":
+            token = self.state.issue_token()
+            if token is None:
+                return self._send({"error_code": "EGW00133",
+                                   "error_description": "접근토큰 발급 잠시 후 다시 시도하세요(1분당 1회)"}, 403)
+            return self._send({"access_token": token, "token_type": "Bearer", "expires_in": self.state.token_ttl})
+        if name == "hashkey":
+            return self._send({"HASH": hashlib.sha256(raw).hexdigest(), "BODY": body})
+
+        token = (self.headers.get("authorization") or "").replace("Bearer ", "")
+        if not self.state.valid(token):
+            return self._error("EGW00123", "기간이 만료된 token 입니다.")
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        getattr(self, f"_{name}")(query, body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    # -------------------------------------------------------------------------
+    # 엔드포인트
+    # -------------------------------------------------------------------------
+    def _price(self, query, body):
+        symbol, excd = query.get("SYMB", ""), query.get("EXCD", "")
+        last = ""
+        if EXCHANGES.get(symbol, "NAS") == excd:
+            last = str(self.state.history(symbol)[0][1])
+        self._send({"rt_cd": "0", "msg_cd": "MCA00000", "msg1": "정상처리 되었습니다.",
+                    "output": {"rsym": f"D{excd}{symbol}", "last": last}})
+
+    def _daily(self, query, body):
+        symbol, excd = query.get("SYMB", ""), query.get("EXCD", "")
+        bymd = query.get("BYMD") or date.today().strftime("%Y%m%d")
+        rows = []
+        if EXCHANGES.get(symbol, "NAS") == excd:
+            rows = [r for r in self.state.history(symbol) if r[0] <= bymd][:DAILY_PAGE]
+        self._send({"rt_cd": "0", "msg_cd": "MCA00000", "msg1": "정상처리 되었습니다.",
+                    "output1": {"rsym": f"D{excd}{symbol}", "nrec": str(len(rows))},
+                    "output2": [{"xymd": d, "clos": str(c), "tvol": "1000000"} for d, c in rows]})
+
+    def _order(self, query, body):
+        side = "sell" if self.headers.get("tr_id") in ("TTTT1006U", "VTTT1001U") else "buy"
+        ok, result = self.state.order(body.get("PDNO", ""), body.get("OVRS_EXCG_CD", ""), side,
+                                      int(body.get("ORD_QTY") or 0), float(body.get("OVRS_ORD_UNPR") or 0))
+        if not ok:
+            return self._send({"rt_cd": "1", "msg_cd": "APBK0656", "msg1": result})
+        self._send({"rt_cd": "0", "msg_cd": "APBK0013", "msg1": "주문 전송 완료 되었습니다.",
+                    "output": {"KRX_FWDG_ORD_ORGNO": "01790", "ODNO": result, "ORD_TMD": time.strftime("%H%M%S")}})
+
+    def _balance(self, query, body):
+        excd = query.get("OVRS_EXCG_CD", "")
+        with self.state._lock:
+            items = sorted((s, q) for s, q in self.state.holdings.items() if q > 0 and EXCHANGES.get(s, "NAS") == excd)
+        start = int(query.get("CTX_AREA_NK200") or query.get("CTX_AREA_NK100") or 0)
+        page = items[start:start + BALANCE_PAGE]
+        more = start + BALANCE_PAGE < len(items)
+        output1 = []
+        for symbol, qty in page:
+            price = self.state.history(symbol)[0][1]
+            output1.append({"ovrs_pdno": symbol, "ovrs_excg_cd": excd, "ovrs_cblc_qty": str(qty),
+                            "ord_psbl_qty": str(qty), "now_pric2": str(price),
+                            "ovrs_stck_evlu_amt": f"{qty * price:.2f}"})
+        nk = str(start + BALANCE_PAGE) if more else ""
+        self._send({"rt_cd": "0", "msg_cd": "KIOK0510", "msg1": "조회가 완료되었습니다",
+                    "ctx_area_fk200": "", "ctx_area_nk200": nk,
+                    "output1": output1, "output2": {"frcr_pchs_amt1": "0", "tot_evlu_pfls_amt": "0"}},
+                   headers={"tr_cont": "M" if more else "D"})
+
+
+    def _psamount(self, query, body):
+        with self.state._lock:
+            cash = self.state.cash
+        self._send({"rt_cd": "0", "msg_cd": "KIOK0460", "msg1": "조회 되었습니다.",
+                    "output": {"tr_crcy_cd": "USD", "ord_psbl_frcr_amt": f"{cash:.2f}",
+                               "ovrs_ord_psbl_amt": f"{cash:.2f}"}})
+
+
+def serve(host="127.0.0.1", port=0, **config):
+    """
+    백그라운드 스레드로 서버 시작 (port=0이면 빈 포트)
+    반환: (server, URL) - server.state로 설정/통계 접근, 끝낼 때 server.shutdown()
+    """
+    handler = type("BoundHandler", (Handler,), {"state": MockState(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = handler.state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KIS Open API 모의 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="요청마다 지연 (초)")
+    parser.add_argument("--order-latency", type=float, default=None, help="주문 요청 지연 (초)")
+    parser.add_argument("--rate-limit", type=int, default=20, help="초당 요청 수 (0이면 제한 없음)")
+    parser.add_argument("--order-error-rate", type=float, default=0.0, help="주문 거절 확률")
+    parser.add_argument("--token-interval", type=float, default=60.0, help="토큰 재발급 최소 간격 (초)")
+    parser.add_argument("--cash", type=float, default=10000.0)
+    args = parser.parse_args()
+
+    endpoint_latency = {"order": args.order_latency} if args.order_latency is not None else {}
+    server, url = serve(args.host, args.port, latency=args.latency, endpoint_latency=endpoint_latency,
+                        rate_limit=args.rate_limit, order_error_rate=args.order_error_rate,
+                        token_interval=args.token_interval, cash=args.cash)
+    print(f"🧪 KIS 모의 서버: {url}  (KIS_URL_BASE={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+# -----------------------------------------------------------------------------
+# 봇 실행 추적 (HTTP 호출별 시간 / 상태 / 재시도 / 거래소)
+# -----------------------------------------------------------------------------
+# 출력 메시지만으로는 "어느 KIS 호출이 느렸는지" 알 수 없어서, 실행(run) 하나 동안의 모든 호출을
+# JSON 한 줄씩 파일에 남기고 끝날 때 엔드포인트별 지연 요약을 출력합니다.
+# - 파일: KIS_TRACE_DIR (기본 .cache/kis/traces) / YYYYMMDD.jsonl (run_id로 실행 구분)
+# - 호출: kind='http', endpoint, status, rt_cd, msg_cd, seconds, attempt(토큰 재시도), exchange, symbol
+# - 단계: kind='step' (yfinance 등 HTTP가 아닌 작업, span()으로 기록)
+# - 요약: kind='summary' (실행 끝)
+# 실행을 시작하지 않았으면(start_run 전) 아무것도 기록하지 않습니다.
+
+TRACE_DIR = os.environ.get(
+    "KIS_TRACE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "kis", "traces"),
+)
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(int(round(q * (len(values) - 1))), len(values) - 1)
+    return values[k]
+
+
+class Tracer:
+    """실행 하나의 호출 기록"""
+
+    def __init__(self, name, directory=TRACE_DIR):
+        self.name = name
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.records = []
+        self._lock = threading.Lock()
+        self.path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, time.strftime("%Y%m%d") + ".jsonl")
+        except OSError:
+            pass
+
+    def _write(self, record):
+        record = dict(record, run_id=self.run_id, run=self.name)
+        with self._lock:
+            if record.get("kind") != "summary":
+                self.records.append(record)
+            if self.path is None:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            except OSError:
+                pass
+
+    def http(self, endpoint, method, seconds, status=None, rt_cd=None, msg_cd=None,
+             attempt=1, exchange=None, symbol=None, tr_id=None, error=None):
+        self._write({
+            "kind": "http", "ts": time.time(), "endpoint": endpoint, "method": method, "tr_id": tr_id,
+            "status": status, "rt_cd": rt_cd, "msg_cd": msg_cd, "seconds": round(seconds, 6),
+            "attempt": attempt, "exchange": exchange, "symbol": symbol, "error": error,
+        })
+
+    @contextmanager
+    def span(self, name, **fields):
+        """HTTP가 아닌 단계의 시간 기록"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            self._write(dict(fields, kind="step", ts=time.time(), endpoint=name,
+                             seconds=round(time.perf_counter() - start, 6), error=error))
+
+    def summary(self):
+        """엔드포인트별 요약 (호출 수, 합계/평균/p50/최대 시간, 재시도, 헛 거래소, 오류)"""
+        with self._lock:
+            records = list(self.records)
+        table = {}
+        tried = {}
+        for r in records:
+            row = table.setdefault(r["endpoint"], {"kind": r["kind"], "seconds": [], "retries": 0,
+                                                   "exchange_misses": 0, "errors": 0})
+            row["seconds"].append(r["seconds"])
+            row["retries"] += max(r.get("attempt", 1) - 1, 0)
+            failed = r.get("error") or (r.get("status") or 200) >= 400 or r.get("rt_cd") not in (None, "", "0")
+            row["errors"] += bool(failed)
+            if r.get("exchange") and r.get("symbol"):
+                tried.setdefault((r["endpoint"], r["symbol"]), set()).add(r["exchange"])
+        # 같은 종목에 거래소를 여러 곳 시도했다면 성공한 한 곳을 뺀 나머지는 헛 호출
+        for (endpoint, _), exchanges in tried.items():
+            table[endpoint]["exchange_misses"] += len(exchanges) - 1
+
+        out = {}
+        for endpoint, row in table.items():
+            secs = row.pop("seconds")
+            out[endpoint] = dict(row, calls=len(secs), total=sum(secs), mean=sum(secs) / len(secs),
+                                 p50=_percentile(secs, 0.5), max=max(secs))
+        return out
+
+    def finish(self, verbose=True):
+        elapsed = time.perf_counter() - self._t0
+        summary = self.summary()
+        self._write({"kind": "summary", "ts": time.time(), "seconds": round(elapsed, 6), "endpoints": summary})
+        if verbose:
+            print_summary(summary, elapsed)
+        return summary
+
+
+def print_summary(summary, elapsed):
+    http = {k: v for k, v in summary.items() if v["kind"] == "http"}
+    calls = sum(v["calls"] for v in http.values())
+    busy = sum(v["total"] for v in http.values())
+    print(f"\n⏱️ [실행 요약] {elapsed:.2f}초 | KIS 호출 {calls}회 (호출 시간 합 {busy:.2f}초)")
+    if not summary:
+        return
+    print(f"   {'endpoint':<48} {'calls':>5} {'total':>7} {'mean':>7} {'max':>7} {'retry':>5} {'exch':>5} {'err':>4}")
+    for endpoint, v in sorted(summary.items(), key=lambda kv: -kv[1]["total"]):
+        print(f"   {endpoint[-48:]:<48} {v['calls']:>5} {v['total']:>7.3f} {v['mean']:>7.3f} {v['max']:>7.3f} "
+              f"{v['retries']:>5} {v['exchange_misses']:>5} {v['errors']:>4}")
+
+
+# -----------------------------------------------------------------------------
+# 프로세스 전역 실행
+# -----------------------------------------------------------------------------
+_current = None
+_current_lock = threading.Lock()
+
+
+def start_run(name):
+    """새 실행 시작 (이후 호출은 이 실행에 기록)"""
+    global _current
+    with _current_lock:
+        _current = Tracer(name)
+        return _current
+
+
+def get_tracer():
+    """현재 실행 (시작하지 않았으면 None)"""
+    return _current
+
+
+def finish(verbose=True):
+    """현재 실행 종료 + 요약 출력"""
+    global _current
+    with _current_lock:
+        tracer, _current = _current, None
+    return tracer.finish(verbose) if tracer is not None else None
+
+
+@contextmanager
+def span(name, **fields):
+    """현재 실행에 단계 기록 (실행이 없으면 그냥 실행)"""
+    tracer = _current
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name, **fields):
+        yield
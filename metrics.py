@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 성과 지표 (모든 페이지 공용)
+# -----------------------------------------------------------------------------
+# 페이지마다 CAGR 공식(252/일수, 365/달력일)과 MDD 계산(cummax 컬럼 추가)이 달랐습니다.
+# 여기서는 수익률 배열을 한 번 float64 배열로 바꾼 뒤, 누적 자산/고점을 한 번씩만 만들고
+# 모든 지표를 그 배열에서 뽑아 작은 결과 객체로 돌려줍니다. (DataFrame 컬럼 추가/복사 없음)
+#
+# CAGR은 거래일 기준(연 252일)으로 통일합니다.
+
+PERIODS_PER_YEAR = 252
+
+
+class PerfStats:
+    """성과 지표 묶음"""
+
+    __slots__ = ('total_return', 'cagr', 'mdd', 'mdd_duration', 'volatility',
+                 'sharpe', 'sortino', 'calmar', 'hit_rate', 'periods')
+
+    LABELS = {
+        'total_return': '총 수익률',
+        'cagr': 'CAGR',
+        'mdd': 'MDD',
+        'mdd_duration': 'MDD 기간 (거래일)',
+        'volatility': '연 변동성',
+        'sharpe': 'Sharpe',
+        'sortino': 'Sortino',
+        'calmar': 'Calmar',
+        'hit_rate': '상승일 비율',
+    }
+
+    def __init__(self, **values):
+        for k in self.__slots__:
+            setattr(self, k, values.get(k, np.nan))
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return (f"PerfStats(total={self.total_return:.2%}, cagr={self.cagr:.2%}, "
+                f"mdd={self.mdd:.2%}, sharpe={self.sharpe:.2f})")
+
+
+def compute(returns, periods_per_year=PERIODS_PER_YEAR, risk_free=0.0):
+    """
+    기간 수익률(Series/배열) -> PerfStats
+    - 첫 값이 0(시작일)이어도 그대로 한 기간으로 셉니다. (기존 페이지들의 len(df) 기준과 동일)
+    - mdd는 음수 비율 (-0.25 = -25%)
+    - 고점은 첫 자산 값부터 셉니다. (drawdown() / 낙폭 차트 / drawdown.episodes와 같은 기준)
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    r = np.where(np.isfinite(r), r, 0.0)
+    n = len(r)
+    if n == 0:
+        return PerfStats(periods=0)
+
+    equity = np.cumprod(1.0 + r)
+    peak = np.maximum.accumulate(equity)
+    dd = equity / peak - 1
+
+    final = equity[-1]
+    cagr = final ** (periods_per_year / n) - 1 if final > 0 else -1.0
+    mdd = dd.min()
+
+    # 가장 긴 수중 구간 (고점 회복까지 걸린 기간)
+    at_peak = np.flatnonzero(dd >= -1e-12)
+    bounds = np.concatenate(([-1], at_peak, [n]))
+    mdd_duration = int(np.diff(bounds).max() - 1)
+
+    excess = r - risk_free / periods_per_year
+    std = r.std(ddof=1) if n > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))
+    ann = np.sqrt(periods_per_year)
+
+    traded = r != 0
+    return PerfStats(
+        total_return=final - 1,
+        cagr=cagr,
+        mdd=mdd,
+        mdd_duration=mdd_duration,
+        volatility=std * ann,
+        sharpe=excess.mean() / std * ann if std > 0 else np.nan,
+        sortino=excess.mean() / downside * ann if downside > 0 else np.nan,
+        calmar=cagr / -mdd if mdd < 0 else np.nan,
+        hit_rate=(r[traded] > 0).mean() if traded.any() else np.nan,
+        periods=n,
+    )
+
+
+def from_equity(equity, initial=None, periods_per_year=PERIODS_PER_YEAR, risk_free=0.0):
+    """
+    자산 곡선 -> PerfStats
+    initial이 주어지면 첫 값도 initial 대비 수익률로 셉니다. (총 수익률/CAGR만, MDD는 첫 값부터)
+    """
+    e = np.asarray(equity, dtype=np.float64)
+    if len(e) == 0:
+        return PerfStats(periods=0)
+    prev = np.empty_like(e)
+    prev[0] = e[0] if initial is None else initial
+    prev[1:] = e[:-1]
+    return compute(e / prev - 1, periods_per_year, risk_free)
+
+
+def drawdown(equity):
+    """고점 대비 하락률 (Series면 Series로)"""
+    values = np.asarray(equity, dtype=np.float64)
+    dd = values / np.maximum.accumulate(values) - 1
+    if isinstance(equity, pd.Series):
+        return pd.Series(dd, index=equity.index)
+    return dd
+
+
+def stats_frame(stats):
+    """{이름: PerfStats} -> 표 (지표 x 이름)"""
+    if isinstance(stats, PerfStats):
+        stats = {'Strategy': stats}
+    rows = list(PerfStats.LABELS)
+    return pd.DataFrame({name: [getattr(s, k) for k in rows] for name, s in stats.items()},
+                        index=[PerfStats.LABELS[k] for k in rows])
+
+
+def show_stats(stats):
+    """상세 지표 표시"""
+    import streamlit as st
+
+    table = stats_frame(stats)
+    pct = ['총 수익률', 'CAGR', 'MDD', '연 변동성', '상승일 비율']
+    disp = table.astype(object)
+    for label in table.index:
+        fmt = "{:.2%}" if label in pct else ("{:,.0f}" if label == 'MDD 기간 (거래일)' else "{:.2f}")
+        disp.loc[label] = [fmt.format(v) if pd.notna(v) else "-" for v in table.loc[label]]
+    with st.expander("📐 상세 성과 지표", expanded=False):
+        st.table(disp)
@@ -7,6 +7,8 @@ matplotlib.use('Agg')  # Non-interactive backend - NO POPUP WINDOWS
 import matplotlib.pyplot as plt
 import warnings
 warnings.filterwarnings('ignore')
+import metrics
+import calendar_returns
 
 # Reduced stock list for faster testing
 KOREAN_STOCKS = {
@@ -194,16 +196,12 @@ class VolumeWeightedMomentumStrategy:
         
         initial = portfolio_value.iloc[0]
         final = portfolio_value.iloc[-1]
-        total_return = (final - initial) / initial * 100
+        stats = metrics.from_equity(portfolio_value)
+        total_return = stats.total_return * 100
         
-        days = (portfolio_value.index[-1] - portfolio_value.index[0]).days
-        years = max(days / 365.25, 0.1)
-        cagr = (final / initial) ** (1/years) - 1
-        
-        # Drawdown
-        cumulative_max = portfolio_value.expanding().max()
-        drawdown = (portfolio_value - cumulative_max) / cumulative_max
-        mdd = drawdown.min() * 100
+        years = max(stats.periods / metrics.PERIODS_PER_YEAR, 0.1)
+        cagr = stats.cagr
+        mdd = stats.mdd * 100
         
         print(f"\nPerformance:")
         print(f"  Initial: {initial:,.0f} KRW")
@@ -211,6 +209,7 @@ class VolumeWeightedMomentumStrategy:
         print(f"  Return:  {total_return:.1f}%")
         print(f"  CAGR:    {cagr*100:.1f}%")
         print(f"  MDD:     {mdd:.1f}%")
+        print(f"  Sharpe:  {stats.sharpe:.2f}")
         
         if not kospi_returns.empty:
             try:
@@ -250,9 +249,7 @@ class VolumeWeightedMomentumStrategy:
             ax1.grid(True, alpha=0.3)
             
             # Monthly returns
-            monthly_returns = strategy_returns.resample('M').apply(
-                lambda x: (1 + x).prod() - 1
-            ) * 100
+            monthly_returns = calendar_returns.period_returns(strategy_returns, 'M') * 100
             
             colors = ['green' if x >= 0 else 'red' for x in monthly_returns]
             ax2.bar(range(len(monthly_returns)), monthly_returns.values, color=colors, alpha=0.7)
@@ -0,0 +1,249 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from holdings import SparseHoldings
+import costs
+
+# -----------------------------------------------------------------------------
+# 상대 모멘텀 백테스트 엔진 (KOSPI / 글로벌 / S&P500 모멘텀 페이지 공용)
+# -----------------------------------------------------------------------------
+
+
+def get_rebalance_dates(all_days, start_dt, end_dt, rebalance_step):
+    """리밸런싱 월의 마지막 거래일 목록"""
+    target_months = list(range(1, 13, rebalance_step))
+    rebalance_dates = []
+
+    for year in range(start_dt.year, end_dt.year + 1):
+        for month in target_months:
+            month_data = all_days[(all_days.year == year) & (all_days.month == month)]
+            if not month_data.empty:
+                rebalance_dates.append(month_data[-1])
+
+    return sorted(list(set([d for d in rebalance_dates if start_dt <= d <= end_dt])))
+
+
+def _past_date(index, curr_date, momentum_window, past_lookup):
+    """모멘텀 기준 과거 날짜 (index: 거래일, 없으면 None)"""
+    past_date_target = curr_date - pd.DateOffset(months=momentum_window)
+    if past_lookup == 'searchsorted':
+        idx_loc = index.searchsorted(past_date_target)
+        if idx_loc >= len(index):
+            return None
+    else:
+        idx_loc = index.get_indexer([past_date_target], method='nearest')[0]
+    return index[idx_loc]
+
+
+def run_momentum_backtest(df_price, rebalance_dates, momentum_window, top_n, code_map,
+                          past_lookup='nearest', eligibility=None, cost_model=None, capital=1e8):
+    """
+    리밸런싱 날짜마다 과거 N개월 수익률 상위 종목을 동일 비중으로 보유합니다.
+    - past_lookup: 'nearest' (가장 가까운 거래일) / 'searchsorted' (기준일 이후 첫 거래일)
+    - eligibility: universe.MembershipBitmap. 주어지면 그 날짜에 편입된 종목만 순위에 넣습니다.
+    - cost_model: costs.SquareRootImpact (prepare() 완료). 주어지면 운용 금액(capital) 기준으로
+      매매 비용을 차감하고, 매매별 비용 내역을 book.cost_log 에 남깁니다.
+    반환: (일별 포트폴리오 수익률 Series, holdings.SparseHoldings)
+
+    보유 기간 수익률은 보유 종목 열만 numpy로 잘라 계산하므로 유니버스 크기와 무관합니다.
+    """
+    portfolio_returns = []
+    book = SparseHoldings(df_price.columns, code_map)
+    col_pos = {c: j for j, c in enumerate(df_price.columns)}
+    values = df_price.to_numpy()
+    index = df_price.index
+
+    # 편입 마스크는 가격 데이터와 같은 모양으로 한 번만 정렬해 둡니다
+    elig_mask = None
+    if eligibility is not None:
+        elig_mask = eligibility.aligned(df_price.index, df_price.columns)
+
+    for i in range(len(rebalance_dates) - 1):
+        curr_date = rebalance_dates[i]
+        next_date = rebalance_dates[i + 1]
+
+        try:
+            past_date_real = _past_date(index, curr_date, momentum_window, past_lookup)
+            if past_date_real is None:
+                continue
+
+            # asof()는 한 종목이라도 NaN이면 행 전체를 NaN으로 돌려주므로 위치로 직접 꺼냅니다
+            # (늦게 상장했거나 상장폐지된 종목이 있어도 나머지 종목은 순위에 들어감)
+            row = index.searchsorted(curr_date, side='right') - 1
+            past_row = index.searchsorted(past_date_real, side='right') - 1
+            if row < 0 or past_row < 0:
+                continue
+            p_curr = pd.Series(values[row], index=df_price.columns)
+            p_past = pd.Series(values[past_row], index=df_price.columns)
+
+            mom = (p_curr - p_past) / p_past
+            mom = mom.replace([np.inf, -np.inf], np.nan)
+
+            if elig_mask is not None:
+                mom = mom[elig_mask[row]]
+
+            mom = mom.dropna()
+            if mom.empty:
+                continue
+
+            top_series = mom.nlargest(top_n)
+            held = np.array([col_pos[c] for c in top_series.index], dtype=np.int32)
+            weight = np.full(len(held), 1.0 / len(held))
+            book.append(curr_date, held, weight, top_series.values)
+
+            r0 = index.searchsorted(curr_date, side='left')
+            r1 = index.searchsorted(next_date, side='right')
+            if r1 > r0:
+                period_ret = _period_returns(values[r0:r1, held], weight)
+                portfolio_returns.append(pd.Series(period_ret, index=index[r0:r1]))
+
+        except Exception:
+            continue
+
+    if not portfolio_returns:
+        return pd.Series(dtype=float), book
+
+    full_returns = pd.concat(portfolio_returns)
+    full_returns = full_returns[~full_returns.index.duplicated(keep='first')]
+
+    if cost_model is not None:
+        full_returns, book.cost_log = costs.apply_costs(full_returns, book, index, cost_model, capital)
+    return full_returns, book
+
+
+def _period_returns(prices, weight):
+    """보유 종목 가격 (기간 x 보유 종목) -> 일별 포트폴리오 수익률 (첫날 0)"""
+    rets = np.zeros_like(prices)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rets[1:] = prices[1:] / prices[:-1] - 1
+    rets[np.isnan(rets)] = 0
+    return rets @ weight.astype(rets.dtype)
+
+
+def current_picks(df_price, momentum_window, top_n, past_lookup='nearest', eligibility=None):
+    """마지막 거래일 기준 모멘텀 상위 종목 (Series: 코드 -> 수익률)"""
+    last_date = df_price.index[-1]
+    past = _past_date(df_price.index, last_date, momentum_window, past_lookup)
+    if past is None:
+        past = df_price.index[-1]
+
+    curr_mom = (df_price.iloc[-1] - df_price.loc[past]) / df_price.loc[past]
+    curr_mom = curr_mom.replace([np.inf, -np.inf], np.nan)
+    if eligibility is not None:
+        curr_mom = eligibility.mask(curr_mom, last_date)
+    return curr_mom.dropna().nlargest(top_n)
+
+
+# -----------------------------------------------------------------------------
+# Out-of-core 모드 (종목 묶음 단위로 읽어서 계산)
+# -----------------------------------------------------------------------------
+def _chunk_top_candidates(chunk, score_dates, past_dates, top_n, eligibility=None):
+    """
+    한 묶음(날짜 x 종목)에서 날짜별 모멘텀 상위 top_n 후보를 뽑습니다.
+    반환: 날짜별 [(점수, 종목), ...]
+    """
+    chunk = chunk.ffill()
+    values = chunk.to_numpy(dtype=np.float64)
+    rows_c = chunk.index.searchsorted(score_dates, side='right') - 1
+    rows_p = chunk.index.searchsorted(past_dates, side='right') - 1
+
+    # 기준일 이전 데이터가 없는 날짜는 전부 NaN 처리
+    p_curr = np.where((rows_c >= 0)[:, None], values[np.maximum(rows_c, 0)], np.nan)
+    p_past = np.where((rows_p >= 0)[:, None], values[np.maximum(rows_p, 0)], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mom = (p_curr - p_past) / p_past
+    mom[~np.isfinite(mom)] = np.nan
+
+    if eligibility is not None:
+        mom[~eligibility.aligned(score_dates, chunk.columns)] = np.nan
+
+    cols = chunk.columns
+    out = []
+    for row in mom:
+        valid = np.flatnonzero(~np.isnan(row))
+        if len(valid) > top_n:
+            valid = valid[np.argpartition(row[valid], -top_n)[-top_n:]]
+        out.append([(row[j], cols[j]) for j in valid])
+    return out
+
+
+def run_momentum_chunked(store, tickers, calendar, start_dt, end_dt, rebalance_step, momentum_window,
+                         top_n, code_map, chunk_size=200, past_lookup='nearest', eligibility=None,
+                         cost_model=None, capital=1e8, on_progress=None):
+    """
+    가격 저장소(price_store.PriceStore)에서 chunk_size 종목씩 읽어 모멘텀 점수를 계산하고,
+    리밸런싱 날짜마다 크기 top_n 힙으로 전체 상위 종목을 합칩니다.
+    보유 기간 수익률은 선정된 종목만 다시 읽어 계산하므로 메모리는 묶음 크기 + 보유 종목 수에 비례합니다.
+    - calendar: 거래일 인덱스 (벤치마크 지수 날짜 등)
+    - past_lookup: run_momentum_backtest와 같음 (같은 설정이면 같은 과거 날짜)
+    - cost_model: 주어지면 보유 종목의 가격/거래량으로 prepare() 후 비용을 차감합니다.
+    반환: (일별 포트폴리오 수익률 Series, holdings.SparseHoldings, 현재 추천 종목 Series)
+    """
+    calendar = pd.DatetimeIndex(calendar)
+    rebalance_dates = get_rebalance_dates(calendar, start_dt, end_dt, rebalance_step)
+    score_dates = list(rebalance_dates)
+    if not score_dates or score_dates[-1] != calendar[-1]:
+        score_dates.append(calendar[-1])
+    score_dates = pd.DatetimeIndex(score_dates)
+
+    # 점수 날짜는 calendar 안에 있으므로 과거 날짜가 None이 되지는 않습니다
+    past_dates = pd.DatetimeIndex([_past_date(calendar, d, momentum_window, past_lookup) for d in score_dates])
+    fetch_start = past_dates.min() - pd.DateOffset(months=1)
+
+    # 1단계: 묶음별 후보 -> 날짜별 크기 top_n 최소 힙
+    heaps = [[] for _ in score_dates]
+    n_chunks = (len(tickers) + chunk_size - 1) // chunk_size
+    for k, chunk in enumerate(store.iter_chunks(tickers, chunk_size, start=fetch_start)):
+        if on_progress:
+            on_progress(k, n_chunks)
+        candidates = _chunk_top_candidates(chunk, score_dates, past_dates, top_n, eligibility)
+        for heap, cands in zip(heaps, candidates):
+            for item in cands:
+                if len(heap) < top_n:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    picks = [sorted(h, reverse=True) for h in heaps]
+    current = pd.Series({t: v for v, t in picks[-1]}, dtype=float)
+
+    # 2단계: 보유했던 종목만 읽어서 기간 수익률 계산
+    held = sorted({t for day in picks[:len(rebalance_dates) - 1] for _, t in day})
+    book = SparseHoldings(held, code_map)
+    if not held:
+        return pd.Series(dtype=float), book, current
+
+    # 비용 모델의 평균 거래대금/변동성(전일까지 rolling)이 첫 리밸런싱에도 채워지도록 앞쪽 기간부터 읽습니다
+    df_price = store.panel(held, 'Close', start=fetch_start).ffill()
+    col_pos = {c: j for j, c in enumerate(df_price.columns)}
+    book = SparseHoldings(df_price.columns, code_map)
+    values = df_price.to_numpy()
+    index = df_price.index
+
+    portfolio_returns = []
+    for i in range(len(rebalance_dates) - 1):
+        day = [(v, t) for v, t in picks[i] if t in col_pos]
+        if not day:
+            continue
+        held_idx = np.array([col_pos[t] for _, t in day], dtype=np.int32)
+        weight = np.full(len(held_idx), 1.0 / len(held_idx))
+        book.append(rebalance_dates[i], held_idx, weight, [v for v, _ in day])
+
+        r0 = index.searchsorted(rebalance_dates[i], side='left')
+        r1 = index.searchsorted(rebalance_dates[i + 1], side='right')
+        if r1 > r0:
+            portfolio_returns.append(pd.Series(_period_returns(values[r0:r1, held_idx], weight), index=index[r0:r1]))
+
+    if not portfolio_returns:
+        return pd.Series(dtype=float), book, current
+
+    full_returns = pd.concat(portfolio_returns)
+    full_returns = full_returns[~full_returns.index.duplicated(keep='first')]
+
+    if cost_model is not None:
+        volumes = store.panel(df_price.columns, 'Volume', start=fetch_start)
+        cost_model.prepare(df_price, volumes)
+        full_returns, book.cost_log = costs.apply_costs(full_returns, book, index, cost_model, capital)
+    return full_returns, book, current
@@ -3,8 +3,11 @@ import yfinance as yf
 import pandas as pd
 import matplotlib.pyplot as plt
 import datetime
-import io
 import warnings
+import export
+import metrics
+import drawdown
+import rolling_metrics
 
 # 경고 무시
 warnings.filterwarnings('ignore')
@@ -149,8 +152,7 @@ def run_strategy(df, t_safe, t_risky, t_rate, ma_win, rate_ma_win, use_rate, exp
     df['Hold_Safe'] = (1 + daily_ret[t_safe]).cumprod()
     df['Hold_Risky'] = (1 + daily_ret[t_risky]).cumprod()
     
-    df['Peak'] = df['My_Asset'].cummax()
-    df['MDD'] = (df['My_Asset'] - df['Peak']) / df['Peak'] * 100
+    df['MDD'] = metrics.drawdown(df['My_Asset']) * 100
     
     return df, stock_ma_col, rate_ma_col
 
@@ -186,6 +188,8 @@ if run_btn:
             col1.metric("총 수익률 (Total Return)", f"{total_ret_pct:,.2f}%")
             col2.metric("연평균 수익률 (CAGR)", f"{cagr*100:.2f}%")
             col3.metric("최대 낙폭 (MDD)", f"{mdd_min:.2f}%", delta_color="inverse")
+            drawdown.show_episodes({'Strategy': df['My_Asset'], ticker_safe: df['Hold_Safe'], ticker_risky: df['Hold_Risky']})
+            rolling_metrics.show_rolling({'Strategy': df['My_Asset'], ticker_safe: df['Hold_Safe'], ticker_risky: df['Hold_Risky']})
             
             # ----------------------------------
             # 차트 시각화
@@ -260,22 +264,12 @@ if run_btn:
             yearly_ret.index = yearly_ret.index.year
             monthly_table['Year_Total'] = yearly_ret
 
-            # 메모리에 엑셀 파일 생성
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='Daily_Data')
-                monthly_table.to_excel(writer, sheet_name='Monthly_Returns')
-                
-                # 포맷팅 (선택사항)
-                workbook = writer.book
-                worksheet = writer.sheets['Monthly_Returns']
-                format_pct = workbook.add_format({'num_format': '0.00%'})
-                worksheet.set_column('B:N', 10, format_pct)
-
-            # 다운로드 버튼
-            st.download_button(
-                label="엑셀 파일 다운로드 (Excel)",
-                data=buffer.getvalue(),
-                file_name=f"Backtest_{ticker_safe}_vs_{ticker_risky}.xlsx",
-                mime="application/vnd.ms-excel"
+            # 다운로드 버튼 (누를 때 엑셀 생성)
+            export.download_buttons(
+                "엑셀 파일 다운로드 (Excel)",
+                f"Backtest_{ticker_safe}_vs_{ticker_risky}.xlsx",
+                {'Daily_Data': df, 'Monthly_Returns': monthly_table},
+                daily_sheet='Daily_Data',
+                formats={'Monthly_Returns': [('B:N', 10, '0.00%')]},
+                key='ms_export',
             )
\ No newline at end of file
@@ -1,4 +1,5 @@
 chcp 65001
 cd /d "C:\Users\sesyh\OneDrive\바탕 화면\STOCK BOT"
-python check_morning.py
+rem 주문 후 점검 한 번만 실행 (상주 스케줄러는 start_scheduler.bat)
+python scheduler_daemon.py --once verify
 pause
\ No newline at end of file
@@ -0,0 +1,142 @@
+import math
+import time
+
+import kis_client
+
+# -----------------------------------------------------------------------------
+# 주문 큐 (여러 종목 리밸런싱: 매도 먼저, 매수 나중, 한도 안에서 동시 주문)
+# -----------------------------------------------------------------------------
+# HAA Action Plan(8번 페이지)처럼 한 번에 최대 4종목을 맞춰야 할 때, 주문을 하나씩 기다리면
+# 종목 수만큼 시간이 늘어납니다.
+# - 매도 주문들을 동시에 보내고 모두 끝나면, 그 돈으로 매수 주문들을 동시에 보냅니다.
+# - 매도를 보냈으면 매수 전에 before_buys(buys, sells)를 부릅니다. 여기서 매도 체결/대금 반영을 기다리고
+#   실제 주문 가능 금액에 맞게 매수 수량을 줄입니다. (예: auto_trade.size_buys - inquire-psamount 재조회)
+# - 동시에 보내도 초당 한도는 KisClient의 토큰 버킷(KIS_TPS)이 지키므로 EGW00201로 거절되지 않습니다.
+# - 매도가 하나라도 거절되거나 결과를 모르면 (기본값) 매수는 보내지 않습니다. (현금 부족으로 일부만 체결되는 것 방지)
+# 실제 주문은 place(leg) 함수가 합니다. (예: auto_trade.send_order_robust)
+#
+# "성공"(accepted)은 KIS가 주문을 접수했다는 뜻이지 체결됐다는 뜻이 아닙니다.
+# 매도 접수만으로는 대금이 아직 주문 가능 금액에 없을 수 있으므로, 매수 수량은 before_buys에서 다시 정합니다.
+# 주문에는 시간 제한을 두지 않습니다. (기다리기를 멈춰도 스레드의 주문은 계속 나가므로)
+# 각 HTTP 요청은 KisClient timeout으로 끝나고, 그때 예외가 나면 주문이 들어갔는지 알 수 없으므로 'unknown'으로 두고
+# verify(legs)가 주어지면 잔고로 다시 확인합니다.
+
+PENDING, ACCEPTED, REJECTED, UNKNOWN, FILLED = "pending", "accepted", "rejected", "unknown", "filled"
+STATE_LABELS = {PENDING: "대기", ACCEPTED: "접수", REJECTED: "거절", UNKNOWN: "결과 모름", FILLED: "체결 확인"}
+
+
+class Leg:
+    """주문 하나 (side: 'buy' / 'sell')"""
+
+    def __init__(self, symbol, side, qty, price=None):
+        self.symbol = symbol
+        self.side = side
+        self.qty = int(qty)
+        self.price = price
+        self.status = PENDING
+        self.error = None
+        self.seconds = None
+
+    @property
+    def ok(self):
+        """접수(또는 체결 확인)됐으면 True, 거절/결과 모름이면 False, 보내지 않았으면 None"""
+        if self.status == PENDING:
+            return None
+        return self.status in (ACCEPTED, FILLED)
+
+    def __repr__(self):
+        return f"Leg({self.side} {self.symbol} x{self.qty}, {STATE_LABELS[self.status]})"
+
+
+def plan_rebalance(target_weights, holdings, prices, cash=0.0, markup=0.05, cash_buffer=0.0):
+    """
+    목표 비중 -> 주문 목록 (매도 먼저)
+    - target_weights: {종목: 비중} (Action Plan의 today_target)
+    - holdings: {종목: 보유 수량}, prices: {종목: 현재가}
+    - markup: 매수 지정가를 현재가보다 올리는 비율 (auto_trade.ORDER_MARKUP) - 매수 수량은 이 가격으로 계산
+    - cash_buffer: 그 밖에 남겨 둘 비율
+    보유 수량이 [지정가 기준 목표, 현재가 기준 목표] 사이면 매매하지 않습니다. (매일 몇 주씩 사고파는 것 방지)
+    """
+    equity = cash + sum(qty * prices[s] for s, qty in holdings.items() if qty and s in prices)
+    budget = equity * (1 - cash_buffer)
+    legs = []
+    for symbol in sorted(set(target_weights) | {s for s, q in holdings.items() if q}):
+        price = prices.get(symbol)
+        if not price:
+            continue
+        weight = target_weights.get(symbol, 0.0)
+        held = holdings.get(symbol, 0)
+        upper = math.floor(equity * weight / price)                     # 이보다 많으면 초과분 매도
+        lower = math.floor(budget * weight / (price * (1 + markup)))    # 이보다 적으면 부족분 매수
+        if held > upper:
+            legs.append(Leg(symbol, "sell", held - upper, price))
+        elif held < lower:
+            legs.append(Leg(symbol, "buy", lower - held, price))
+    return sorted(legs, key=lambda leg: leg.side != "sell")
+
+
+class OrderQueue:
+    """매도 -> 매수 순서로 주문을 묶어 동시에 보냅니다"""
+
+    def __init__(self, place, verify=None, before_buys=None, stop_on_sell_failure=True):
+        self.place = place
+        self.verify = verify            # verify(legs) -> [True(체결 확인) / None(모름), ...]
+        self.before_buys = before_buys  # before_buys(buys, sells) -> 실제로 보낼 매수 leg 목록 (수량 조정)
+        self.stop_on_sell_failure = stop_on_sell_failure
+        self.legs = []
+
+    def add(self, symbol, side, qty, price=None):
+        if qty > 0:
+            self.legs.append(Leg(symbol, side, qty, price))
+        return self
+
+    def extend(self, legs):
+        self.legs.extend(leg for leg in legs if leg.qty > 0)
+        return self
+
+    def _place(self, leg):
+        start = time.perf_counter()
+        try:
+            return bool(self.place(leg))
+        finally:
+            leg.seconds = time.perf_counter() - start
+
+    def _dispatch(self, legs):
+        # timeout=None: 모든 주문 스레드가 끝날 때까지 기다림
+        results = kis_client.fetch_all({i: (self._place, leg) for i, leg in enumerate(legs)}, timeout=None)
+        for i, leg in enumerate(legs):
+            value = results[i]
+            if isinstance(value, Exception):
+                # 연결 끊김/응답 시간 초과 등: 주문이 KIS에 도착했는지 알 수 없음
+                leg.status, leg.error = UNKNOWN, str(value) or type(value).__name__
+            else:
+                leg.status = ACCEPTED if value else REJECTED
+
+        unknown = [leg for leg in legs if leg.status == UNKNOWN]
+        if unknown and self.verify is not None:
+            for leg, filled in zip(unknown, self.verify(unknown)):
+                if filled:
+                    leg.status = FILLED
+        return all(leg.ok for leg in legs)
+
+    def run(self):
+        """
+        매도들 동시 실행 -> 매수들 동시 실행
+        반환: 전체 leg 목록 (leg.status: accepted/rejected/unknown/filled/pending=보내지 않음)
+        """
+        sells = [leg for leg in self.legs if leg.side == "sell"]
+        buys = [leg for leg in self.legs if leg.side == "buy"]
+
+        if sells and not self._dispatch(sells) and self.stop_on_sell_failure:
+            failed = ", ".join(f"{leg.symbol} {STATE_LABELS[leg.status]}" for leg in sells if not leg.ok)
+            print(f"⚠️ 매도 실패({failed}) - 매수 주문은 보내지 않습니다.")
+        elif buys:
+            if sells and self.before_buys is not None:
+                buys = [leg for leg in self.before_buys(buys, sells) if leg.qty > 0]
+            if buys:
+                self._dispatch(buys)
+
+        unknown = [leg.symbol for leg in self.legs if leg.status == UNKNOWN]
+        if unknown:
+            print(f"⚠️ 결과를 모르는 주문({', '.join(unknown)}) - 잔고/주문 내역을 직접 확인하세요.")
+        return self.legs
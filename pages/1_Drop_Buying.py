@@ -4,6 +4,9 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import datetime
+import metrics
+import drawdown
+import rolling_metrics
 
 # --- 페이지 설정 ---
 st.set_page_config(page_title="무한매수법/변형 백테스트", layout="wide")
@@ -61,8 +64,7 @@ if st.sidebar.button("🚀 백테스트 실행"):
             df = df.dropna()
 
             # 2. 지표 계산
-            df['Base_ATH'] = df[ticker_base].cummax()
-            df['Base_DD'] = (df[ticker_base] - df['Base_ATH']) / df['Base_ATH']
+            df['Base_DD'] = metrics.drawdown(df[ticker_base])
             df['Base_DD_PCT'] = df['Base_DD'] * 100
 
             # 3. 비중 계산
@@ -95,13 +97,10 @@ if st.sidebar.button("🚀 백테스트 실행"):
             df['My_Asset'] = (1 + df['Strategy_Ret']).cumprod()
             df['Base_Hold'] = (1 + daily_ret[ticker_base]).cumprod()
             
-            running_max = df['My_Asset'].cummax()
-            drawdown = (df['My_Asset'] / running_max) - 1
-            mdd_min = drawdown.min()
-            
-            total_days = len(df)
-            final_return = df['My_Asset'].iloc[-1]
-            cagr = final_return ** (252/total_days) - 1
+            stats = metrics.compute(df['Strategy_Ret'])
+            final_return = 1 + stats.total_return
+            cagr = stats.cagr
+            mdd_min = stats.mdd
 
             # --- 결과 표시 ---
             st.success("분석 완료!")
@@ -111,6 +110,9 @@ if st.sidebar.button("🚀 백테스트 실행"):
             m1.metric("최종 수익률 (Total)", f"{(final_return-1)*100:.2f}%")
             m2.metric("연평균 수익률 (CAGR)", f"{cagr*100:.2f}%")
             m3.metric("최대 낙폭 (MDD)", f"{mdd_min*100:.2f}%")
+            metrics.show_stats(stats)
+            drawdown.show_episodes({'Strategy': df['My_Asset'], f'{ticker_base} Hold': df['Base_Hold']})
+            rolling_metrics.show_rolling({'Strategy': df['My_Asset'], f'{ticker_base} Hold': df['Base_Hold']})
 
             # 차트 그리기
             fig, ax = plt.subplots(2, 1, figsize=(10, 10))
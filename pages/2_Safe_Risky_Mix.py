@@ -3,8 +3,15 @@ import yfinance as yf
 import pandas as pd
 import matplotlib.pyplot as plt
 import datetime
-import io
 import warnings
+import result_cache
+import tax
+import metrics
+import calendar_returns
+import export
+import charting
+import drawdown
+import rolling_metrics
 
 # 경고 무시
 warnings.filterwarnings('ignore')
@@ -30,7 +37,7 @@ with st.sidebar:
     # 2-1. 자산 및 세금 설정 (New)
     st.subheader("1. 자산 및 세금 설정")
     initial_capital = st.number_input("초기 투자금 (원)", value=100000000, step=1000000, format="%d")
-    apply_tax = st.checkbox("양도세(22%) 적용", value=True, help="매년 연초에 전년도 수익 250만원 공제 후 22% 세금 차감")
+    apply_tax = st.checkbox("양도세(22%) 적용", value=True, help="매도한 lot의 실현 손익(FIFO)을 연도별로 통산해, 다음 해 첫 거래일에 250만원 공제 후 22% 세금 차감")
 
     # 2-2. 종목 설정
     st.subheader("2. 투자 종목")
@@ -56,6 +63,8 @@ with st.sidebar:
     rate_ma_window = st.number_input("금리 MA 기간", min_value=5, max_value=365, value=120)
     exposure_ratio = st.slider("금리 상승 시 투자 비중", 0.0, 1.0, 0.7, 0.1)
 
+    interactive_charts = st.checkbox("🔍 인터랙티브 차트", value=False, help="확대/이동이 되는 차트를 추가로 표시합니다. 위쪽 차트에서 구간을 드래그하면 그 구간을 더 촘촘하게 보여줍니다.")
+
     run_btn = st.button("🚀 백테스트 실행", type="primary")
 
 # -----------------------------------------------------------------------------
@@ -116,7 +125,10 @@ def run_strategy(df, t_safe, t_risky, t_rate, ma_win, rate_ma_win, use_rate, exp
     positions = []
     
     current_capital = init_cap
-    year_start_capital = init_cap
+    tax_engine = tax.TaxEngine()
+    assets = [t_safe, t_risky]
+    prices = df[assets].values
+    held = None  # (포지션, 투자 비중) - 바뀔 때만 lot 매매
     
     # Loop 최적화를 위한 numpy 변환
     signals = df['Stock_Signal'].values
@@ -136,32 +148,28 @@ def run_strategy(df, t_safe, t_risky, t_rate, ma_win, rate_ma_win, use_rate, exp
             
         # 금리 필터 적용
         if use_rate and rate_hikes[i] == 1:
-            real_ret = base_ret * exp_ratio
+            weight = exp_ratio
         else:
-            real_ret = base_ret
+            weight = 1.0
+        real_ret = base_ret * weight
+        
+        # 포지션이 바뀌면 전일 종가로 교체 매매 (lot 기록)
+        if apply_tax and i > 0 and (pos, weight) != held:
+            tax_engine.rebalance(dates[i-1], dict(zip(assets, prices[i-1])), {assets[pos]: current_capital * weight})
+            held = (pos, weight)
             
         # 자산 업데이트
         current_capital = current_capital * (1 + real_ret)
         
         # 2. 세금 계산 (연도가 바뀐 경우 체크)
         # i가 0보다 크고, 어제와 연도가 다르면 => 새해 첫 거래일
-        if i > 0 and dates[i].year != dates[i-1].year:
-            if apply_tax:
-                # 전년도 수익 계산 (전일 자산 - 작년 초 자산)
-                last_year_end_capital = equity_curve[-1] 
-                year_profit = last_year_end_capital - year_start_capital
-                
-                # 공제 250만원 적용
-                taxable_income = year_profit - 2500000
-                if taxable_income > 0:
-                    tax = taxable_income * 0.22
-                    current_capital -= tax # 세금 차감
-                    
-                # 올해 기준 자산 업데이트 (세금 차감 후 금액이 올해 시작 금액)
-                year_start_capital = current_capital
-            else:
-                # 세금 적용 안하면 그냥 갱신
-                year_start_capital = current_capital
+        if apply_tax and i > 0 and dates[i].year != dates[i-1].year:
+            # 전년도에 매도한 lot의 실현 손익 기준 (250만원 공제, 22%)
+            tax_amount = tax_engine.tax_for(dates[i-1].year)
+            if tax_amount > 0:
+                current_capital -= tax_amount # 세금 차감
+                # 세금 낼 만큼 보유 자산 매도
+                tax_engine.rebalance(dates[i], dict(zip(assets, prices[i])), {assets[pos]: current_capital * weight})
 
         equity_curve.append(current_capital)
         positions.append(pos)
@@ -176,135 +184,156 @@ def run_strategy(df, t_safe, t_risky, t_rate, ma_win, rate_ma_win, use_rate, exp
     df['Hold_Safe'] = init_cap * (1 + daily_ret[t_safe]).cumprod()
     df['Hold_Risky'] = init_cap * (1 + daily_ret[t_risky]).cumprod()
     
-    df['Peak'] = df['My_Asset'].cummax()
-    df['MDD'] = (df['My_Asset'] - df['Peak']) / df['Peak'] * 100
+    df['MDD'] = metrics.drawdown(df['My_Asset']) * 100
     
-    return df, stock_ma_col, rate_ma_col
+    return df, stock_ma_col, rate_ma_col, tax_engine.yearly_frame()
 
 # -----------------------------------------------------------------------------
 # 4. 메인 실행 로직
 # -----------------------------------------------------------------------------
+# 계산은 버튼을 눌렀을 때만 하고, 결과는 설정과 함께 session_state에 보관합니다.
+# (표시용 위젯을 바꿔도 재계산하지 않고, 전략 설정이 바뀌면 다시 실행하라고 안내)
+tickers = [ticker_safe, ticker_risky, rate_ticker]
+params = dict(
+    t_safe=ticker_safe, t_risky=ticker_risky, t_rate=rate_ticker,
+    ma_win=ma_window, rate_ma_win=rate_ma_window, use_rate=use_rate_filter,
+    exp_ratio=exposure_ratio, init_cap=initial_capital, apply_tax=apply_tax
+)
+run_key = (start_date_input, end_date_input) + tuple(sorted(params.items()))
+
 if run_btn:
-    tickers = [ticker_safe, ticker_risky, rate_ticker]
-    
     with st.spinner('데이터 다운로드 및 전략 계산 중...'):
         raw_df = get_data(tickers, start_date_input, end_date_input)
-        
+
         if raw_df.empty:
+            st.session_state.pop('p2_result', None)
             st.error("데이터를 가져오지 못했습니다. 티커나 기간을 확인해주세요.")
         else:
-            # 전략 실행 (파라미터 추가됨)
-            df, stock_ma_name, rate_ma_name = run_strategy(
-                raw_df, ticker_safe, ticker_risky, rate_ticker,
-                ma_window, rate_ma_window, use_rate_filter, exposure_ratio,
-                initial_capital, apply_tax
+            # 전략 실행 - 같은 설정/데이터면 캐시에서 바로 가져옴
+            result, hit, elapsed = result_cache.cached_run(
+                'safe_risky_tax_fifo', params, result_cache.data_version(raw_df),
+                lambda: run_strategy(raw_df, **params)
             )
-            
-            # ----------------------------------
-            # 결과 요약 (Metrics)
-            # ----------------------------------
-            total_days = len(df)
-            final_value = df['My_Asset'].iloc[-1]
-            total_profit = final_value - initial_capital
-            total_ret_pct = (total_profit / initial_capital) * 100
-            
-            # CAGR 계산
-            cagr = (final_value / initial_capital) ** (252/total_days) - 1
-            mdd_min = df['MDD'].min()
-
-            st.markdown("### 📈 성과 요약")
-            col1, col2, col3 = st.columns(3)
-            col1.metric("최종 자산 (Total Equity)", f"{final_value:,.0f} 원", delta=f"{total_profit:,.0f} 원")
-            col2.metric("연평균 수익률 (CAGR)", f"{cagr*100:.2f}%", delta=f"총 수익률: {total_ret_pct:.2f}%")
-            col3.metric("최대 낙폭 (MDD)", f"{mdd_min:.2f}%", delta_color="inverse")
-            
-            # ----------------------------------
-            # 차트 시각화
-            # ----------------------------------
-            st.markdown("### 📊 상세 차트")
-            
-            trades = df['Position'].diff().fillna(0)
-            buy_signals = df[trades == 1].index
-            buy_prices = df.loc[buy_signals, ticker_safe]
-            sell_signals = df[trades == -1].index
-            sell_prices = df.loc[sell_signals, ticker_safe]
+            st.session_state['p2_result'] = (run_key, result, hit, elapsed)
 
-            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-            
-            # (1) 주식 시장 신호
-            ax1 = axes[0, 0]
-            ax1.plot(df.index, df[ticker_safe], label=f'{ticker_safe}', color='black', alpha=0.5)
-            ax1.plot(df.index, df[stock_ma_name], label=f'MA {ma_window}', color='orange')
-            ax1.scatter(buy_signals, buy_prices, marker='^', color='red', s=80, label='Buy Risky', zorder=5)
-            ax1.scatter(sell_signals, sell_prices, marker='v', color='blue', s=80, label='Buy Safe', zorder=5)
-            ax1.set_title(f'Market Signal ({ticker_safe})')
-            ax1.legend()
-            ax1.grid(alpha=0.3)
-
-            # (2) 금리 신호
-            ax2 = axes[0, 1]
-            ax2.plot(df.index, df[rate_ticker], label='Rate', color='purple', alpha=0.7)
-            ax2.plot(df.index, df[rate_ma_name], label=f'MA {rate_ma_window}', color='green', linestyle='--')
-            if use_rate_filter:
-                ax2.fill_between(df.index, df[rate_ticker], df[rate_ma_name], 
-                                where=(df[rate_ticker] > df[rate_ma_name]), color='gray', alpha=0.2, label='Filter On')
-            ax2.set_title(f'Macro Filter ({rate_ticker})')
-            ax2.legend()
-            ax2.grid(alpha=0.3)
-
-            # (3) 자산 성장 (금액 기준)
-            ax3 = axes[1, 0]
-            ax3.plot(df.index, df['My_Asset'], label='Strategy (After Tax)', color='red', linewidth=2)
-            ax3.plot(df.index, df['Hold_Safe'], label=f'{ticker_safe} Hold', color='green', linestyle='--', alpha=0.5)
-            ax3.plot(df.index, df['Hold_Risky'], label=f'{ticker_risky} Hold', color='orange', linestyle='--', alpha=0.5)
-            ax3.set_yscale('log')
-            ax3.set_title(f'Portfolio Growth (Log Scale, Start: {initial_capital:,} won)')
-            ax3.legend()
-            ax3.grid(alpha=0.3)
-
-            # (4) MDD
-            ax4 = axes[1, 1]
-            ax4.fill_between(df.index, df['MDD'], 0, color='blue', alpha=0.3)
-            ax4.plot(df.index, df['MDD'], color='blue', linewidth=1)
-            ax4.axhline(y=-30, color='red', linestyle='--', label='-30% Line')
-            ax4.set_title('Drawdown (%)')
-            ax4.legend()
-            ax4.grid(alpha=0.3)
-
-            plt.tight_layout()
-            st.pyplot(fig)
-
-            # ----------------------------------
-            # 엑셀 다운로드
-            # ----------------------------------
-            st.markdown("### 📥 결과 다운로드")
-            
-            # 월별 수익률 (금액 기반 계산)
-            monthly_resample = df['My_Asset'].resample('ME').last()
-            monthly_ret = monthly_resample.pct_change().fillna(0)
-            
-            monthly_table = monthly_ret.groupby([monthly_ret.index.year, monthly_ret.index.month]).sum().unstack()
-            monthly_table.columns = [f"{c}월" for c in monthly_table.columns]
-            
-            # 연간 수익률
-            yearly_resample = df['My_Asset'].resample('YE').last()
-            yearly_ret = yearly_resample.pct_change().fillna(0)
-            yearly_ret.index = yearly_ret.index.year
-            monthly_table['Year_Total'] = yearly_ret
-
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='Daily_Data')
-                monthly_table.to_excel(writer, sheet_name='Monthly_Returns')
-                
-                workbook = writer.book
-                worksheet = writer.sheets['Monthly_Returns']
-                format_pct = workbook.add_format({'num_format': '0.00%'})
-                worksheet.set_column('B:N', 10, format_pct)
-
-            st.download_button(
-                label="엑셀 파일 다운로드 (Excel)",
-                data=buffer.getvalue(),
-                file_name=f"Backtest_Tax_Applied.xlsx",
-                mime="application/vnd.ms-excel"
-            )
\ No newline at end of file
+last_run = st.session_state.get('p2_result')
+if last_run is not None and last_run[0] != run_key:
+    st.info("⚙️ 설정이 바뀌었습니다. '🚀 백테스트 실행'을 눌러 다시 계산하세요.")
+elif last_run is not None:
+    _, (df, stock_ma_name, rate_ma_name, tax_table), hit, elapsed = last_run
+    result_cache.cache_badge(hit, elapsed)
+
+    # ----------------------------------
+    # 결과 요약 (Metrics)
+    # ----------------------------------
+    stats = metrics.from_equity(df['My_Asset'], initial=initial_capital)
+    final_value = df['My_Asset'].iloc[-1]
+    total_profit = final_value - initial_capital
+    total_ret_pct = stats.total_return * 100
+    cagr = stats.cagr
+    mdd_min = stats.mdd * 100
+
+    st.markdown("### 📈 성과 요약")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("최종 자산 (Total Equity)", f"{final_value:,.0f} 원", delta=f"{total_profit:,.0f} 원")
+    col2.metric("연평균 수익률 (CAGR)", f"{cagr*100:.2f}%", delta=f"총 수익률: {total_ret_pct:.2f}%")
+    col3.metric("최대 낙폭 (MDD)", f"{mdd_min:.2f}%", delta_color="inverse")
+    metrics.show_stats(stats)
+    drawdown.show_episodes({'Strategy': df['My_Asset'], ticker_safe: df['Hold_Safe'], ticker_risky: df['Hold_Risky']})
+    rolling_metrics.show_rolling({'Strategy': df['My_Asset'], ticker_safe: df['Hold_Safe'], ticker_risky: df['Hold_Risky']})
+    tax.show_tax_table(tax_table)
+    
+    # ----------------------------------
+    # 차트 시각화
+    # ----------------------------------
+    st.markdown("### 📊 상세 차트")
+    
+    trades = df['Position'].diff().fillna(0)
+    buy_signals = df[trades == 1].index
+    buy_prices = df.loc[buy_signals, ticker_safe]
+    sell_signals = df[trades == -1].index
+    sell_prices = df.loc[sell_signals, ticker_safe]
+
+    def draw_charts():
+        # 패널별로 점 개수를 줄여서 그립니다 (매매 신호 표시는 원래 날짜 그대로)
+        sig = charting.decimate_frame(df[[ticker_safe, stock_ma_name]])
+        rate = charting.decimate_frame(df[[rate_ticker, rate_ma_name]])
+        growth = charting.decimate_frame(df[['My_Asset', 'Hold_Safe', 'Hold_Risky']])
+        mdd = charting.decimate(df['MDD'], method='minmax')
+
+        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+
+        # (1) 주식 시장 신호
+        ax1 = axes[0, 0]
+        ax1.plot(sig.index, sig[ticker_safe], label=f'{ticker_safe}', color='black', alpha=0.5)
+        ax1.plot(sig.index, sig[stock_ma_name], label=f'MA {ma_window}', color='orange')
+        ax1.scatter(buy_signals, buy_prices, marker='^', color='red', s=80, label='Buy Risky', zorder=5)
+        ax1.scatter(sell_signals, sell_prices, marker='v', color='blue', s=80, label='Buy Safe', zorder=5)
+        ax1.set_title(f'Market Signal ({ticker_safe})')
+        ax1.legend()
+        ax1.grid(alpha=0.3)
+
+        # (2) 금리 신호
+        ax2 = axes[0, 1]
+        ax2.plot(rate.index, rate[rate_ticker], label='Rate', color='purple', alpha=0.7)
+        ax2.plot(rate.index, rate[rate_ma_name], label=f'MA {rate_ma_window}', color='green', linestyle='--')
+        if use_rate_filter:
+            ax2.fill_between(rate.index, rate[rate_ticker], rate[rate_ma_name],
+                            where=(rate[rate_ticker] > rate[rate_ma_name]), color='gray', alpha=0.2, label='Filter On')
+        ax2.set_title(f'Macro Filter ({rate_ticker})')
+        ax2.legend()
+        ax2.grid(alpha=0.3)
+
+        # (3) 자산 성장 (금액 기준)
+        ax3 = axes[1, 0]
+        ax3.plot(growth.index, growth['My_Asset'], label='Strategy (After Tax)', color='red', linewidth=2)
+        ax3.plot(growth.index, growth['Hold_Safe'], label=f'{ticker_safe} Hold', color='green', linestyle='--', alpha=0.5)
+        ax3.plot(growth.index, growth['Hold_Risky'], label=f'{ticker_risky} Hold', color='orange', linestyle='--', alpha=0.5)
+        ax3.set_yscale('log')
+        ax3.set_title(f'Portfolio Growth (Log Scale, Start: {initial_capital:,} won)')
+        ax3.legend()
+        ax3.grid(alpha=0.3)
+
+        # (4) MDD
+        ax4 = axes[1, 1]
+        ax4.fill_between(mdd.index, mdd, 0, color='blue', alpha=0.3)
+        ax4.plot(mdd.index, mdd, color='blue', linewidth=1)
+        ax4.axhline(y=-30, color='red', linestyle='--', label='-30% Line')
+        ax4.set_title('Drawdown (%)')
+        ax4.legend()
+        ax4.grid(alpha=0.3)
+
+        plt.tight_layout()
+        return fig
+
+    # 같은 결과/설정이면 다시 그리지 않고 저장된 이미지를 씁니다
+    charting.show_figure(
+        'safe_risky_mix',
+        {'safe': ticker_safe, 'risky': ticker_risky, 'rate': rate_ticker, 'ma': ma_window,
+         'rate_ma': rate_ma_window, 'rate_filter': use_rate_filter, 'capital': initial_capital},
+        df, draw_charts,
+    )
+
+    if interactive_charts:
+        st.markdown("#### 🔍 인터랙티브 차트")
+        charting.show_interactive(df[['My_Asset', 'Hold_Safe', 'Hold_Risky']], key='p2_growth_chart',
+                                  log=True, title="자산 성장 (드래그하여 구간 확대)")
+        charting.show_interactive(df[['MDD']], key='p2_mdd_chart', minmax=('MDD',), title="Drawdown (%)")
+
+    # ----------------------------------
+    # 엑셀 다운로드
+    # ----------------------------------
+    st.markdown("### 📥 결과 다운로드")
+    
+    # 월별/연간 수익률 (금액 기반 계산)
+    asset_ret = df['My_Asset'].pct_change().fillna(0)
+    monthly_table = calendar_returns.monthly_table(asset_ret)
+
+    export.download_buttons(
+        "엑셀 파일 다운로드 (Excel)",
+        "Backtest_Tax_Applied.xlsx",
+        {'Daily_Data': df, 'Monthly_Returns': monthly_table},
+        daily_sheet='Daily_Data',
+        formats={'Monthly_Returns': [('B:N', 10, '0.00%')]},
+        key='p2_export',
+    )
\ No newline at end of file
@@ -3,8 +3,16 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import datetime
-import io
 import FinanceDataReader as fdr
+import universe
+import momentum_engine
+import compact_mode
+import costs
+import metrics
+import calendar_returns
+import export
+import drawdown
+import rolling_metrics
 
 # -----------------------------------------------------------------------------
 # 1. 페이지 설정 및 캐싱 함수
@@ -12,10 +20,14 @@ import FinanceDataReader as fdr
 st.set_page_config(page_title="KOSPI 모멘텀 전략", page_icon="🇰🇷")
 
 @st.cache_data(ttl=3600*24) # 24시간 동안 데이터 캐싱
-def get_kospi_data(start_year, sample_size):
+def get_kospi_data(start_year, sample_size, survivorship=False, momentum_window=12, compact=False):
     """
     KOSPI 시가총액 상위 종목의 데이터를 다운로드합니다.
     Streamlit 캐시를 사용하여 속도를 최적화합니다.
+    survivorship=True 이면 기간 중 상장폐지된 종목까지 포함하고,
+    종목별로 상장되어 있던 구간만 내려받아 편입 비트맵과 함께 돌려줍니다.
+    compact=True 이면 가격 패널을 float32로 저장합니다. (캐시 용량도 절반)
+    거래비용 계산용 거래량 패널도 함께 돌려줍니다.
     """
     # 1. 상장 종목 가져오기
     df_list = fdr.StockListing('KOSPI')
@@ -28,19 +40,46 @@ def get_kospi_data(start_year, sample_size):
     
     # 2. 주가 데이터 다운로드
     all_prices = []
+    all_volumes = []
     fetch_year = start_year - 2
     
     progress_bar = st.progress(0)
     status_text = st.empty()
+
+    if survivorship:
+        intervals = universe.load_krx_intervals('KOSPI', f'{fetch_year}-01-01', codes=tickers)
+        code_map.update(intervals.set_index('Code')['Name'].to_dict())
+        delisted = set(intervals.loc[intervals['Delisted'], 'Code'])
+
+        bdays = pd.bdate_range(f'{fetch_year}-01-01', pd.Timestamp.today())
+        bitmap = universe.MembershipBitmap.from_intervals(intervals, bdays)
+
+        def reader(ticker, start, end):
+            symbol = f'KRX-DELISTING:{ticker}' if ticker in delisted else ticker
+            return fdr.DataReader(symbol, start, end)[['Close', 'Volume']]
+
+        def on_progress(i, total, ticker):
+            status_text.text(f"데이터 다운로드 중.. ({i+1}/{total}) - {code_map.get(ticker)}")
+            progress_bar.progress((i + 1) / total)
+
+        price_df, volume_df = universe.fetch_eligible_prices(bitmap, reader, momentum_window, on_progress,
+                                                             with_volume=True)
+        status_text.empty()
+        progress_bar.empty()
+
+        if price_df.empty:
+            return pd.DataFrame(), {}, None, pd.DataFrame()
+        price_df = compact_mode.compact_panel(price_df.ffill(), compact)
+        return price_df, code_map, bitmap, compact_mode.compact_panel(volume_df, compact)
     
     for i, ticker in enumerate(tickers):
         try:
             status_text.text(f"데이터 다운로드 중.. ({i+1}/{len(tickers)}) - {code_map.get(ticker)}")
             progress_bar.progress((i + 1) / len(tickers))
             
-            df = fdr.DataReader(ticker, str(fetch_year))['Close']
-            df.name = ticker
-            all_prices.append(df)
+            df = fdr.DataReader(ticker, str(fetch_year))
+            all_prices.append(df['Close'].rename(ticker))
+            all_volumes.append(df['Volume'].rename(ticker))
         except:
             continue
             
@@ -48,10 +87,12 @@ def get_kospi_data(start_year, sample_size):
     progress_bar.empty()
     
     if not all_prices:
-        return pd.DataFrame(), {}
+        return pd.DataFrame(), {}, None, pd.DataFrame()
 
-    price_df = pd.concat(all_prices, axis=1).fillna(method='ffill')
-    return price_df, code_map
+    price_df = pd.concat(all_prices, axis=1).ffill()
+    price_df = compact_mode.compact_panel(price_df, compact)
+    volume_df = compact_mode.compact_panel(pd.concat(all_volumes, axis=1), compact)
+    return price_df, code_map, None, volume_df
 
 # -----------------------------------------------------------------------------
 # 2. 사이드바 UI
@@ -79,6 +120,20 @@ with st.sidebar:
     rebalance_step = rebalance_map[rebal_label]
     
     momentum_window = st.number_input("모멘텀 기간 (개월)", value=12, help="과거 몇 개월 수익률을 비교할까요?")
+    
+    survivorship = st.checkbox("상장폐지 종목 포함 (생존편향 보정)", value=False,
+                               help="기간 중 상장폐지된 종목까지 포함하고, 각 시점에 상장되어 있던 종목만 순위에 넣습니다.")
+    if survivorship:
+        st.caption(universe.SURVIVORSHIP_NOTE)
+
+    compact = st.checkbox("Float32 컴팩트 모드", value=compact_mode.default_enabled(),
+                          help="가격/수익률을 float32로 저장해 메모리를 절반으로 줄입니다. (자산 곡선은 float64로 누적)")
+    precision_check = st.checkbox("정밀도 리포트 (float64와 비교)", value=False, disabled=not compact)
+
+    use_costs = st.checkbox("거래비용 반영 (거래량 기반 슬리피지)", value=False,
+                            help="수수료 + 스프레드 + 평균 거래대금 대비 주문 규모로 추정한 시장충격(제곱근 모형)을 차감합니다.")
+    capital = st.number_input("운용 금액 (원)", value=100_000_000, step=10_000_000, disabled=not use_costs)
+    impact_coef = st.number_input("시장충격 계수", value=1.0, step=0.1, disabled=not use_costs)
 
     st.markdown("---")
     # [NEW] 엑셀 출력 선택 옵션 추가
@@ -92,7 +147,7 @@ with st.sidebar:
 if run_btn:
     with st.spinner("데이터를 분석하고 있습니다..."):
         # 1. 데이터 로드
-        df_price, code_map = get_kospi_data(start_year, sample_size)
+        df_price, code_map, bitmap, df_volume = get_kospi_data(start_year, sample_size, survivorship, momentum_window, compact)
         
         if df_price.empty:
             st.error("데이터를 가져오지 못했습니다.")
@@ -104,70 +159,25 @@ if run_btn:
         end_dt = df_price.index[-1]
         
         # 리밸런싱 날짜 계산
-        all_days = df_price.index
-        target_months = list(range(1, 13, rebalance_step))
-        rebalance_dates = []
-        
-        for year in range(start_dt.year, end_dt.year + 1):
-            for month in target_months:
-                month_data = all_days[(all_days.year == year) & (all_days.month == month)]
-                if not month_data.empty:
-                    rebalance_dates.append(month_data[-1])
-        
-        rebalance_dates = sorted(list(set([d for d in rebalance_dates if start_dt <= d <= end_dt])))
+        rebalance_dates = momentum_engine.get_rebalance_dates(df_price.index, start_dt, end_dt, rebalance_step)
+
+        cost_model = None
+        if use_costs:
+            cost_model = costs.SquareRootImpact(impact_coef=impact_coef).prepare(df_price, df_volume)
         
         # 시뮬레이션 루프
-        portfolio_returns = []
-        history_records = []
-        
-        for i in range(len(rebalance_dates) - 1):
-            curr_date = rebalance_dates[i]
-            next_date = rebalance_dates[i+1]
-            
-            # 모멘텀 계산 시점
-            past_date_target = curr_date - pd.DateOffset(months=momentum_window)
-            
-            try:
-                idx_loc = df_price.index.get_indexer([past_date_target], method='nearest')[0]
-                past_date_real = df_price.index[idx_loc]
-                
-                price_curr = df_price.loc[:curr_date].iloc[-1]
-                price_past = df_price.loc[past_date_real]
-                
-                mom_score = (price_curr - price_past) / price_past
-                
-                top_series = mom_score.nlargest(top_n)
-                top_stocks = top_series.index.tolist()
-                
-                # 기록
-                for stock in top_stocks:
-                    history_records.append({
-                        'Date': curr_date.strftime('%Y-%m-%d'),
-                        'Code': stock,
-                        'Name': code_map.get(stock, stock),
-                        'Momentum': top_series[stock]
-                    })
-                
-                price_period = df_price[top_stocks].loc[curr_date:next_date]
-                if not price_period.empty:
-                    period_ret = price_period.pct_change().fillna(0).mean(axis=1)
-                    portfolio_returns.append(period_ret)
-                    
-            except Exception as e:
-                continue
+        full_returns, book = momentum_engine.run_momentum_backtest(
+            df_price, rebalance_dates, momentum_window, top_n, code_map,
+            past_lookup='nearest', eligibility=bitmap, cost_model=cost_model, capital=capital
+        )
                 
         # 결과 처리
-        if portfolio_returns:
-            full_returns = pd.concat(portfolio_returns)
-            full_returns = full_returns[~full_returns.index.duplicated(keep='first')]
-            
-            cum_returns = (1 + full_returns).cumprod()
-            running_max = cum_returns.cummax()
-            drawdown = (cum_returns / running_max) - 1
-            mdd = drawdown.min()
-            
-            total_days = (cum_returns.index[-1] - cum_returns.index[0]).days
-            cagr = cum_returns.iloc[-1]**(365/total_days) - 1
+        if not full_returns.empty:
+            # float32 수익률이어도 자산 곡선은 float64로 누적
+            cum_returns = compact_mode.accumulate_equity(full_returns)
+            drawdown = metrics.drawdown(cum_returns)
+            stats = metrics.compute(full_returns)
+            cagr, mdd = stats.cagr, stats.mdd
             
             # 벤치마크 (KOSPI 200)
             try:
@@ -182,21 +192,11 @@ if run_btn:
             # 데이터 준비 (엑셀 및 탭 표시용)
             # ----------------------------------
             # 1. 월별 수익률 테이블
-            monthly_ret = full_returns.resample('ME').apply(lambda x: (1 + x).prod() - 1)
-            monthly_table = monthly_ret.groupby([monthly_ret.index.year, monthly_ret.index.month]).sum().unstack()
-            monthly_table.columns = [f"{c}월" for c in monthly_table.columns]
+            monthly_table = calendar_returns.monthly_table(full_returns, total=None)
             
             # 2. 현재 추천 종목
-            latest_date = df_price.index[-1]
-            past_target = latest_date - pd.DateOffset(months=momentum_window)
-            idx_loc = df_price.index.get_indexer([past_target], method='nearest')[0]
-            past_real = df_price.index[idx_loc]
-            
-            p_curr = df_price.loc[latest_date]
-            p_past = df_price.loc[past_real]
-            
-            curr_mom = (p_curr - p_past) / p_past
-            curr_top = curr_mom.nlargest(top_n)
+            p_curr = df_price.iloc[-1]
+            curr_top = momentum_engine.current_picks(df_price, momentum_window, top_n, eligibility=bitmap)
             
             picks_data = []
             for code, score in curr_top.items():
@@ -209,7 +209,7 @@ if run_btn:
             df_picks = pd.DataFrame(picks_data)
             
             # 3. 매매 기록
-            df_history = pd.DataFrame(history_records)
+            df_history = book.history_frame()
 
             # ----------------------------------
             # 결과 화면 출력
@@ -218,6 +218,20 @@ if run_btn:
             col1.metric("총 수익률", f"{(cum_returns.iloc[-1]-1)*100:.2f}%")
             col2.metric("연평균 수익률 (CAGR)", f"{cagr*100:.2f}%")
             col3.metric("최대 낙폭 (MDD)", f"{mdd*100:.2f}%", delta_color="inverse")
+            metrics.show_stats(stats)
+            drawdown.show_episodes({'Strategy': cum_returns, 'KOSPI 200': bm_cum})
+            rolling_metrics.show_rolling({'Strategy': cum_returns, 'KOSPI 200': bm_cum})
+            costs.show_cost_caption(book)
+            
+            if compact and precision_check:
+                df_full, _, bitmap_full, _ = get_kospi_data(start_year, sample_size, survivorship, momentum_window, False)
+                rebal_full = momentum_engine.get_rebalance_dates(df_full.index, start_dt, end_dt, rebalance_step)
+                ret_full, _ = momentum_engine.run_momentum_backtest(
+                    df_full, rebal_full, momentum_window, top_n, code_map,
+                    past_lookup='nearest', eligibility=bitmap_full, cost_model=cost_model, capital=capital
+                )
+                compact_mode.show_precision_report(
+                    compact_mode.precision_report(full_returns, ret_full, df_price, df_full))
             
             tab1, tab2, tab3, tab4 = st.tabs(["📊 차트", "🏆 현재 추천 종목", "📅 월별 수익률", "📝 매매 기록"])
             
@@ -260,32 +274,15 @@ if run_btn:
                 st.markdown("---")
                 st.subheader("💾 데이터 내보내기")
                 
-                with st.spinner("엑셀 파일을 생성 중입니다..."):
-                    buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                        # 1. 매매 이력
-                        df_history.to_excel(writer, sheet_name='Trade_History', index=False)
-                        # 2. 월별 성과
-                        monthly_table.to_excel(writer, sheet_name='Monthly_Returns')
-                        # 3. 현재 매수 종목
-                        df_picks.to_excel(writer, sheet_name='Current_Picks', index=False)
-                        
-                        # (선택) 엑셀 포맷팅: 퍼센트 표시 등
-                        workbook = writer.book
-                        format_pct = workbook.add_format({'num_format': '0.00%'})
-                        format_money = workbook.add_format({'num_format': '#,##0'})
-                        
-                        # Current_Picks 시트 포맷 적용 예시 (C열:수익률, D열:가격)
-                        worksheet_picks = writer.sheets['Current_Picks']
-                        worksheet_picks.set_column('C:C', 12, format_pct)
-                        worksheet_picks.set_column('D:D', 12, format_money)
-
-                    st.success("파일 생성 완료!")
-                    st.download_button(
-                        label="📥 엑셀 파일 다운로드 (Excel)",
-                        data=buffer.getvalue(),
-                        file_name=f"KOSPI_Momentum_{start_year}_Result.xlsx",
-                        mime="application/vnd.ms-excel"
-                    )
+                # 버튼을 누를 때 파일 생성 (1. 매매 이력 2. 월별 성과 3. 현재 매수 종목)
+                export.download_buttons(
+                    "📥 엑셀 파일 다운로드 (Excel)",
+                    f"KOSPI_Momentum_{start_year}_Result.xlsx",
+                    {'Trade_History': df_history, 'Monthly_Returns': monthly_table, 'Current_Picks': df_picks},
+                    no_index=('Trade_History', 'Current_Picks'),
+                    # Current_Picks 시트 포맷 (C열:수익률, D열:가격)
+                    formats={'Current_Picks': [('C:C', 12, '0.00%'), ('D:D', 12, '#,##0')]},
+                    key='p3_export',
+                )
         else:
             st.warning("수익률을 계산할 수 없습니다. 기간이나 종목 수를 확인해주세요.")
\ No newline at end of file
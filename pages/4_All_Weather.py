@@ -3,7 +3,11 @@ import pandas as pd
 import yfinance as yf
 import matplotlib.pyplot as plt
 import datetime
-import io
+import metrics
+import calendar_returns
+import export
+import drawdown
+import rolling_metrics
 
 # -----------------------------------------------------------------------------
 # 1. 페이지 설정
@@ -112,22 +116,20 @@ if run_btn:
             if 'SPY' in df.columns:
                 df['SPY_Only'] = (1 + df['SPY_Ret']).cumprod()
             
-            # 통계 함수
-            def get_stats(series):
-                total_days = len(series)
-                cagr = series.iloc[-1] ** (252/total_days) - 1
-                running_max = series.cummax()
-                dd = (series / running_max) - 1
-                mdd = dd.min()
-                return cagr, mdd
-            
-            cagr_aw, mdd_aw = get_stats(df['All_Weather'])
+            stats_aw = metrics.compute(df['Portfolio_Ret'])
+            cagr_aw, mdd_aw = stats_aw.cagr, stats_aw.mdd
             
             # 결과 출력
             col1, col2, col3 = st.columns(3)
             col1.metric("총 수익률", f"{(df['All_Weather'].iloc[-1]-1)*100:.2f}%")
             col2.metric("CAGR (연평균)", f"{cagr_aw*100:.2f}%")
             col3.metric("최대 낙폭 (MDD)", f"{mdd_aw*100:.2f}%", delta_color="inverse")
+            if 'SPY_Ret' in df.columns:
+                metrics.show_stats({'All Weather': stats_aw, 'SPY': metrics.compute(df['SPY_Ret'])})
+            else:
+                metrics.show_stats(stats_aw)
+            drawdown.show_episodes({'All Weather': df['All_Weather'], 'SPY': df.get('SPY_Only')})
+            rolling_metrics.show_rolling({'All Weather': df['All_Weather'], 'SPY': df.get('SPY_Only')})
             
             # 탭 구성
             tab1, tab2, tab3 = st.tabs(["📊 차트 분석", "⚖️ 자산 비중", "💾 데이터"])
@@ -146,12 +148,12 @@ if run_btn:
                 ax[0].grid(alpha=0.3)
                 
                 # MDD 그래프
-                dd_aw = (df['All_Weather'] / df['All_Weather'].cummax()) - 1
+                dd_aw = metrics.drawdown(df['All_Weather'])
                 ax[1].fill_between(df.index, dd_aw, 0, color='green', alpha=0.1)
                 ax[1].plot(df.index, dd_aw, label='All Weather MDD', color='green', linewidth=1)
                 
                 if 'SPY_Only' in df.columns:
-                    dd_spy = (df['SPY_Only'] / df['SPY_Only'].cummax()) - 1
+                    dd_spy = metrics.drawdown(df['SPY_Only'])
                     ax[1].plot(df.index, dd_spy, label='SPY MDD', color='gray', alpha=0.3, linewidth=1)
                     
                 ax[1].set_title("Drawdown Risk")
@@ -174,9 +176,7 @@ if run_btn:
                 
             with tab3:
                 # 월별 수익률 계산
-                monthly_ret = df['Portfolio_Ret'].resample('ME').apply(lambda x: (1 + x).prod() - 1)
-                monthly_table = monthly_ret.groupby([monthly_ret.index.year, monthly_ret.index.month]).sum().unstack()
-                monthly_table.columns = [f"{c}월" for c in monthly_table.columns]
+                monthly_table = calendar_returns.monthly_table(df['Portfolio_Ret'], total=None)
                 
                 st.subheader("📅 월별 수익률")
                 st.dataframe(monthly_table.style.background_gradient(cmap='RdYlGn', axis=None).format("{:.2%}"))
@@ -184,20 +184,12 @@ if run_btn:
                 # 엑셀 다운로드
                 if export_excel:
                     st.markdown("---")
-                    buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                        df.to_excel(writer, sheet_name='Daily_Data')
-                        monthly_table.to_excel(writer, sheet_name='Monthly_Returns')
-                        w_df.to_excel(writer, sheet_name='Weights', index=False)
-                        
-                        # 포맷팅
-                        workbook = writer.book
-                        fmt_pct = workbook.add_format({'num_format': '0.00%'})
-                        writer.sheets['Monthly_Returns'].set_column('B:N', 10, fmt_pct)
-                        
-                    st.download_button(
-                        label="📥 엑셀 파일 다운로드",
-                        data=buffer.getvalue(),
-                        file_name="All_Weather_Portfolio.xlsx",
-                        mime="application/vnd.ms-excel"
+                    export.download_buttons(
+                        "📥 엑셀 파일 다운로드",
+                        "All_Weather_Portfolio.xlsx",
+                        {'Daily_Data': df, 'Monthly_Returns': monthly_table, 'Weights': w_df},
+                        daily_sheet='Daily_Data',
+                        no_index=('Weights',),
+                        formats={'Monthly_Returns': [('B:N', 10, '0.00%')]},
+                        key='p4_export',
                     )
\ No newline at end of file
@@ -2,8 +2,17 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import io
 import FinanceDataReader as fdr
+import universe
+import momentum_engine
+import compact_mode
+import costs
+import price_store
+import metrics
+import calendar_returns
+import export
+import drawdown
+import rolling_metrics
 import warnings
 
 # 경고 메시지 무시
@@ -35,6 +44,8 @@ def get_stock_list_safe(market_name, sample_size):
             df_list = fdr.StockListing('S&P500')
         elif market_name == "NASDAQ 100":
             df_list = fdr.StockListing('NASDAQ')
+        elif market_name == "KRX 전체":
+            df_list = fdr.StockListing('KRX')
             
         # 2. 컬럼명 통일 (Code/Symbol)
         if 'Code' not in df_list.columns and 'Symbol' in df_list.columns:
@@ -66,11 +77,58 @@ def get_stock_list_safe(market_name, sample_size):
         return [], {}, f"리스트 로딩 실패: {str(e)}"
 
 @st.cache_data(ttl=3600*24)
-def get_price_data(tickers, code_map, start_year, target_n):
+def get_survivorship_universe(market_name, tickers, start_year):
+    """
+    한국 시장용 편입 비트맵을 만듭니다. (기간 중 상장폐지 종목 포함)
+    반환: (비트맵, 상장폐지 종목 코드 set, 추가 종목명 dict)
+    """
+    krx_market = {"KOSPI 200": "KOSPI", "KOSDAQ 150": "KOSDAQ"}.get(market_name)
+    if krx_market is None:
+        return None, set(), {}
+
+    fetch_year = start_year - 2
+    intervals = universe.load_krx_intervals(krx_market, f'{fetch_year}-01-01', codes=tickers)
+    bdays = pd.bdate_range(f'{fetch_year}-01-01', pd.Timestamp.today())
+    bitmap = universe.MembershipBitmap.from_intervals(intervals, bdays)
+    delisted = set(intervals.loc[intervals['Delisted'], 'Code'])
+    return bitmap, delisted, intervals.set_index('Code')['Name'].to_dict()
+
+@st.cache_data(ttl=3600*24)
+def get_eligible_price_data(_bitmap, bitmap_key, delisted, momentum_window, compact=False):
+    """
+    편입 구간만 주가 데이터를 다운로드합니다. (생존편향 보정 모드)
+    """
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+
+    def reader(ticker, start, end):
+        symbol = f'KRX-DELISTING:{ticker}' if ticker in delisted else ticker
+        return fdr.DataReader(symbol, start, end)[['Close', 'Volume']]
+
+    def on_progress(i, total, ticker):
+        if i % 10 == 0:
+            status_text.text(f"데이터 수신 중.. ({i}/{total}) - {ticker}")
+            progress_bar.progress((i + 1) / total)
+
+    price_df, volume_df = universe.fetch_eligible_prices(_bitmap, reader, momentum_window, on_progress,
+                                                         with_volume=True)
+    status_text.empty()
+    progress_bar.empty()
+
+    if price_df.empty:
+        return pd.DataFrame(), pd.DataFrame(), "수집된 주가 데이터가 없습니다."
+    return (compact_mode.compact_panel(price_df.ffill(), compact),
+            compact_mode.compact_panel(volume_df, compact), None)
+
+@st.cache_data(ttl=3600*24)
+def get_price_data(tickers, code_map, start_year, target_n, compact=False):
     """
     주가 데이터를 다운로드합니다.
+    compact=True 이면 float32 패널로 저장합니다.
+    반환: (가격, 거래량, 오류 메시지)
     """
     all_prices = []
+    all_volumes = []
     # 모멘텀 계산을 위해 시작년도 2년 전부터 데이터 요청
     fetch_year = start_year - 2
     
@@ -88,7 +146,8 @@ def get_price_data(tickers, code_map, start_year, target_n):
         
         try:
             # 데이터 요청
-            df = fdr.DataReader(ticker, str(fetch_year))['Close']
+            raw = fdr.DataReader(ticker, str(fetch_year))
+            df = raw['Close']
             
             # 유효성 검사: 데이터가 너무 짧거나, 값이 변하지 않는(거래정지) 경우 제외
             if len(df) < 200 or df.nunique() <= 1:
@@ -96,6 +155,7 @@ def get_price_data(tickers, code_map, start_year, target_n):
                 
             df.name = ticker
             all_prices.append(df)
+            all_volumes.append(raw['Volume'].rename(ticker))
             valid_count += 1
             
             # 사용자가 원하는 개수만큼 모이면 중단 (속도 최적화)
@@ -108,11 +168,12 @@ def get_price_data(tickers, code_map, start_year, target_n):
     progress_bar.empty()
     
     if not all_prices:
-        return pd.DataFrame(), "수집된 주가 데이터가 없습니다."
+        return pd.DataFrame(), pd.DataFrame(), "수집된 주가 데이터가 없습니다."
         
     # 데이터 병합 (ffill로 결측치 보완)
-    price_df = pd.concat(all_prices, axis=1).fillna(method='ffill')
-    return price_df, None
+    price_df = pd.concat(all_prices, axis=1).ffill()
+    volume_df = pd.concat(all_volumes, axis=1)
+    return compact_mode.compact_panel(price_df, compact), compact_mode.compact_panel(volume_df, compact), None
 
 # -----------------------------------------------------------------------------
 # 3. 사이드바 UI
@@ -124,13 +185,13 @@ with st.sidebar:
     st.header("⚙️ 전략 설정")
     
     # 시장 선택
-    market_options = ["KOSPI 200", "KOSDAQ 150", "S&P 500", "NASDAQ 100"]
+    market_options = ["KOSPI 200", "KOSDAQ 150", "S&P 500", "NASDAQ 100", "KRX 전체"]
     target_market = st.selectbox("투자 시장", market_options)
     
     # 벤치마크 매핑
     bm_map = {
         "KOSPI 200": "KS200", "KOSDAQ 150": "KQ150", 
-        "S&P 500": "US500", "NASDAQ 100": "IXIC"
+        "S&P 500": "US500", "NASDAQ 100": "IXIC", "KRX 전체": "KS11"
     }
     
     start_year = st.number_input("시작 연도", value=2015, min_value=2000, max_value=2024)
@@ -142,12 +203,79 @@ with st.sidebar:
     rebalance_step = rebal_month_map[rebal_term]
     
     momentum_window = st.number_input("모멘텀 기간 (개월)", value=12)
+    
+    # 전체 종목을 한 번에 메모리에 올리지 않고 묶음 단위로 계산 (로컬 가격 저장소 사용)
+    out_of_core = st.checkbox("전체 종목 Out-of-core 모드", value=(target_market == "KRX 전체"),
+                              help="유니버스 크기 제한 없이 시장 전체 종목을 대상으로 합니다. "
+                                   "가격은 로컬 저장소에 받아 두고 묶음 단위로 읽어서 계산합니다.")
+    chunk_size = 200
+    if out_of_core:
+        chunk_size = st.slider("한 번에 읽을 종목 수 (chunk)", 50, 500, 200, step=50)
+
+    survivorship = False
+    if target_market in ["KOSPI 200", "KOSDAQ 150"] and not out_of_core:
+        survivorship = st.checkbox("상장폐지 종목 포함 (생존편향 보정)", value=False,
+                                   help="기간 중 상장폐지된 종목까지 포함하고, 각 시점에 상장되어 있던 종목만 순위에 넣습니다.")
+        if survivorship:
+            st.caption(universe.SURVIVORSHIP_NOTE)
+
+    compact = st.checkbox("Float32 컴팩트 모드", value=compact_mode.default_enabled(),
+                          help="가격/수익률을 float32로 저장해 메모리를 절반으로 줄입니다. (자산 곡선은 float64로 누적)")
+    precision_check = st.checkbox("정밀도 리포트 (float64와 비교)", value=False, disabled=not compact or out_of_core)
+
+    use_costs = st.checkbox("거래비용 반영 (거래량 기반 슬리피지)", value=False,
+                            help="수수료 + 스프레드 + 평균 거래대금 대비 주문 규모로 추정한 시장충격(제곱근 모형)을 차감합니다.")
+    capital = st.number_input("운용 금액 (현지 통화)", value=100_000_000, step=10_000_000, disabled=not use_costs)
+    impact_coef = st.number_input("시장충격 계수", value=1.0, step=0.1, disabled=not use_costs)
 
     st.markdown("---")
     export_excel = st.checkbox("📥 엑셀 다운로드", value=True)
     
     run_btn = st.button("🚀 전략 실행", type="primary")
 
+def run_out_of_core(tickers, code_map):
+    """
+    로컬 가격 저장소를 채운 뒤 종목 묶음 단위로 백테스트합니다.
+    반환: (보유/추천 종목 가격, 일별 수익률, 보유 기록, 현재 추천 종목, 오류 메시지)
+    """
+    store = price_store.get_store()
+    fetch_start = f'{start_year - 2}-01-01'
+
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+
+    def on_sync(i, total, ticker):
+        if i % 20 == 0:
+            status_text.text(f"가격 저장소 갱신 중.. ({i}/{total}) - {code_map.get(ticker, ticker)}")
+            progress_bar.progress((i + 1) / total)
+
+    def on_chunk(k, total):
+        status_text.text(f"모멘텀 계산 중.. (묶음 {k+1}/{total})")
+        progress_bar.progress((k + 1) / total)
+
+    # 벤치마크의 마지막 거래일까지 이미 받아 둔 종목은 다시 요청하지 않습니다
+    calendar = fdr.DataReader(bm_map[target_market], fetch_start)['Close'].index
+    tickers = store.sync(tickers, price_store.fdr_reader, fetch_start, on_sync, latest=calendar[-1])
+    if not tickers:
+        return pd.DataFrame(), pd.Series(dtype=float), None, None, "수집된 주가 데이터가 없습니다."
+
+    start_dt = max(pd.to_datetime(f'{start_year}-01-01'), calendar[0])
+    cost_model = costs.SquareRootImpact(impact_coef=impact_coef) if use_costs else None
+
+    full_ret, book, curr_top = momentum_engine.run_momentum_chunked(
+        store, tickers, calendar, start_dt, calendar[-1], rebalance_step, momentum_window, top_n,
+        code_map, chunk_size=chunk_size, past_lookup='searchsorted', cost_model=cost_model, capital=capital,
+        on_progress=on_chunk
+    )
+    status_text.empty()
+    progress_bar.empty()
+
+    # 현재 추천 종목 가격 표시용 (작은 패널, 추천 종목이 없으면 날짜만)
+    df_price = store.panel(list(curr_top.index), 'Close').ffill()
+    if df_price.empty:
+        df_price = pd.DataFrame(index=calendar)
+    return df_price, full_ret, book, curr_top, None
+
 # -----------------------------------------------------------------------------
 # 4. 메인 로직
 # -----------------------------------------------------------------------------
@@ -155,95 +283,62 @@ if run_btn:
     with st.spinner(f"[{target_market}] 데이터를 불러오는 중입니다..."):
         
         # 1. 종목 리스트 확보
-        raw_tickers, code_map, err = get_stock_list_safe(target_market, sample_size)
+        raw_tickers, code_map, err = get_stock_list_safe(target_market, 100000 if out_of_core else sample_size)
         if err:
             st.error(err)
             st.stop()
             
-        # 2. 주가 데이터 확보
-        df_price, err = get_price_data(raw_tickers, code_map, start_year, sample_size)
-        if err:
-            st.error(err)
-            st.stop()
+        if out_of_core:
+            df_price, full_ret, book, ooc_top, err = run_out_of_core(raw_tickers, code_map)
+            if err:
+                st.error(err)
+                st.stop()
+            bitmap = None
+        else:
+            # 2. 주가 데이터 확보
+            def load_prices(compact):
+                if survivorship:
+                    bitmap_key = (target_market, sample_size, start_year)
+                    return get_eligible_price_data(bitmap, bitmap_key, delisted, momentum_window, compact)
+                return get_price_data(raw_tickers, code_map, start_year, sample_size, compact)
 
-        # 3. 백테스트 수행
-        start_dt = pd.to_datetime(f'{start_year}-01-01')
-        if start_dt < df_price.index[0]: start_dt = df_price.index[0]
-        end_dt = df_price.index[-1]
-        
-        # 리밸런싱 날짜 생성
-        all_days = df_price.index
-        target_months = list(range(1, 13, rebalance_step))
-        rebalance_dates = []
-        
-        for year in range(start_dt.year, end_dt.year + 1):
-            for month in target_months:
-                month_data = all_days[(all_days.year == year) & (all_days.month == month)]
-                if not month_data.empty:
-                    rebalance_dates.append(month_data[-1])
+            bitmap = None
+            if survivorship:
+                bitmap, delisted, extra_names = get_survivorship_universe(target_market, raw_tickers[:sample_size], start_year)
+                code_map = {**extra_names, **code_map}
+            df_price, df_volume, err = load_prices(compact)
+            if err:
+                st.error(err)
+                st.stop()
+
+            # 3. 백테스트 수행
+            start_dt = pd.to_datetime(f'{start_year}-01-01')
+            if start_dt < df_price.index[0]: start_dt = df_price.index[0]
+            end_dt = df_price.index[-1]
         
-        rebalance_dates = sorted(list(set([d for d in rebalance_dates if start_dt <= d <= end_dt])))
+            # 리밸런싱 날짜 생성
+            rebalance_dates = momentum_engine.get_rebalance_dates(df_price.index, start_dt, end_dt, rebalance_step)
         
-        if len(rebalance_dates) < 2:
-            st.warning("데이터 기간이 짧아 전략을 실행할 수 없습니다. (시작 연도를 조정하세요)")
-            st.stop()
+            if len(rebalance_dates) < 2:
+                st.warning("데이터 기간이 짧아 전략을 실행할 수 없습니다. (시작 연도를 조정하세요)")
+                st.stop()
 
-        portfolio_returns = []
-        history_records = []
-        
-        for i in range(len(rebalance_dates) - 1):
-            curr_date = rebalance_dates[i]
-            next_date = rebalance_dates[i+1]
-            past_date_target = curr_date - pd.DateOffset(months=momentum_window)
-            
-            try:
-                # 과거 기준일 찾기
-                idx_loc = df_price.index.searchsorted(past_date_target)
-                if idx_loc >= len(df_price): continue
-                past_date_real = df_price.index[idx_loc]
-                
-                # asof를 사용하여 주말/휴일 문제 없이 데이터 조회
-                p_curr = df_price.asof(curr_date)
-                p_past = df_price.asof(past_date_real)
-                
-                # 모멘텀 계산
-                mom = (p_curr - p_past) / p_past
-                mom = mom.replace([np.inf, -np.inf], np.nan).dropna()
-                
-                if mom.empty: continue
+            cost_model = None
+            if use_costs:
+                cost_model = costs.SquareRootImpact(impact_coef=impact_coef).prepare(df_price, df_volume)
 
-                # 상위 N개 선정
-                top_series = mom.nlargest(top_n)
-                top_stocks = top_series.index.tolist()
-                
-                # 기록
-                for s in top_stocks:
-                    history_records.append({
-                        'Date': curr_date.strftime('%Y-%m-%d'),
-                        'Code': s,
-                        'Name': code_map.get(s, s),
-                        'Momentum': top_series[s]
-                    })
-                
-                # 수익률 계산 (다음 리밸런싱 날짜까지)
-                period_price = df_price[top_stocks].loc[curr_date:next_date]
-                if not period_price.empty:
-                    period_ret = period_price.pct_change().fillna(0).mean(axis=1)
-                    portfolio_returns.append(period_ret)
-                    
-            except: continue
+            full_ret, book = momentum_engine.run_momentum_backtest(
+                df_price, rebalance_dates, momentum_window, top_n, code_map,
+                past_lookup='searchsorted', eligibility=bitmap, cost_model=cost_model, capital=capital
+            )
         
         # 4. 결과 출력
-        if portfolio_returns:
-            full_ret = pd.concat(portfolio_returns)
-            full_ret = full_ret[~full_ret.index.duplicated(keep='first')]
-            
-            cum_ret = (1 + full_ret).cumprod()
-            dd = (cum_ret / cum_ret.cummax()) - 1
-            mdd = dd.min()
-            
-            days = (cum_ret.index[-1] - cum_ret.index[0]).days
-            cagr = cum_ret.iloc[-1]**(365/days) - 1 if days > 0 else 0
+        if not full_ret.empty:
+            # float32 수익률이어도 자산 곡선은 float64로 누적
+            cum_ret = compact_mode.accumulate_equity(full_ret)
+            dd = metrics.drawdown(cum_ret)
+            stats = metrics.compute(full_ret)
+            cagr, mdd = stats.cagr, stats.mdd
             
             # 벤치마크 로드
             try:
@@ -257,9 +352,11 @@ if run_btn:
             
             # 현재 추천 종목
             last_date = df_price.index[-1]
-            last_past = df_price.index[min(df_price.index.searchsorted(last_date - pd.DateOffset(months=momentum_window)), len(df_price)-1)]
-            curr_mom = ((df_price.iloc[-1] - df_price.loc[last_past]) / df_price.loc[last_past]).dropna()
-            curr_top = curr_mom.nlargest(top_n)
+            if out_of_core:
+                curr_top = ooc_top
+            else:
+                curr_top = momentum_engine.current_picks(df_price, momentum_window, top_n,
+                                                         past_lookup='searchsorted', eligibility=bitmap)
             
             curr_data = []
             is_usd = "USD" in ("USD" if target_market in ["S&P 500", "NASDAQ 100"] else "KRW")
@@ -270,19 +367,31 @@ if run_btn:
                     'Return_1Y': v, 
                     'Price': df_price.iloc[-1][c]
                 })
-            df_picks = pd.DataFrame(curr_data)
-            df_hist = pd.DataFrame(history_records)
+            df_picks = pd.DataFrame(curr_data, columns=['Code', 'Name', 'Return_1Y', 'Price'])
+            df_hist = book.history_frame()
             
             # 월별 수익률 표
-            m_ret = full_ret.resample('M').apply(lambda x: (1 + x).prod() - 1)
-            m_table = m_ret.groupby([m_ret.index.year, m_ret.index.month]).sum().unstack()
-            m_table.columns = [f"{x}월" for x in m_table.columns]
+            m_table = calendar_returns.monthly_table(full_ret, total=None)
 
             # --- 화면 표시 ---
             c1, c2, c3 = st.columns(3)
             c1.metric("Total Return", f"{(cum_ret.iloc[-1]-1)*100:.2f}%")
             c2.metric("CAGR", f"{cagr*100:.2f}%")
             c3.metric("MDD", f"{mdd*100:.2f}%", delta_color="inverse")
+            metrics.show_stats(stats)
+            drawdown.show_episodes({'Strategy': cum_ret, 'Benchmark': bm_cum})
+            rolling_metrics.show_rolling({'Strategy': cum_ret, 'Benchmark': bm_cum})
+            costs.show_cost_caption(book)
+            
+            if compact and precision_check and not out_of_core:
+                df_full, _, _ = load_prices(False)
+                rebal_full = momentum_engine.get_rebalance_dates(df_full.index, start_dt, end_dt, rebalance_step)
+                ret_full, _ = momentum_engine.run_momentum_backtest(
+                    df_full, rebal_full, momentum_window, top_n, code_map,
+                    past_lookup='searchsorted', eligibility=bitmap, cost_model=cost_model, capital=capital
+                )
+                compact_mode.show_precision_report(
+                    compact_mode.precision_report(full_ret, ret_full, df_price, df_full))
             
             t1, t2, t3, t4 = st.tabs(["Chart", "Current Picks", "Monthly", "History"])
             
@@ -310,12 +419,12 @@ if run_btn:
                 
             # 엑셀 다운로드
             if export_excel:
-                buf = io.BytesIO()
-                with pd.ExcelWriter(buf, engine='xlsxwriter') as w:
-                    df_hist.to_excel(w, sheet_name='History', index=False)
-                    m_table.to_excel(w, sheet_name='Monthly')
-                    df_picks.to_excel(w, sheet_name='Picks', index=False)
-                st.download_button("Download Excel", buf.getvalue(), "Momentum_Result.xlsx", "application/vnd.ms-excel")
+                export.download_buttons(
+                    "Download Excel", "Momentum_Result.xlsx",
+                    {'History': df_hist, 'Monthly': m_table, 'Picks': df_picks},
+                    no_index=('History', 'Picks'),
+                    key='p5_export',
+                )
                 
         else:
             st.error("결과를 계산할 수 없습니다. (모멘텀 기간을 줄이거나, 투자 유니버스를 늘려보세요)")
\ No newline at end of file
@@ -3,9 +3,18 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import datetime
-import io
 import FinanceDataReader as fdr
 import requests
+import os
+import universe
+import momentum_engine
+import compact_mode
+import costs
+import metrics
+import calendar_returns
+import export
+import drawdown
+import rolling_metrics
 
 # -----------------------------------------------------------------------------
 # 1. 페이지 설정 및 캐싱 함수
@@ -42,8 +51,11 @@ def get_nasdaq100_list():
     return pd.DataFrame()
 
 @st.cache_data(ttl=3600*24) 
-def get_stock_data(market_type, start_year, sample_size):
-    """선택한 시장의 종목 데이터를 다운로드합니다."""
+def get_stock_data(market_type, start_year, sample_size, compact=False):
+    """
+    선택한 시장의 종목 데이터를 다운로드합니다. (compact=True 이면 float32 패널)
+    반환: (가격, 종목명 맵, 거래량)
+    """
     
     # 1. 종목 리스트 가져오기
     try:
@@ -65,7 +77,7 @@ def get_stock_data(market_type, start_year, sample_size):
             
     except Exception as e:
         st.error(f"종목 리스트 오류: {e}")
-        return pd.DataFrame(), {}
+        return pd.DataFrame(), {}, pd.DataFrame()
         
     # 컬럼명 통일 및 전처리
     mapper = {'Symbol': 'Code', 'Security': 'Name', 'Ticker': 'Code', 'Company': 'Name'}
@@ -81,6 +93,7 @@ def get_stock_data(market_type, start_year, sample_size):
     
     # 2. 주가 데이터 다운로드
     all_prices = []
+    all_volumes = []
     fetch_year = start_year - 2 # 모멘텀 계산을 위해 2년 전 데이터부터 확보
     
     progress_bar = st.progress(0)
@@ -93,9 +106,9 @@ def get_stock_data(market_type, start_year, sample_size):
             progress_bar.progress((i + 1) / total_tickers)
             
             # 데이터 다운로드
-            df = fdr.DataReader(ticker, str(fetch_year))['Close']
-            df.name = ticker
-            all_prices.append(df)
+            df = fdr.DataReader(ticker, str(fetch_year))
+            all_prices.append(df['Close'].rename(ticker))
+            all_volumes.append(df['Volume'].rename(ticker))
         except:
             continue
             
@@ -103,10 +116,28 @@ def get_stock_data(market_type, start_year, sample_size):
     progress_bar.empty()
     
     if not all_prices:
-        return pd.DataFrame(), {}
+        return pd.DataFrame(), {}, pd.DataFrame()
 
-    price_df = pd.concat(all_prices, axis=1).fillna(method='ffill')
-    return price_df, code_map
+    price_df = pd.concat(all_prices, axis=1).ffill()
+    price_df = compact_mode.compact_panel(price_df, compact)
+    volume_df = compact_mode.compact_panel(pd.concat(all_volumes, axis=1), compact)
+    return price_df, code_map, volume_df
+
+# 지수 편입 이력 파일 (Code, Start, End) - 있으면 생존편향 보정에 사용
+MEMBERSHIP_FILES = {
+    "S&P 500": os.path.join("data", "membership", "SP500.csv"),
+    "NASDAQ 100": os.path.join("data", "membership", "NDX100.csv"),
+}
+
+@st.cache_data(ttl=3600*24)
+def get_membership_bitmap(market_type, start_year):
+    """편입 이력 파일이 있으면 날짜 x 종목 비트맵을 만듭니다."""
+    path = MEMBERSHIP_FILES.get(market_type)
+    if not path or not os.path.exists(path):
+        return None
+    intervals = universe.load_membership_csv(path)
+    bdays = pd.bdate_range(f'{start_year - 2}-01-01', pd.Timestamp.today())
+    return universe.MembershipBitmap.from_intervals(intervals, bdays)
 
 # -----------------------------------------------------------------------------
 # 2. 사이드바 UI
@@ -135,6 +166,15 @@ with st.sidebar:
     
     momentum_window = st.number_input("모멘텀 기간 (개월)", value=12)
 
+    compact = st.checkbox("Float32 컴팩트 모드", value=compact_mode.default_enabled(),
+                          help="가격/수익률을 float32로 저장해 메모리를 절반으로 줄입니다. (자산 곡선은 float64로 누적)")
+    precision_check = st.checkbox("정밀도 리포트 (float64와 비교)", value=False, disabled=not compact)
+
+    use_costs = st.checkbox("거래비용 반영 (거래량 기반 슬리피지)", value=False,
+                            help="수수료 + 스프레드 + 평균 거래대금 대비 주문 규모로 추정한 시장충격(제곱근 모형)을 차감합니다.")
+    capital = st.number_input("운용 금액 ($)", value=1_000_000, step=100_000, disabled=not use_costs)
+    impact_coef = st.number_input("시장충격 계수", value=1.0, step=0.1, disabled=not use_costs)
+
     st.markdown("---")
     export_excel_option = st.checkbox("📥 엑셀 다운로드 기능 활성화", value=True)
     run_btn = st.button("🚀 전략 실행", type="primary")
@@ -145,76 +185,42 @@ with st.sidebar:
 if run_btn:
     with st.spinner(f"[{market_option}] 데이터를 분석하고 있습니다..."):
         # 1. 데이터 로드
-        df_price, code_map = get_stock_data(market_option, start_year, sample_size)
+        df_price, code_map, df_volume = get_stock_data(market_option, start_year, sample_size, compact)
         
         if df_price.empty:
             st.error("데이터를 가져오지 못했습니다. 잠시 후 다시 시도하거나 종목 수를 줄여보세요.")
             st.stop()
 
+        # 편입 이력 (파일이 있는 경우에만)
+        bitmap = get_membership_bitmap(market_option, start_year)
+        if bitmap is not None:
+            st.caption("📜 지수 편입 이력 파일을 사용하여 각 시점의 편입 종목만 순위에 반영합니다.")
+
         # 2. 백테스트 시뮬레이션
         start_dt = pd.to_datetime(f'{start_year}-01-01')
         if start_dt < df_price.index[0]: start_dt = df_price.index[0]
         end_dt = df_price.index[-1]
         
         # 리밸런싱 날짜 계산
-        all_days = df_price.index
-        target_months = list(range(1, 13, rebalance_step))
-        rebalance_dates = []
-        
-        for year in range(start_dt.year, end_dt.year + 1):
-            for month in target_months:
-                month_data = all_days[(all_days.year == year) & (all_days.month == month)]
-                if not month_data.empty:
-                    rebalance_dates.append(month_data[-1])
-        
-        rebalance_dates = sorted(list(set([d for d in rebalance_dates if start_dt <= d <= end_dt])))
-        
-        portfolio_returns = []
-        history_records = []
-        
-        for i in range(len(rebalance_dates) - 1):
-            curr_date = rebalance_dates[i]
-            next_date = rebalance_dates[i+1]
-            past_date_target = curr_date - pd.DateOffset(months=momentum_window)
-            
-            try:
-                idx_loc = df_price.index.get_indexer([past_date_target], method='nearest')[0]
-                past_date_real = df_price.index[idx_loc]
-                
-                price_curr = df_price.loc[:curr_date].iloc[-1]
-                price_past = df_price.loc[past_date_real]
-                
-                mom_score = (price_curr - price_past) / price_past
-                top_stocks = mom_score.nlargest(top_n).index.tolist()
-                
-                # 기록
-                for stock in top_stocks:
-                    history_records.append({
-                        'Date': curr_date.strftime('%Y-%m-%d'),
-                        'Code': stock,
-                        'Name': code_map.get(stock, stock),
-                        'Momentum': mom_score[stock]
-                    })
-                
-                price_period = df_price[top_stocks].loc[curr_date:next_date]
-                if not price_period.empty:
-                    period_ret = price_period.pct_change().fillna(0).mean(axis=1)
-                    portfolio_returns.append(period_ret)
-            except:
-                continue
+        rebalance_dates = momentum_engine.get_rebalance_dates(df_price.index, start_dt, end_dt, rebalance_step)
+
+        cost_model = None
+        if use_costs:
+            cost_model = costs.SquareRootImpact(impact_coef=impact_coef).prepare(df_price, df_volume)
+
+        full_returns, book = momentum_engine.run_momentum_backtest(
+            df_price, rebalance_dates, momentum_window, top_n, code_map,
+            past_lookup='nearest', eligibility=bitmap, cost_model=cost_model, capital=capital
+        )
                 
         # 결과 처리
-        if portfolio_returns:
-            full_returns = pd.concat(portfolio_returns)
-            full_returns = full_returns[~full_returns.index.duplicated(keep='first')]
-            
-            cum_returns = (1 + full_returns).cumprod()
-            running_max = cum_returns.cummax()
-            drawdown = (cum_returns / running_max) - 1
-            mdd = drawdown.min()
-            
-            total_days = (cum_returns.index[-1] - cum_returns.index[0]).days
-            cagr = cum_returns.iloc[-1]**(365/total_days) - 1
+        if not full_returns.empty:
+            # float32 수익률이어도 자산 곡선은 float64로 누적
+            cum_returns = compact_mode.accumulate_equity(full_returns)
+            df_history = book.history_frame()
+            drawdown = metrics.drawdown(cum_returns)
+            stats = metrics.compute(full_returns)
+            cagr, mdd = stats.cagr, stats.mdd
             
             # 벤치마크 (QQQ 또는 SPY)
             try:
@@ -232,6 +238,20 @@ if run_btn:
             col1.metric("총 수익률", f"{(cum_returns.iloc[-1]-1)*100:.2f}%")
             col2.metric("CAGR", f"{cagr*100:.2f}%")
             col3.metric("MDD", f"{mdd*100:.2f}%", delta_color="inverse")
+            metrics.show_stats(stats)
+            drawdown.show_episodes({'Strategy': cum_returns, bm_label: bm_cum})
+            rolling_metrics.show_rolling({'Strategy': cum_returns, bm_label: bm_cum})
+            costs.show_cost_caption(book)
+            
+            if compact and precision_check:
+                df_full, _, _ = get_stock_data(market_option, start_year, sample_size, False)
+                rebal_full = momentum_engine.get_rebalance_dates(df_full.index, start_dt, end_dt, rebalance_step)
+                ret_full, _ = momentum_engine.run_momentum_backtest(
+                    df_full, rebal_full, momentum_window, top_n, code_map,
+                    past_lookup='nearest', eligibility=bitmap, cost_model=cost_model, capital=capital
+                )
+                compact_mode.show_precision_report(
+                    compact_mode.precision_report(full_returns, ret_full, df_price, df_full))
             
             tab1, tab2, tab3 = st.tabs(["📊 차트", "🏆 추천 종목", "📝 매매 기록"])
             
@@ -251,9 +271,7 @@ if run_btn:
             with tab2:
                 # 현재 추천 종목
                 latest = df_price.iloc[-1]
-                past = df_price.loc[df_price.index[df_price.index.get_indexer([df_price.index[-1] - pd.DateOffset(months=momentum_window)], method='nearest')[0]]]
-                curr_mom = (latest - past) / past
-                top_curr = curr_mom.nlargest(top_n)
+                top_curr = momentum_engine.current_picks(df_price, momentum_window, top_n, eligibility=bitmap)
                 
                 recs = []
                 for c, s in top_curr.items():
@@ -261,33 +279,20 @@ if run_btn:
                 st.table(pd.DataFrame(recs))
                 
             with tab3:
-                st.dataframe(pd.DataFrame(history_records))
+                st.dataframe(df_history)
             
             # 엑셀 다운로드 (수정됨: 월별+연별 통합)
             if export_excel_option:
-                buffer = io.BytesIO()
-                
-                # 1. 월별 수익률 계산 및 피벗 변환
-                monthly_ret = full_returns.resample('M').apply(lambda x: (1 + x).prod() - 1)
-                m_df = monthly_ret.to_frame('Return')
-                m_df['Year'] = m_df.index.year
-                m_df['Month'] = m_df.index.month
-                monthly_pivot = m_df.pivot(index='Year', columns='Month', values='Return')
-                
-                # 2. 연별 수익률 계산 및 인덱스 조정
-                yearly_ret = full_returns.resample('A').apply(lambda x: (1 + x).prod() - 1)
-                y_df = yearly_ret.to_frame('Annual Return') # 컬럼명 지정
-                y_df.index = y_df.index.year # 인덱스를 연도(숫자)로 맞춰줌
-                
-                # 3. 데이터 병합 (월별 데이터 + 우측에 연별 데이터 붙이기)
-                final_sheet_df = pd.concat([monthly_pivot, y_df], axis=1)
+                # 1~3. 월별 수익률 (연도 x 월) + 우측에 연별 수익률
+                final_sheet_df = calendar_returns.monthly_table(
+                    full_returns, month_names=list(range(1, 13)), total='Annual Return')
 
-                # 4. 엑셀 저장
-                with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                    pd.DataFrame(history_records).to_excel(writer, sheet_name='History', index=False)
-                    pd.DataFrame(recs).to_excel(writer, sheet_name='Current_Picks', index=False)
-                    
-                    # 통합된 데이터프레임을 저장 (별도 Yearly 시트 없음)
-                    final_sheet_df.to_excel(writer, sheet_name='Monthly_Returns')
+                # 4. 엑셀 저장 (누를 때 생성, 통합된 월별+연별 시트 - 별도 Yearly 시트 없음)
+                export.download_buttons(
+                    "📥 엑셀 다운로드", f"{market_option}_backtest.xlsx",
+                    {'History': df_history, 'Current_Picks': pd.DataFrame(recs),
+                     'Monthly_Returns': final_sheet_df},
+                    no_index=('History', 'Current_Picks'),
+                    key='sp_export',
+                )
                     
-                st.download_button("📥 엑셀 다운로드", buffer, f"{market_option}_backtest.xlsx")
\ No newline at end of file
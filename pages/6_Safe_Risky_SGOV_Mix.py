@@ -2,8 +2,13 @@ import streamlit as st
 import yfinance as yf
 import pandas as pd
 import matplotlib.pyplot as plt
-import io
 import warnings
+import metrics
+import calendar_returns
+import export
+import charting
+import drawdown
+import rolling_metrics
 
 # 경고 무시 및 차트 스타일 설정
 warnings.filterwarnings('ignore')
@@ -228,91 +233,91 @@ if st.button("🚀 전략 실행 (신호 + 백테스트)", type="primary", use_c
         df['Hold_Safe'] = (1 + daily_ret[ticker_safe]).cumprod()
         
         # MDD 계산
-        df['Peak'] = df['My_Asset'].cummax()
-        df['MDD'] = (df['My_Asset'] - df['Peak']) / df['Peak'] * 100
+        df['MDD'] = metrics.drawdown(df['My_Asset']) * 100
         
         # 성과 요약
-        final_return = df['My_Asset'].iloc[-1]
-        cagr = final_return ** (252 / len(df)) - 1
-        mdd_min = df['MDD'].min()
+        stats = metrics.compute(df['Strategy_Ret'])
+        final_return = 1 + stats.total_return
+        cagr = stats.cagr
+        mdd_min = stats.mdd * 100
         
         k1, k2, k3 = st.columns(3)
         k1.metric("최종 자산 배수", f"{final_return:.2f}배")
         k2.metric("연평균 수익률 (CAGR)", f"{cagr*100:.2f}%")
         k3.metric("최대 낙폭 (Max MDD)", f"{mdd_min:.2f}%")
+        metrics.show_stats(stats)
+        drawdown.show_episodes({'Strategy': df['My_Asset'], ticker_safe: df['Hold_Safe']})
+        rolling_metrics.show_rolling({'Strategy': df['My_Asset'], ticker_safe: df['Hold_Safe']})
 
         # ---------------------------------------------------------------------
         # [차트 그리기] 2행 2열 (총 4개 차트)
         # ---------------------------------------------------------------------
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12)) # 사이즈 세로 확장
-        
-        # (1) 수익률 차트 (로그) - 좌측 상단
-        axes[0, 0].plot(df.index, df['My_Asset'], label='Strategy', color='red', linewidth=1.5)
-        axes[0, 0].plot(df.index, df['Hold_Safe'], label=f'{ticker_safe} Hold', color='black', alpha=0.3, linestyle='--')
-        axes[0, 0].set_title('1. Asset Growth (Log Scale)')
-        axes[0, 0].set_yscale('log')
-        axes[0, 0].legend(loc='upper left')
-        axes[0, 0].grid(True, which='both', alpha=0.3)
-        
-        # (2) MDD 차트 - 우측 상단
-        axes[0, 1].plot(df.index, df['MDD'], label='Drawdown', color='blue', linewidth=1)
-        axes[0, 1].fill_between(df.index, df['MDD'], 0, color='blue', alpha=0.1)
-        axes[0, 1].set_title('2. Drawdown Risk (MDD)')
-        axes[0, 1].legend(loc='lower left')
-        axes[0, 1].grid(True, alpha=0.3)
-        
-        # (3) 마켓 시그널 (가격 vs 이평선) + 매매 신호 화살표 - 좌측 하단
-        axes[1, 0].plot(df.index, df[ticker_safe], label='Price', color='black', linewidth=1, alpha=0.6)
-        axes[1, 0].plot(df.index, df[stock_ma_col], label=f'MA ({ma_window})', color='orange', linewidth=1.5, alpha=0.8)
-        
         # 매매 신호 포착
         df['Signal_Change'] = df['Stock_Signal'].diff()
         buy_risky = df[df['Signal_Change'] == 1]
         buy_safe = df[df['Signal_Change'] == -1]
 
-        # 화살표 그리기
-        axes[1, 0].plot(buy_risky.index, buy_risky[ticker_safe], '^', markersize=8, color='red', label='Buy Risky')
-        axes[1, 0].plot(buy_safe.index, buy_safe[ticker_safe], 'v', markersize=8, color='blue', label='Buy Safe')
+        def draw_charts():
+            # 패널별로 점 개수를 줄여서 그립니다 (낙폭은 바닥 보존)
+            growth = charting.decimate_frame(df[['My_Asset', 'Hold_Safe']])
+            mdd = charting.decimate(df['MDD'], method='minmax')
+            sig = charting.decimate_frame(df[[ticker_safe, stock_ma_col]])
+            rate = charting.decimate_frame(df[[rate_ticker, rate_ma_col]])
+
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12)) # 사이즈 세로 확장
+
+            # (1) 수익률 차트 (로그) - 좌측 상단
+            axes[0, 0].plot(growth.index, growth['My_Asset'], label='Strategy', color='red', linewidth=1.5)
+            axes[0, 0].plot(growth.index, growth['Hold_Safe'], label=f'{ticker_safe} Hold', color='black', alpha=0.3, linestyle='--')
+            axes[0, 0].set_title('1. Asset Growth (Log Scale)')
+            axes[0, 0].set_yscale('log')
+            axes[0, 0].legend(loc='upper left')
+            axes[0, 0].grid(True, which='both', alpha=0.3)
+
+            # (2) MDD 차트 - 우측 상단
+            axes[0, 1].plot(mdd.index, mdd, label='Drawdown', color='blue', linewidth=1)
+            axes[0, 1].fill_between(mdd.index, mdd, 0, color='blue', alpha=0.1)
+            axes[0, 1].set_title('2. Drawdown Risk (MDD)')
+            axes[0, 1].legend(loc='lower left')
+            axes[0, 1].grid(True, alpha=0.3)
+
+            # (3) 마켓 시그널 (가격 vs 이평선) + 매매 신호 화살표 - 좌측 하단
+            axes[1, 0].plot(sig.index, sig[ticker_safe], label='Price', color='black', linewidth=1, alpha=0.6)
+            axes[1, 0].plot(sig.index, sig[stock_ma_col], label=f'MA ({ma_window})', color='orange', linewidth=1.5, alpha=0.8)
 
-        axes[1, 0].set_title(f'3. Market Signal ({ticker_safe} vs MA)')
-        axes[1, 0].legend(loc='best')
-        axes[1, 0].grid(True, alpha=0.3)
+            # 화살표 그리기
+            axes[1, 0].plot(buy_risky.index, buy_risky[ticker_safe], '^', markersize=8, color='red', label='Buy Risky')
+            axes[1, 0].plot(buy_safe.index, buy_safe[ticker_safe], 'v', markersize=8, color='blue', label='Buy Safe')
 
-        # (4) 금리 차트 (금리 vs 이평선) - 우측 하단
-        axes[1, 1].plot(df.index, df[rate_ticker], label='Rate', color='purple', linewidth=1)
-        axes[1, 1].plot(df.index, df[rate_ma_col], label=f'MA ({rate_ma_window})', color='green', linewidth=1.5)
-        axes[1, 1].set_title(f'4. Interest Rate Risk ({rate_ticker} vs MA)')
-        axes[1, 1].legend(loc='upper left')
-        axes[1, 1].grid(True, alpha=0.3)
+            axes[1, 0].set_title(f'3. Market Signal ({ticker_safe} vs MA)')
+            axes[1, 0].legend(loc='best')
+            axes[1, 0].grid(True, alpha=0.3)
 
-        plt.tight_layout() # 차트 간격 자동 조절
-        st.pyplot(fig)
+            # (4) 금리 차트 (금리 vs 이평선) - 우측 하단
+            axes[1, 1].plot(rate.index, rate[rate_ticker], label='Rate', color='purple', linewidth=1)
+            axes[1, 1].plot(rate.index, rate[rate_ma_col], label=f'MA ({rate_ma_window})', color='green', linewidth=1.5)
+            axes[1, 1].set_title(f'4. Interest Rate Risk ({rate_ticker} vs MA)')
+            axes[1, 1].legend(loc='upper left')
+            axes[1, 1].grid(True, alpha=0.3)
+
+            plt.tight_layout() # 차트 간격 자동 조절
+            return fig
+
+        charting.show_figure(
+            'sgov_mix',
+            {'safe': ticker_safe, 'rate': rate_ticker, 'ma': ma_window, 'rate_ma': rate_ma_window},
+            df, draw_charts,
+        )
         
         # ---------------------------------------------------------------------
         # 엑셀 다운로드 (월별 데이터 포함)
         # ---------------------------------------------------------------------
-        # 월별 수익률 계산
-        try:
-            # Pandas 2.0+ 대응
-            monthly_ret = df['Strategy_Ret'].resample('ME').apply(lambda x: (1 + x).prod() - 1)
-        except:
-            monthly_ret = df['Strategy_Ret'].resample('M').apply(lambda x: (1 + x).prod() - 1)
-
-        monthly_table = monthly_ret.groupby([monthly_ret.index.year, monthly_ret.index.month]).sum().unstack()
-        monthly_table.columns = [f"{c}월" for c in monthly_table.columns]
-        
-        # 연도별 수익률 (Year Total)
-        try:
-            yearly_ret = df['Strategy_Ret'].resample('YE').apply(lambda x: (1 + x).prod() - 1)
-        except:
-            yearly_ret = df['Strategy_Ret'].resample('Y').apply(lambda x: (1 + x).prod() - 1)
-            
-        yearly_ret.index = yearly_ret.index.year
-        monthly_table['Year_Total'] = yearly_ret
+        # 월별 수익률 + 연도별 수익률 (Year Total)
+        monthly_table = calendar_returns.monthly_table(df['Strategy_Ret'])
 
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Daily_Data')
-            monthly_table.to_excel(writer, sheet_name='Monthly_Returns')
-            
-        st.download_button("📥 백테스트 결과 엑셀 다운로드", output.getvalue(), "Backtest_Result.xlsx")
\ No newline at end of file
+        export.download_buttons(
+            "📥 백테스트 결과 엑셀 다운로드", "Backtest_Result.xlsx",
+            {'Daily_Data': df, 'Monthly_Returns': monthly_table},
+            daily_sheet='Daily_Data',
+            key='p6_export',
+        )
\ No newline at end of file
@@ -2,10 +2,16 @@ import streamlit as st
 import yfinance as yf
 import pandas as pd
 import matplotlib.pyplot as plt
-import io
 import warnings
 import numpy as np
-import calendar
+import tax
+import metrics
+import calendar_returns
+import export
+import charting
+import drawdown
+import rolling_metrics
+import range_index
 
 # -----------------------------------------------------------------------------
 # 1. 기본 설정 (Basic Setup)
@@ -138,7 +144,7 @@ if st.button("🚀 전략 실행 및 분석", type="primary", use_container_widt
         position_changes = []
         
         start_idx = 252
-        year_realized_gain = 0
+        tax_engine = tax.TaxEngine()
         
         for i in range(start_idx, len(dates)):
             today = dates[i]
@@ -196,6 +202,9 @@ if st.button("🚀 전략 실행 및 분석", type="primary", use_container_widt
                      "Desc": mode_desc.split('(')[0].strip(),
                      "Detail": mode_desc
                  })
+                 # 전일 종가로 교체 매매 (lot 기록)
+                 tax_engine.rebalance(prev_date, df_price.iloc[yesterday_idx],
+                                      {t: current_capital * w for t, w in target_weights.items()})
             
             current_weights = target_weights
 
@@ -206,26 +215,26 @@ if st.button("🚀 전략 실행 및 분석", type="primary", use_container_widt
             
             profit = current_capital * daily_ret
             current_capital += profit
-            year_realized_gain += profit
             
             equity_curve.append(current_capital)
             weights_history.append(str(current_weights)) # 딕셔너리를 문자열로 저장
             
             # --- [D] 세금 ---
+            # 전년도에 매도한 lot의 실현 손익(FIFO) 기준
             if apply_tax and (today.year != prev_date.year):
-                taxable = max(0, year_realized_gain - 2500000)
-                tax = taxable * 0.22
-                if tax > 0:
-                    current_capital -= tax
+                tax_amount = tax_engine.tax_for(prev_date.year)
+                if tax_amount > 0:
+                    current_capital -= tax_amount
+                    tax_engine.rebalance(today, df_price.iloc[i],
+                                         {t: current_capital * w for t, w in current_weights.items()})
                     trade_logs.append({
                         "Date": today.strftime('%Y-%m-%d'),
                         "Type": "Tax",
                         "Desc": f"{prev_date.year}년 귀속 양도세",
                         "Weights": "-",
-                        "Amount": -round(tax),
+                        "Amount": -round(tax_amount),
                         "Fee": 0
                     })
-                year_realized_gain = 0
 
         # 결과 정리
         res_index = dates[start_idx:]
@@ -291,97 +300,90 @@ if st.button("🚀 전략 실행 및 분석", type="primary", use_container_widt
         # [기존 결과 리포팅]
         # ---------------------------------------------------------------------
         final_cap = equity_curve[-1]
-        cagr = (final_cap / initial_capital) ** (1 / ((len(res_index)/252))) - 1
-        peak_series = res_df['Equity'].cummax()
-        mdd_series = (res_df['Equity'] - peak_series) / peak_series
-        mdd = mdd_series.min()
+        stats = metrics.from_equity(res_df['Equity'], initial=initial_capital)
+        mdd_series = metrics.drawdown(res_df['Equity'])
+        cagr, mdd = stats.cagr, stats.mdd
         
         st.subheader("📊 백테스트 결과 요약")
         col1, col2, col3 = st.columns(3)
         col1.metric("최종 자산 (Final Equity)", f"{final_cap:,.0f} 원")
         col2.metric("CAGR (연평균 수익률)", f"{cagr*100:.2f} %")
         col3.metric("MDD (최대 낙폭)", f"{mdd*100:.2f} %")
+        metrics.show_stats(stats)
+        drawdown.show_episodes({'Strategy': res_df['Equity']})
+        rolling_metrics.show_rolling({'Strategy': res_df['Equity']})
+        range_index.show_range_metrics({'Strategy': res_df['Equity']}, key='p7_range')
+        if apply_tax:
+            tax.show_tax_table(tax_engine.yearly_frame())
         
         # ---------------------------------------------------------------------
         # [차트 및 엑셀 다운로드 (기존 코드 유지)]
         # ---------------------------------------------------------------------
         st.subheader("📈 상세 분석 차트")
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # 1. Equity
-        axes[0, 0].plot(res_df.index, res_df['Equity'], label='Strategy', color='firebrick')
-        axes[0, 0].set_yscale('log')
-        axes[0, 0].set_title('1. Equity Curve (Log Scale)')
-        axes[0, 0].legend()
-        axes[0, 0].grid(True, which='both', alpha=0.3)
-        
-        for change in position_changes:
-            c_date = change['Date']
-            if c_date in res_df.index:
-                c_price = res_df.loc[c_date, 'Equity']
-                axes[0, 0].annotate('', xy=(c_date, c_price), xytext=(c_date, c_price * 1.15),
-                                    arrowprops=dict(facecolor='black', shrink=0.05, width=1, headwidth=5))
-
-        # 2. MDD
-        axes[0, 1].plot(res_df.index, mdd_series * 100, label='Drawdown', color='blue')
-        axes[0, 1].fill_between(res_df.index, mdd_series * 100, 0, color='blue', alpha=0.1)
-        axes[0, 1].set_title('2. Drawdown (%)')
-        axes[0, 1].grid(True, alpha=0.3)
-        
-        # 3. Market Trend
-        axes[1, 0].plot(res_df.index, res_df['Price'], label=f'{ticker_risky_base} Price', color='black', alpha=0.6)
-        axes[1, 0].plot(res_df.index, res_df['MA'], label=f'MA ({ma_window})', color='orange', linestyle='--')
-        axes[1, 0].set_title(f'3. Market Trend ({ticker_risky_base} vs MA)')
-        axes[1, 0].legend()
-        axes[1, 0].grid(True, alpha=0.3)
-        
-        # 4. Canary
-        axes[1, 1].plot(res_df.index, res_df[f'{ticker_canary}_Score'], color='purple', label=f'{ticker_canary} Momentum')
-        axes[1, 1].axhline(0, color='red', linestyle='--')
-        axes[1, 1].fill_between(res_df.index, res_df[f'{ticker_canary}_Score'], 0, where=(res_df[f'{ticker_canary}_Score'] < 0), color='red', alpha=0.2)
-        axes[1, 1].set_title(f'4. Risk Signal ({ticker_canary})')
-        axes[1, 1].grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        st.pyplot(fig)
+        score_col = f'{ticker_canary}_Score'
+
+        def draw_charts():
+            # 패널별로 점 개수를 줄여서 그립니다 (낙폭/카나리아는 바닥 보존)
+            equity = charting.decimate(res_df['Equity'])
+            mdd = charting.decimate(mdd_series * 100, method='minmax')
+            trend = charting.decimate_frame(res_df[['Price', 'MA']])
+            canary = charting.decimate(res_df[score_col], method='minmax')
+
+            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+
+            # 1. Equity
+            axes[0, 0].plot(equity.index, equity, label='Strategy', color='firebrick')
+            axes[0, 0].set_yscale('log')
+            axes[0, 0].set_title('1. Equity Curve (Log Scale)')
+            axes[0, 0].legend()
+            axes[0, 0].grid(True, which='both', alpha=0.3)
+
+            for change in position_changes:
+                c_date = change['Date']
+                if c_date in res_df.index:
+                    c_price = res_df.loc[c_date, 'Equity']
+                    axes[0, 0].annotate('', xy=(c_date, c_price), xytext=(c_date, c_price * 1.15),
+                                        arrowprops=dict(facecolor='black', shrink=0.05, width=1, headwidth=5))
+
+            # 2. MDD
+            axes[0, 1].plot(mdd.index, mdd, label='Drawdown', color='blue')
+            axes[0, 1].fill_between(mdd.index, mdd, 0, color='blue', alpha=0.1)
+            axes[0, 1].set_title('2. Drawdown (%)')
+            axes[0, 1].grid(True, alpha=0.3)
+
+            # 3. Market Trend
+            axes[1, 0].plot(trend.index, trend['Price'], label=f'{ticker_risky_base} Price', color='black', alpha=0.6)
+            axes[1, 0].plot(trend.index, trend['MA'], label=f'MA ({ma_window})', color='orange', linestyle='--')
+            axes[1, 0].set_title(f'3. Market Trend ({ticker_risky_base} vs MA)')
+            axes[1, 0].legend()
+            axes[1, 0].grid(True, alpha=0.3)
+
+            # 4. Canary
+            axes[1, 1].plot(canary.index, canary, color='purple', label=f'{ticker_canary} Momentum')
+            axes[1, 1].axhline(0, color='red', linestyle='--')
+            axes[1, 1].fill_between(canary.index, canary, 0, where=(canary < 0), color='red', alpha=0.2)
+            axes[1, 1].set_title(f'4. Risk Signal ({ticker_canary})')
+            axes[1, 1].grid(True, alpha=0.3)
+
+            plt.tight_layout()
+            return fig
+
+        charting.show_figure(
+            'haa_custom',
+            {'risky': ticker_risky_base, 'canary': ticker_canary, 'ma': ma_window},
+            (res_df, [c['Date'] for c in position_changes]), draw_charts,
+        )
 
         # 엑셀 다운로드 로직
-        m_equity = res_df['Equity'].resample('M').last()
-        m_ret = m_equity.pct_change().fillna(0)
-        monthly_df = pd.DataFrame(m_ret)
-        monthly_df['Year'] = monthly_df.index.year
-        monthly_df['Month'] = monthly_df.index.month
-        monthly_pivot = monthly_df.pivot(index='Year', columns='Month', values='Equity')
-        monthly_pivot.columns = [calendar.month_abbr[i] for i in monthly_pivot.columns]
-        
-        yearly_ret_list = []
-        for y in monthly_pivot.index:
-            yr_data = res_df[res_df.index.year == y]['Equity']
-            if len(yr_data) > 0:
-                start_val = yr_data.iloc[0]
-                prev_year_data = res_df[res_df.index.year == (y - 1)]['Equity']
-                if not prev_year_data.empty:
-                    start_val = prev_year_data.iloc[-1]
-                end_val = yr_data.iloc[-1]
-                yearly_ret_list.append((end_val / start_val) - 1)
-            else:
-                yearly_ret_list.append(0)
-        
-        monthly_pivot['Year_Total'] = yearly_ret_list
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            res_df.to_excel(writer, sheet_name='Daily_Data')
-            pd.DataFrame(trade_logs).to_excel(writer, sheet_name='Trade_Log', index=False)
-            monthly_pivot.to_excel(writer, sheet_name='Monthly_Returns')
-            workbook = writer.book
-            worksheet_m = writer.sheets['Monthly_Returns']
-            pct_fmt = workbook.add_format({'num_format': '0.00%'})
-            worksheet_m.set_column(1, 13, 10, pct_fmt)
-
-        st.download_button(
+        equity_ret = res_df['Equity'].pct_change().fillna(0)
+        monthly_pivot = calendar_returns.monthly_table(equity_ret, month_names=calendar_returns.MONTHS_EN)
+
+        export.download_buttons(
             "📥 분석 리포트 다운로드 (Excel)",
-            data=output.getvalue(),
-            file_name=f"HAA_Action_Plan_{res_index[-1].date()}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            f"HAA_Action_Plan_{res_index[-1].date()}.xlsx",
+            {'Daily_Data': res_df, 'Trade_Log': pd.DataFrame(trade_logs), 'Monthly_Returns': monthly_pivot},
+            daily_sheet='Daily_Data',
+            no_index=('Trade_Log',),
+            formats={'Monthly_Returns': [('B:N', 10, '0.00%')]},
+            key='p7_export',
         )
\ No newline at end of file
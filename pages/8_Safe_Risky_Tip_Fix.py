@@ -2,9 +2,16 @@ import streamlit as st
 import yfinance as yf
 import pandas as pd
 import matplotlib.pyplot as plt
-import io
 import warnings
-import calendar
+import result_cache
+import tax
+import metrics
+import calendar_returns
+import export
+import charting
+import drawdown
+import rolling_metrics
+import range_index
 
 # -----------------------------------------------------------------------------
 # 1. 기본 설정 (Basic Setup)
@@ -110,6 +117,7 @@ with st.sidebar:
     apply_tax = st.checkbox("양도세(22%) 적용", value=True)
     start_date = st.date_input("시작일", pd.to_datetime("2016-01-01"))
     ma_window = st.number_input("이평선 (일)", value=120)
+    interactive_charts = st.checkbox("🔍 인터랙티브 차트", value=False, help="확대/이동이 되는 차트를 추가로 표시합니다. 위쪽 차트에서 구간을 드래그하면 그 구간을 더 촘촘하게 보여줍니다.")
 
 # -----------------------------------------------------------------------------
 # 4. 데이터 로딩
@@ -120,20 +128,18 @@ with st.spinner("데이터 준비 중..."):
 # -----------------------------------------------------------------------------
 # 5. 메인 로직
 # -----------------------------------------------------------------------------
-if st.button("🚀 시뮬레이션 실행", type="primary", use_container_width=True):
-    
-    # 데이터 준비
-    needed_tickers = list(set([ticker_risky_base, ticker_risky_lev, ticker_safe_cash, ticker_safe_bond, ticker_canary]))
-    df_price_all = full_df[needed_tickers].fillna(method='ffill')
-    
-    # 스코어 계산
-    def get_score(series):
-        r1 = series.pct_change(21)
-        r3 = series.pct_change(63)
-        r6 = series.pct_change(126)
-        r12 = series.pct_change(252)
-        return (r1 * 12) + (r3 * 4) + (r6 * 2) + (r12 * 1)
+def get_score(series):
+    r1 = series.pct_change(21)
+    r3 = series.pct_change(63)
+    r6 = series.pct_change(126)
+    r12 = series.pct_change(252)
+    return (r1 * 12) + (r3 * 4) + (r6 * 2) + (r12 * 1)
 
+def run_haa(df_price_all, ticker_risky_base, ticker_risky_lev, ticker_safe_cash, ticker_safe_bond,
+            ticker_canary, w_base, w_lev, w_def_atk, w_def_safe, initial_capital, commission_rate,
+            apply_tax, start_date, ma_window, on_progress=None):
+    """HAA 백테스트 루프 (결과는 캐시 가능한 dict로 반환)"""
+    # 스코어 계산
     score_df = pd.DataFrame(index=df_price_all.index)
     for t in [ticker_canary, ticker_risky_base, ticker_safe_cash, ticker_safe_bond]:
         score_df[f'{t}_Score'] = get_score(df_price_all[t])
@@ -159,23 +165,24 @@ if st.button("🚀 시뮬레이션 실행", type="primary", use_container_width=
     position_changes = []
     current_weights = {ticker_safe_cash: 1.0}
     prev_mode_desc = "Init"
-    year_realized_gain = 0
+    tax_engine = tax.TaxEngine()
     
     # 벤치마크 (공격 1 자산)
     bench_capital = initial_capital
     bench_equity = []
-    bench_year_start = initial_capital
+    bench_tax = tax.TaxEngine()
 
-    progress_bar = st.progress(0)
-    
     for i in range(len(dates)):
-        if i % 100 == 0: progress_bar.progress(i / len(dates))
+        if on_progress and i % 100 == 0: on_progress(i / len(dates))
         today = dates[i]
         
         if i == 0:
             equity_curve.append(current_capital)
             weights_history.append(current_weights)
             bench_equity.append(bench_capital)
+            # 시작일 종가로 최초 매수
+            tax_engine.rebalance(today, df_price.iloc[0], {t: current_capital * w for t, w in current_weights.items()})
+            bench_tax.rebalance(today, df_price.iloc[0], {ticker_risky_base: bench_capital})
             continue
             
         prev_date = dates[i-1]
@@ -234,6 +241,9 @@ if st.button("🚀 시뮬레이션 실행", type="primary", use_container_width=
             fee = (turnover / 2) * current_capital * commission_rate
             current_capital -= fee
             current_weights = target.copy()
+            # 전일 종가로 매매 (lot 기록)
+            tax_engine.rebalance(prev_date, df_price.iloc[i-1],
+                                 {t: current_capital * w for t, w in current_weights.items()})
             
             if fee > 10:
                 trade_logs.append({
@@ -270,24 +280,65 @@ if st.button("🚀 시뮬레이션 실행", type="primary", use_container_width=
         bench_capital = bench_capital * (1 + r_bench)
         bench_equity.append(bench_capital)
 
-        # --- [5] 세금 (연말) ---
-        year_realized_gain += (current_capital - (equity_curve[-2] if len(equity_curve)>1 else initial_capital))
-        
+        # --- [5] 세금 (연초, 전년도 실현 손익 FIFO 기준) ---
         if apply_tax and (today.year != prev_date.year):
             # 전략 세금
-            tax = max(0, year_realized_gain - 2500000) * 0.22
-            if tax > 0: 
-                current_capital -= tax
-                trade_logs.append({"Date": today.strftime('%Y-%m-%d'), "Desc": "Tax", "Amount": -round(tax), "Fee": 0})
-            year_realized_gain = 0
+            tax_amount = tax_engine.tax_for(prev_date.year)
+            if tax_amount > 0: 
+                current_capital -= tax_amount
+                tax_engine.rebalance(today, df_price.iloc[i],
+                                     {t: current_capital * w for t, w in current_weights.items()})
+                trade_logs.append({"Date": today.strftime('%Y-%m-%d'), "Desc": "Tax", "Amount": -round(tax_amount), "Fee": 0})
             
-            # 벤치마크 세금
-            b_gain = bench_capital - bench_year_start
-            tax_b = max(0, b_gain - 2500000) * 0.22
-            if tax_b > 0: bench_capital -= tax_b
-            bench_year_start = bench_capital
+            # 벤치마크 세금 (보유만 하므로 세금 납부용 매도분만 과세)
+            tax_b = bench_tax.tax_for(prev_date.year)
+            if tax_b > 0:
+                bench_capital -= tax_b
+                bench_tax.rebalance(today, df_price.iloc[i], {ticker_risky_base: bench_capital})
+
+    return {
+        'score_df': score_df, 'ma_line': ma_line, 'df_price': df_price, 'dates': dates,
+        'equity_curve': equity_curve, 'bench_equity': bench_equity,
+        'weights_history': weights_history, 'trade_logs': trade_logs,
+        'position_changes': position_changes, 'tax_table': tax_engine.yearly_frame(),
+    }
+
+# 계산은 버튼을 눌렀을 때만 하고, 결과는 설정과 함께 session_state에 보관합니다.
+# (표시용 위젯을 바꿔도 재계산하지 않고, 전략 설정이 바뀌면 다시 실행하라고 안내)
+run_btn = st.button("🚀 시뮬레이션 실행", type="primary", use_container_width=True)
+
+params = dict(
+    ticker_risky_base=ticker_risky_base, ticker_risky_lev=ticker_risky_lev,
+    ticker_safe_cash=ticker_safe_cash, ticker_safe_bond=ticker_safe_bond, ticker_canary=ticker_canary,
+    w_base=w_base, w_lev=w_lev, w_def_atk=w_def_atk, w_def_safe=w_def_safe,
+    initial_capital=initial_capital, commission_rate=commission_rate, apply_tax=apply_tax,
+    start_date=start_date, ma_window=ma_window
+)
+run_key = tuple(sorted(params.items()))
+
+if run_btn:
+    # 데이터 준비
+    needed_tickers = sorted(set([ticker_risky_base, ticker_risky_lev, ticker_safe_cash, ticker_safe_bond, ticker_canary]))
+    df_price_all = full_df[needed_tickers].ffill()
 
+    progress_bar = st.progress(0)
+    res, hit, elapsed = result_cache.cached_run(
+        'haa_custom_fifo', params, result_cache.data_version(df_price_all),
+        lambda: run_haa(df_price_all, on_progress=progress_bar.progress, **params)
+    )
     progress_bar.progress(1.0)
+    st.session_state['p8_result'] = (run_key, res, hit, elapsed)
+
+last_run = st.session_state.get('p8_result')
+if last_run is not None and last_run[0] != run_key:
+    st.info("⚙️ 설정이 바뀌었습니다. '🚀 시뮬레이션 실행'을 눌러 다시 계산하세요.")
+elif last_run is not None:
+    _, res, hit, elapsed = last_run
+    result_cache.cache_badge(hit, elapsed)
+
+    score_df, ma_line, df_price, dates = res['score_df'], res['ma_line'], res['df_price'], res['dates']
+    equity_curve, bench_equity = res['equity_curve'], res['bench_equity']
+    trade_logs = res['trade_logs']
 
     # -------------------------------------------------------------------------
     # 6. Action Plan (오늘 해야 할 일) - 최상단 배치
@@ -365,87 +416,93 @@ if st.button("🚀 시뮬레이션 실행", type="primary", use_container_width=
     # 성과 요약
     final = equity_curve[-1]
     final_b = bench_equity[-1]
-    cagr = (final/initial_capital)**(1/(len(res_df)/252))-1
-    cagr_b = (final_b/initial_capital)**(1/(len(res_df)/252))-1
-    
-    peak = res_df['Equity'].cummax()
-    mdd = ((res_df['Equity'] - peak) / peak).min()
-    
-    peak_b = res_df['Bench_Equity'].cummax()
-    mdd_b = ((res_df['Bench_Equity'] - peak_b) / peak_b).min()
+    stats = metrics.from_equity(res_df['Equity'], initial=initial_capital)
+    stats_b = metrics.from_equity(res_df['Bench_Equity'], initial=initial_capital)
+    cagr, mdd = stats.cagr, stats.mdd
+    cagr_b, mdd_b = stats_b.cagr, stats_b.mdd
 
     st.subheader(f"📊 성과 요약 (vs {ticker_risky_base})")
     m1, m2, m3 = st.columns(3)
     m1.metric("최종 자산", f"{final:,.0f} 원", delta=f"vs Bench: {final - final_b:,.0f}")
     m2.metric("CAGR", f"{cagr*100:.2f} %", delta=f"{(cagr-cagr_b)*100:.2f}%p")
     m3.metric("MDD", f"{mdd*100:.2f} %", delta=f"Bench MDD: {mdd_b*100:.2f}%")
+    metrics.show_stats({'Strategy': stats, ticker_risky_base: stats_b})
+    drawdown.show_episodes({'Strategy': res_df['Equity'], ticker_risky_base: res_df['Bench_Equity']})
+    rolling_metrics.show_rolling({'Strategy': res_df['Equity'], ticker_risky_base: res_df['Bench_Equity']})
+    range_index.show_range_metrics({'Strategy': res_df['Equity'], ticker_risky_base: res_df['Bench_Equity']}, key='p8_range')
+    if apply_tax:
+        tax.show_tax_table(res['tax_table'])
 
     # --- 차트 4종 세트 ---
     st.subheader("📈 상세 분석")
-    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-    
-    # 1. Equity
-    axes[0, 0].plot(res_df.index, res_df['Equity'], color='firebrick', label='My Strategy')
-    axes[0, 0].plot(res_df.index, res_df['Bench_Equity'], color='gray', linestyle='--', alpha=0.6, label=f'{ticker_risky_base}')
-    axes[0, 0].set_yscale('log'); axes[0, 0].set_title(f'1. Equity Curve (vs {ticker_risky_base})')
-    axes[0, 0].legend()
-    axes[0, 0].grid(True, which='both', alpha=0.3)
-    
-    # 2. Drawdown (Comparison)
-    dd = (res_df['Equity'] - peak) / peak
-    dd_b = (res_df['Bench_Equity'] - peak_b) / peak_b
-    axes[0, 1].plot(res_df.index, dd * 100, color='blue', label='Strategy MDD')
-    axes[0, 1].plot(res_df.index, dd_b * 100, color='gray', linestyle=':', alpha=0.5, label=f'{ticker_risky_base} MDD')
-    axes[0, 1].fill_between(res_df.index, dd * 100, 0, color='blue', alpha=0.1)
-    axes[0, 1].set_title('2. Drawdown Comparison (%)')
-    axes[0, 1].legend()
-    axes[0, 1].grid(True, alpha=0.3)
-    
-    # 3. Market Trend
-    axes[1, 0].plot(res_df.index, res_df['Price'], color='black', alpha=0.6, label='Price')
-    axes[1, 0].plot(res_df.index, res_df['MA'], color='orange', linestyle='--', label='MA')
-    axes[1, 0].set_title(f'3. Market Trend ({ticker_risky_base})')
-    axes[1, 0].legend()
-    axes[1, 0].grid(True, alpha=0.3)
-    
-    # 4. Canary
-    axes[1, 1].plot(res_df.index, res_df['Canary_Score'], color='purple')
-    axes[1, 1].axhline(0, color='red', linestyle='--')
-    axes[1, 1].fill_between(res_df.index, res_df['Canary_Score'], 0, where=(res_df['Canary_Score'] < 0), color='red', alpha=0.2)
-    axes[1, 1].set_title(f'4. Risk Signal ({ticker_canary})')
-    axes[1, 1].grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    st.pyplot(fig)
+    def draw_charts():
+        # 패널별로 점 개수를 줄여서 그립니다 (낙폭/카나리아는 바닥 보존)
+        equity = charting.decimate_frame(res_df[['Equity', 'Bench_Equity']])
+        dd = charting.decimate_frame(
+            pd.DataFrame({'dd': metrics.drawdown(res_df['Equity']) * 100,
+                          'dd_b': metrics.drawdown(res_df['Bench_Equity']) * 100}),
+            minmax=('dd', 'dd_b'))
+        trend = charting.decimate_frame(res_df[['Price', 'MA']])
+        canary = charting.decimate(res_df['Canary_Score'], method='minmax')
+
+        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+
+        # 1. Equity
+        axes[0, 0].plot(equity.index, equity['Equity'], color='firebrick', label='My Strategy')
+        axes[0, 0].plot(equity.index, equity['Bench_Equity'], color='gray', linestyle='--', alpha=0.6, label=f'{ticker_risky_base}')
+        axes[0, 0].set_yscale('log'); axes[0, 0].set_title(f'1. Equity Curve (vs {ticker_risky_base})')
+        axes[0, 0].legend()
+        axes[0, 0].grid(True, which='both', alpha=0.3)
+
+        # 2. Drawdown (Comparison)
+        axes[0, 1].plot(dd.index, dd['dd'], color='blue', label='Strategy MDD')
+        axes[0, 1].plot(dd.index, dd['dd_b'], color='gray', linestyle=':', alpha=0.5, label=f'{ticker_risky_base} MDD')
+        axes[0, 1].fill_between(dd.index, dd['dd'], 0, color='blue', alpha=0.1)
+        axes[0, 1].set_title('2. Drawdown Comparison (%)')
+        axes[0, 1].legend()
+        axes[0, 1].grid(True, alpha=0.3)
+
+        # 3. Market Trend
+        axes[1, 0].plot(trend.index, trend['Price'], color='black', alpha=0.6, label='Price')
+        axes[1, 0].plot(trend.index, trend['MA'], color='orange', linestyle='--', label='MA')
+        axes[1, 0].set_title(f'3. Market Trend ({ticker_risky_base})')
+        axes[1, 0].legend()
+        axes[1, 0].grid(True, alpha=0.3)
+
+        # 4. Canary
+        axes[1, 1].plot(canary.index, canary, color='purple')
+        axes[1, 1].axhline(0, color='red', linestyle='--')
+        axes[1, 1].fill_between(canary.index, canary, 0, where=(canary < 0), color='red', alpha=0.2)
+        axes[1, 1].set_title(f'4. Risk Signal ({ticker_canary})')
+        axes[1, 1].grid(True, alpha=0.3)
+
+        plt.tight_layout()
+        return fig
+
+    # 같은 결과/설정이면 저장된 이미지를 다시 씁니다 (다운로드 버튼 등으로 재실행될 때)
+    charting.show_figure('haa_final', {'risky': ticker_risky_base, 'canary': ticker_canary}, res_df, draw_charts)
+
+    if interactive_charts:
+        st.markdown("#### 🔍 인터랙티브 차트")
+        charting.show_interactive(
+            res_df[['Equity', 'Bench_Equity']].rename(columns={'Equity': 'Strategy', 'Bench_Equity': ticker_risky_base}),
+            key='p8_equity_chart', log=True, title="자산 곡선 (드래그하여 구간 확대)")
+        dd_frame = pd.DataFrame({'Strategy': metrics.drawdown(res_df['Equity']) * 100,
+                                 ticker_risky_base: metrics.drawdown(res_df['Bench_Equity']) * 100})
+        charting.show_interactive(dd_frame, key='p8_dd_chart', minmax=tuple(dd_frame.columns), title="Drawdown (%)")
     
     # --- 엑셀 생성 (3개 시트) ---
-    m_eq = res_df['Equity'].resample('M').last()
-    m_ret = m_eq.pct_change().fillna(0)
-    m_df = pd.DataFrame(m_ret)
-    m_df['Year'] = m_df.index.year
-    m_df['Month'] = m_df.index.month
-    m_pivot = m_df.pivot(index='Year', columns='Month', values='Equity')
-    m_pivot.columns = [calendar.month_abbr[i] for i in m_pivot.columns]
-    
-    yearly_ret = []
-    for y in m_pivot.index:
-        yd = res_df[res_df.index.year == y]['Equity']
-        if len(yd) > 0:
-            start_v = res_df[res_df.index.year == (y-1)]['Equity'].iloc[-1] if y > res_df.index.year.min() else yd.iloc[0]
-            yearly_ret.append((yd.iloc[-1]/start_v) - 1)
-        else:
-            yearly_ret.append(0)
-    m_pivot['Total'] = yearly_ret
-
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        res_df.to_excel(writer, sheet_name='Daily_Data')
-        pd.DataFrame(trade_logs).to_excel(writer, sheet_name='Trade_Log', index=False)
-        m_pivot.to_excel(writer, sheet_name='Monthly_Returns')
-        
-        wb = writer.book
-        ws = writer.sheets['Monthly_Returns']
-        fmt = wb.add_format({'num_format': '0.00%'})
-        ws.set_column(1, 13, 10, fmt)
+    # 전략/벤치마크 월별 표를 한 번에 계산
+    eq_ret = res_df[['Equity', 'Bench_Equity']].pct_change().fillna(0)
+    m_tables = calendar_returns.monthly_table(eq_ret, month_names=calendar_returns.MONTHS_EN, total='Total')
+    m_pivot = m_tables['Equity']
+    m_pivot['Bench_Total'] = m_tables['Bench_Equity']['Total']
 
-    st.download_button("📥 통합 리포트 다운로드 (Excel)", output.getvalue(), "HAA_Final_Report.xlsx")
\ No newline at end of file
+    export.download_buttons(
+        "📥 통합 리포트 다운로드 (Excel)", "HAA_Final_Report.xlsx",
+        {'Daily_Data': res_df, 'Trade_Log': pd.DataFrame(trade_logs), 'Monthly_Returns': m_pivot},
+        daily_sheet='Daily_Data',
+        no_index=('Trade_Log',),
+        formats={'Monthly_Returns': [('B:O', 10, '0.00%')]},
+        key='p8_export',
+    )
\ No newline at end of file
@@ -2,9 +2,13 @@ import streamlit as st
 import yfinance as yf
 import pandas as pd
 import matplotlib.pyplot as plt
-import io
 import warnings
 import calendar
+import tax
+import metrics
+import export
+import drawdown
+import rolling_metrics
 
 # -----------------------------------------------------------------------------
 # 1. 기본 설정
@@ -117,7 +121,7 @@ if st.button("🚀 실행 (Run)", type="primary", use_container_width=True):
     missing = [t for t in use_tickers if t not in full_df.columns]
     # KOFR 등 신규 상장 종목은 데이터가 짧을 수 있음 -> fillna(0) 처리 보단 상장일 이후부터
     
-    df_raw = full_df[use_tickers].fillna(method='ffill')
+    df_raw = full_df[use_tickers].ffill()
     
     # 사용자 시작일 처리
     if pd.to_datetime(start_date) < df_raw.index[0]:
@@ -150,8 +154,8 @@ if st.button("🚀 실행 (Run)", type="primary", use_container_width=True):
     curr_w = {ticker_def: 1.0}
     prev_state = "Init"
     
-    # 연말 정산용
-    year_gain = 0
+    # 연말 정산용 (매도 lot의 실현 손익, 공제 없음)
+    tax_engine = tax.TaxEngine(deduction=0, rate=tax_rate)
     
     for i in range(len(dates)):
         today = dates[i]
@@ -159,6 +163,7 @@ if st.button("🚀 실행 (Run)", type="primary", use_container_width=True):
         if i == 0:
             curve.append(equity)
             pos_history.append(curr_w)
+            tax_engine.rebalance(today, df_price.iloc[0], {t: equity * w for t, w in curr_w.items()})
             continue
             
         # 신호 확인 (어제 종가 기준)
@@ -201,6 +206,7 @@ if st.button("🚀 실행 (Run)", type="primary", use_container_width=True):
             cost = (turnover / 2) * equity * fee_rate
             equity -= cost
             curr_w = target_w.copy()
+            tax_engine.rebalance(dates[i-1], df_price.iloc[i-1], {t: equity * w for t, w in curr_w.items()})
             
             if cost > 0:
                 logs.append({"Date": today.date(), "Action": "Rebal", "State": state, "Cost": round(cost)})
@@ -214,18 +220,25 @@ if st.button("🚀 실행 (Run)", type="primary", use_container_width=True):
             
         profit = equity * day_ret
         equity += profit
-        year_gain += profit
+        
+        # 세금 (옵션) - 새해 첫 거래일에 전년도 실현 손익으로 정산
+        # (전일 종가로 기록한 연초 리밸런싱까지 전년도에 들어간 뒤 계산하고,
+        #  세금 낼 돈을 마련하는 매도는 오늘 날짜로 기록 -> 그 손익은 다음 해에 과세)
+        if tax_rate > 0 and today.year != dates[i-1].year:
+            tax_amount = tax_engine.tax_for(dates[i-1].year)
+            if tax_amount > 0:
+                equity -= tax_amount
+                tax_engine.rebalance(today, df_price.iloc[i], {t: equity * w for t, w in curr_w.items()})
+                logs.append({"Date": today.date(), "Action": "Tax", "State": "-", "Cost": round(tax_amount)})
+        # 마지막 해는 기간 끝에서 정산 (이후 매매가 없으므로 매도 기록은 생략)
+        if tax_rate > 0 and i == len(dates)-1 and today.year == dates[i-1].year:
+            tax_amount = tax_engine.tax_for(today.year)
+            if tax_amount > 0:
+                equity -= tax_amount
+                logs.append({"Date": today.date(), "Action": "Tax", "State": "-", "Cost": round(tax_amount)})
         
         curve.append(equity)
         pos_history.append(curr_w)
-        
-        # 세금 (옵션) - 매년 말
-        if tax_rate > 0 and (i == len(dates)-1 or dates[i+1].year != today.year):
-            tax = max(0, year_gain) * tax_rate
-            if tax > 0:
-                equity -= tax
-                logs.append({"Date": today.date(), "Action": "Tax", "State": "-", "Cost": round(tax)})
-            year_gain = 0
 
     # 결과 정리
     res_df = pd.DataFrame({'Equity': curve}, index=dates)
@@ -234,9 +247,9 @@ if st.button("🚀 실행 (Run)", type="primary", use_container_width=True):
     
     # --- UI 리포트 ---
     final = curve[-1]
-    cagr = (final/initial_capital)**(1/(len(curve)/252)) - 1
-    dd = (res_df['Equity'] - res_df['Equity'].cummax()) / res_df['Equity'].cummax()
-    mdd = dd.min()
+    stats = metrics.from_equity(res_df['Equity'], initial=initial_capital)
+    dd = metrics.drawdown(res_df['Equity'])
+    cagr, mdd = stats.cagr, stats.mdd
     
     st.divider()
     
@@ -248,6 +261,12 @@ if st.button("🚀 실행 (Run)", type="primary", use_container_width=True):
     c1.metric("최종 자산", f"{final:,.0f} 원")
     c1.metric("CAGR", f"{cagr*100:.2f} %")
     c1.metric("MDD", f"{mdd*100:.2f} %")
+    with c1:
+        metrics.show_stats(stats)
+        drawdown.show_episodes({'Strategy': res_df['Equity']})
+        rolling_metrics.show_rolling({'Strategy': res_df['Equity']})
+    if tax_rate > 0:
+        tax.show_tax_table(tax_engine.yearly_frame())
     
     c2.markdown(f"### 📢 현재 포지션: **[{tgt_txt}]**")
     if "069500" in str(last_w) or "122630" in str(last_w):
@@ -277,8 +296,10 @@ if st.button("🚀 실행 (Run)", type="primary", use_container_width=True):
     st.pyplot(fig)
     
     # 엑셀 다운로드
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        res_df.to_excel(writer, sheet_name='Daily')
-        pd.DataFrame(logs).to_excel(writer, sheet_name='Logs', index=False)
-    st.download_button("📥 엑셀 다운로드", output.getvalue(), "K_Momentum.xlsx")
\ No newline at end of file
+    export.download_buttons(
+        "📥 엑셀 다운로드", "K_Momentum.xlsx",
+        {'Daily': res_df, 'Logs': pd.DataFrame(logs)},
+        daily_sheet='Daily',
+        no_index=('Logs',),
+        key='p9_export',
+    )
\ No newline at end of file
@@ -0,0 +1,151 @@
+import os
+import pickle
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 로컬 가격 저장소 (종목별 파일)
+# -----------------------------------------------------------------------------
+# KRX 전체(2,500+ 종목)를 한 DataFrame에 올리면 Streamlit 프로세스 메모리가 부족합니다.
+# 종목마다 파일 하나(Close/Volume)로 디스크에 저장해 두고, 필요한 종목 묶음(chunk)만
+# 읽어서 쓰는 방식입니다. 이미 받은 종목은 마지막 날짜부터 다시 받아 이어 붙입니다.
+# (마지막 봉은 장중 잠정값이거나 나중에 수정될 수 있으므로 항상 한 번 더 받아서 덮어씀)
+
+STORE_DIR = os.environ.get(
+    "PRICE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "prices"),
+)
+FIELDS = ['Close', 'Volume']
+
+
+class PriceStore:
+    """종목별 가격 파일 저장소"""
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, ticker):
+        safe = str(ticker).replace('/', '_').replace(':', '_')
+        return os.path.join(self.directory, f"{safe}.pkl")
+
+    def has(self, ticker):
+        return os.path.exists(self._path(ticker))
+
+    def load(self, ticker):
+        """저장된 가격 (없으면 빈 DataFrame)"""
+        try:
+            with open(self._path(ticker), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return pd.DataFrame(columns=FIELDS)
+
+    def save(self, ticker, df):
+        path = self._path(ticker)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        out = df[[c for c in FIELDS if c in df.columns]]
+        out.attrs = dict(df.attrs)
+        with open(tmp, "wb") as f:
+            pickle.dump(out, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def update(self, ticker, reader, start, latest=None):
+        """
+        reader(ticker, start)로 새 데이터만 받아 이어 붙입니다.
+        - 이미 받아 둔 범위(attrs['start'])보다 이른 start를 요청하면 start부터 다시 받습니다. (앞쪽 채우기)
+          첫 봉 날짜가 아니라 요청했던 start를 기억하므로, 주말/상장일 때문에 매번 다시 받지는 않습니다.
+        - 그 외에는 저장된 마지막 봉부터 받아서 겹치는 날짜는 새 값으로 덮어씁니다.
+        - latest(마지막 거래일)를 주면, 저장된 마지막 봉이 그날 이후인 종목은 받지 않습니다. (네트워크 없음)
+        반환: 저장 후 행 개수
+        """
+        old = self.load(ticker)
+        fetch_from = pd.Timestamp(start)
+        covered = None
+        if not old.empty:
+            covered = pd.Timestamp(old.attrs.get('start', old.index[0]))
+            if fetch_from >= covered:
+                if latest is not None and old.index[-1] >= pd.Timestamp(latest):
+                    return len(old)
+                fetch_from = old.index[-1]
+
+        new = reader(ticker, fetch_from)
+        if new is None or len(new) == 0:
+            return len(old)
+
+        merged = pd.concat([old, new]) if not old.empty else new
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        merged.attrs['start'] = fetch_from if covered is None else min(fetch_from, covered)
+        self.save(ticker, merged)
+        return len(merged)
+
+    def sync(self, tickers, reader, start, on_progress=None, latest=None):
+        """여러 종목을 저장소에 채웁니다. 실패한 종목은 건너뜁니다. (latest: update와 같음)"""
+        ok = []
+        for i, ticker in enumerate(tickers):
+            if on_progress:
+                on_progress(i, len(tickers), ticker)
+            try:
+                if self.update(ticker, reader, start, latest) > 0:
+                    ok.append(ticker)
+            except Exception:
+                continue
+        return ok
+
+    def panel(self, tickers, field='Close', start=None, dtype=np.float64):
+        """여러 종목의 한 필드를 (날짜 x 종목) DataFrame으로 읽습니다."""
+        cols = []
+        for t in tickers:
+            df = self.load(t)
+            if df.empty or field not in df.columns:
+                continue
+            s = df[field]
+            if start is not None:
+                s = s.loc[pd.Timestamp(start):]
+            cols.append(s.astype(dtype).rename(t))
+        if not cols:
+            return pd.DataFrame()
+        return pd.concat(cols, axis=1).sort_index()
+
+    def iter_chunks(self, tickers, chunk_size, field='Close', start=None, dtype=np.float64):
+        """chunk_size 종목씩 패널을 만들어 돌려줍니다. (한 번에 한 묶음만 메모리에)"""
+        tickers = list(tickers)
+        for i in range(0, len(tickers), chunk_size):
+            chunk = self.panel(tickers[i:i + chunk_size], field, start, dtype)
+            if not chunk.empty:
+                yield chunk
+
+    def data_version(self, tickers):
+        """종목 파일들의 수정 시각/크기 해시 (결과 캐시 키용)"""
+        h = hashlib.sha1()
+        for t in sorted(map(str, tickers)):
+            try:
+                st_ = os.stat(self._path(t))
+                h.update(f"{t}:{st_.st_mtime_ns}:{st_.st_size};".encode())
+            except OSError:
+                h.update(f"{t}:-;".encode())
+        return h.hexdigest()[:16]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """프로세스 전역 저장소 (모든 세션 공유)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceStore()
+    return _store
+
+
+def fdr_reader(ticker, start):
+    """FinanceDataReader 일봉 (Close, Volume)"""
+    import FinanceDataReader as fdr
+
+    df = fdr.DataReader(ticker, start)
+    return df[[c for c in FIELDS if c in df.columns]]
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+from metrics import PERIODS_PER_YEAR
+
+# -----------------------------------------------------------------------------
+# 구간 조회 인덱스 (임의의 날짜 A~B 수익률 / CAGR / MDD)
+# -----------------------------------------------------------------------------
+# 시작일만 바꿔서 시뮬레이션 전체를 다시 돌리지 않고, 이미 계산된 결과에서 부분 구간 지표를 바로 구합니다.
+# - 수익률/CAGR: 로그 수익률 누적합(= 로그 자산) 차이 -> O(1)
+# - 구간 최고/최저: sparse table -> O(1)
+# - 구간 MDD: (최고, 최저, 최악 낙폭) 묶음 segment tree -> O(log T)
+#   (MDD는 고점이 저점보다 앞서야 해서, 겹치는 두 구간을 합치는 sparse table로는 구할 수 없습니다)
+
+
+def _sparse_table(values, op):
+    """table[k][i] = op(values[i : i + 2^k])"""
+    table = [values]
+    step = 1
+    while step * 2 <= len(values):
+        prev = table[-1]
+        table.append(op(prev[:-step], prev[step:]))
+        step *= 2
+    return table
+
+
+class ResultIndex:
+    """자산 곡선 하나에 대한 구간 조회"""
+
+    def __init__(self, equity, periods_per_year=PERIODS_PER_YEAR):
+        equity = equity.dropna()
+        self.index = pd.DatetimeIndex(equity.index)
+        self.periods_per_year = periods_per_year
+
+        # 로그 수익률 누적합 (첫 날 = 0)
+        log_ret = np.diff(np.log(equity.to_numpy(dtype=np.float64)))
+        self._log = np.r_[0.0, np.cumsum(log_ret)]
+
+        self._max = _sparse_table(self._log, np.maximum)
+        self._min = _sparse_table(self._log, np.minimum)
+        self._build_tree()
+
+    def __len__(self):
+        return len(self._log)
+
+    # -------------------------------------------------------------------------
+    # segment tree (배열 기반, 잎 = 날짜)
+    # -------------------------------------------------------------------------
+    def _build_tree(self):
+        n = len(self._log)
+        size = 1
+        while size < n:
+            size *= 2
+        self._size = size
+        hi = np.full(2 * size, -np.inf)
+        lo = np.full(2 * size, np.inf)
+        worst = np.zeros(2 * size)
+        hi[size:size + n] = self._log
+        lo[size:size + n] = self._log
+
+        # 층별로 한 번에 계산 (왼쪽 자식 = 앞 구간)
+        width = size // 2
+        while width >= 1:
+            node = np.arange(width, 2 * width)
+            left, right = 2 * node, 2 * node + 1
+            hi[node] = np.maximum(hi[left], hi[right])
+            lo[node] = np.minimum(lo[left], lo[right])
+            with np.errstate(invalid='ignore'):
+                cross = lo[right] - hi[left]
+            worst[node] = np.fmin(np.minimum(worst[left], worst[right]), cross)
+            width //= 2
+        self._hi, self._lo, self._worst = hi, lo, worst
+
+    @staticmethod
+    def _combine(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return (max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2], b[1] - a[0]))
+
+    def _tree_query(self, i, j):
+        """[i, j] 구간 (최고, 최저, 최악 낙폭) - 로그 기준"""
+        left, right = None, None
+        i += self._size
+        j += self._size + 1
+        while i < j:
+            if i & 1:
+                left = self._combine(left, (self._hi[i], self._lo[i], self._worst[i]))
+                i += 1
+            if j & 1:
+                j -= 1
+                right = self._combine((self._hi[j], self._lo[j], self._worst[j]), right)
+            i //= 2
+            j //= 2
+        return self._combine(left, right)
+
+    # -------------------------------------------------------------------------
+    # 조회
+    # -------------------------------------------------------------------------
+    def locate(self, start=None, end=None):
+        """날짜 -> 위치 (start 이후 첫 거래일, end 이전 마지막 거래일)"""
+        i = 0 if start is None else int(self.index.searchsorted(pd.Timestamp(start), side='left'))
+        j = len(self) - 1 if end is None else int(self.index.searchsorted(pd.Timestamp(end), side='right')) - 1
+        return i, j
+
+    def high_low(self, i, j):
+        """구간 최고/최저 (시작일 대비 배수) - O(1)"""
+        k = (j - i + 1).bit_length() - 1
+        hi = max(self._max[k][i], self._max[k][j - (1 << k) + 1])
+        lo = min(self._min[k][i], self._min[k][j - (1 << k) + 1])
+        return np.exp(hi - self._log[i]), np.exp(lo - self._log[i])
+
+    def query(self, start=None, end=None):
+        """
+        구간 지표
+        반환: dict (start, end, total_return, cagr, mdd, high, low, periods) - 구간이 비면 None
+        """
+        i, j = self.locate(start, end)
+        if i >= j:
+            return None
+        growth = self._log[j] - self._log[i]
+        periods = j - i
+        high, low = self.high_low(i, j)
+        return {
+            'start': self.index[i],
+            'end': self.index[j],
+            'total_return': np.expm1(growth),
+            'cagr': np.expm1(growth * self.periods_per_year / periods),
+            'mdd': np.expm1(self._tree_query(i, j)[2]),
+            'high': high - 1,
+            'low': low - 1,
+            'periods': periods,
+        }
+
+
+def show_range_metrics(curves, key, label="🔎 구간 지표 (다시 계산 없이 바로 조회)"):
+    """
+    결과 위에 날짜 구간 슬라이더를 올리고, 구간 수익률/CAGR/MDD를 바로 보여줍니다.
+    - curves: {이름: 자산 곡선 Series} (전략, 벤치마크 등)
+    슬라이더는 fragment 안에 있어서 움직여도 페이지 전체(시뮬레이션)가 다시 실행되지 않습니다.
+    """
+    import streamlit as st
+
+    indexes = {k: ResultIndex(v) for k, v in curves.items() if v is not None and len(v.dropna()) > 1}
+    if not indexes:
+        return
+    first = min(ix.index[0] for ix in indexes.values()).date()
+    last = max(ix.index[-1] for ix in indexes.values()).date()
+
+    @st.fragment
+    def _panel():
+        st.markdown(f"#### {label}")
+        lo, hi = st.slider("분석 구간", min_value=first, max_value=last, value=(first, last),
+                           format="YYYY-MM-DD", key=key)
+        for name, index in indexes.items():
+            q = index.query(lo, hi)
+            if q is None:
+                st.caption(f"{name}: 구간이 너무 짧습니다.")
+                continue
+            st.markdown(f"**{name}** · {q['start'].date()} ~ {q['end'].date()}")
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("구간 수익률", f"{q['total_return']*100:.2f}%")
+            c2.metric("구간 CAGR", f"{q['cagr']*100:.2f}%")
+            c3.metric("구간 MDD", f"{q['mdd']*100:.2f}%")
+            c4.metric("구간 최고 / 최저", f"{q['high']*100:+.1f}% / {q['low']*100:+.1f}%")
+
+    _panel()
@@ -0,0 +1,138 @@
+import time
+import threading
+
+import kis_client
+
+# -----------------------------------------------------------------------------
+# 계좌 잔고 대조 (전체 거래소 + 연속 조회 + 짧은 캐시)
+# -----------------------------------------------------------------------------
+# 예전 잔고 조회는 NAS 한 곳만, 첫 페이지만 보고, SPY/UPRO만 셌습니다.
+# 그래서 자동매매는 현금을 MANUAL_CASH로 직접 적어 넣어야 했습니다.
+# - 거래소(NAS/NYS/AMS)별 잔고를 동시에 조회하고, 각 거래소는 연속 조회 키(CTX_AREA_FK200/NK200,
+#   응답 헤더 tr_cont=M/F)를 따라 마지막 페이지까지 받습니다.
+# - 주문 가능 외화(inquire-psamount)도 같이 조회합니다.
+# - 결과(snapshot)는 잠깐(SNAPSHOT_TTL초) 캐시해서 주문 수량 계산 / 주문 / 점검이 한 번의 조회를 같이 씁니다.
+#   주문을 넣은 뒤에는 invalidate()로 버립니다.
+
+BALANCE_PATH = "/uapi/overseas-stock/v1/trading/inquire-balance"
+BALANCE_TR_ID = "JTTT3012R"
+PSAMOUNT_PATH = "/uapi/overseas-stock/v1/trading/inquire-psamount"
+PSAMOUNT_TR_ID = "TTTS3007R"
+SNAPSHOT_TTL = 60
+MAX_PAGES = 20
+
+
+class Snapshot:
+    """조회 시점의 보유 종목 + 주문 가능 현금"""
+
+    def __init__(self, positions, cash, errors, fetched_at=None):
+        self.positions = positions      # {종목: {'qty', 'exchange', 'price', 'value'}}
+        self.cash = cash                # 주문 가능 달러 (조회 실패면 None)
+        self.errors = errors            # {거래소 또는 'cash': 오류 메시지}
+        self.fetched_at = fetched_at or time.time()
+
+    @property
+    def complete(self):
+        return not self.errors
+
+    def quantities(self):
+        return {s: p['qty'] for s, p in self.positions.items()}
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+def _positions(client, cano, acnt, exchange):
+    """거래소 하나의 전체 잔고 (연속 조회 끝까지)"""
+    positions = {}
+    fk = nk = ""
+    for page in range(MAX_PAGES):
+        params = {
+            "CANO": cano, "ACNT_PRDT_CD": acnt, "OVRS_EXCG_CD": exchange, "TR_CRCY_CD": "USD",
+            "CTX_AREA_FK200": fk, "CTX_AREA_NK200": nk,
+        }
+        extra = {"tr_cont": "N"} if page else {}
+        res = client.get(BALANCE_PATH, BALANCE_TR_ID, params, **extra)
+        data = res.json()
+        if res.status_code != 200 or data.get("rt_cd") not in (None, "0"):
+            raise kis_client.KisError(f"{exchange} 잔고 조회 실패: {data.get('msg1') or res.status_code}")
+
+        for item in data.get("output1") or []:
+            qty = int(float(item.get("ovrs_cblc_qty") or 0))
+            if qty <= 0:
+                continue
+            symbol = item["ovrs_pdno"]
+            price = float(item.get("now_pric2") or 0)
+            positions[symbol] = {
+                "qty": qty,
+                "exchange": exchange,
+                "price": price,
+                "value": float(item.get("ovrs_stck_evlu_amt") or qty * price),
+            }
+
+        fk, nk = data.get("ctx_area_fk200") or "", (data.get("ctx_area_nk200") or "").strip()
+        if res.headers.get("tr_cont") not in ("M", "F") or not nk:
+            break
+    return positions
+
+
+def fetch_cash(client, cano, acnt):
+    """주문 가능 외화 (달러, 캐시 없이 바로 조회)"""
+    params = {
+        "CANO": cano, "ACNT_PRDT_CD": acnt, "OVRS_EXCG_CD": "NASD",
+        "OVRS_ORD_UNPR": "1", "ITEM_CD": "QQQ",
+    }
+    res = client.get(PSAMOUNT_PATH, PSAMOUNT_TR_ID, params)
+    data = res.json()
+    output = data.get("output") or {}
+    if res.status_code != 200 or data.get("rt_cd") not in (None, "0") or "ord_psbl_frcr_amt" not in output:
+        raise kis_client.KisError(f"주문 가능 금액 조회 실패: {data.get('msg1') or res.status_code}")
+    return float(output["ord_psbl_frcr_amt"])
+
+
+def fetch_snapshot(client, cano, acnt, exchanges=kis_client.EXCHANGES):
+    """거래소별 잔고 + 현금을 동시에 조회 (일부 실패해도 나머지는 채움)"""
+    calls = {exc: (_positions, client, cano, acnt, exc) for exc in exchanges}
+    calls["cash"] = (fetch_cash, client, cano, acnt)
+    results = kis_client.fetch_all(calls)
+
+    positions, errors, cash = {}, {}, None
+    for name, value in results.items():
+        if isinstance(value, Exception):
+            errors[name] = str(value) or type(value).__name__
+        elif name == "cash":
+            cash = value
+        else:
+            positions.update(value)
+    return Snapshot(positions, cash, errors)
+
+
+# -----------------------------------------------------------------------------
+# 짧은 캐시 (프로세스 전역)
+# -----------------------------------------------------------------------------
+_snapshots = {}
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot(client, cano, acnt, ttl=SNAPSHOT_TTL, refresh=False):
+    """
+    ttl초 안에 받은 완전한 스냅샷이 있으면 그대로, 없으면 새로 조회합니다.
+    (일부 조회가 실패한 스냅샷은 캐시하지 않음)
+    """
+    key = (client.url_base, cano, acnt)
+    with _snapshot_lock:
+        cached = _snapshots.get(key)
+        if not refresh and cached is not None and cached.age() < ttl:
+            return cached
+        snapshot = fetch_snapshot(client, cano, acnt)
+        if snapshot.complete:
+            _snapshots[key] = snapshot
+        else:
+            _snapshots.pop(key, None)
+        return snapshot
+
+
+def invalidate():
+    """주문 후 호출 (잔고가 바뀌었으므로 다음 조회는 새로)"""
+    with _snapshot_lock:
+        _snapshots.clear()
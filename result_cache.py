@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 전략 결과 캐시 (디스크 저장 + LRU/용량 기반 정리)
+# -----------------------------------------------------------------------------
+# Streamlit은 위젯을 건드릴 때마다 페이지 스크립트 전체를 다시 실행합니다.
+# 전략 이름 + 파라미터 + 가격 데이터 버전으로 키를 만들어 결과를 저장해 두면,
+# 같은 설정을 다시 실행할 때 계산 없이 바로 결과를 돌려줄 수 있습니다.
+# 캐시는 프로세스 전역 + 디스크에 있으므로 모든 사용자 세션이 공유합니다.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "results")
+MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024
+MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "300"))
+MEMORY_ENTRIES = 16
+
+
+def data_version(df):
+    """가격 데이터프레임의 내용 해시 (데이터가 갱신되면 값이 바뀝니다)"""
+    if df is None or len(df) == 0:
+        return "empty"
+    h = hashlib.sha1()
+    h.update(str(list(df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def make_key(strategy, params, version):
+    """전략 이름 + 파라미터 + 데이터 버전 -> 캐시 키"""
+    payload = json.dumps({"s": strategy, "p": params, "v": version}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """최근 결과는 메모리에, 전체는 디스크에 보관하는 LRU 캐시"""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, max_entries=MAX_ENTRIES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        """없으면 None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path, None)  # 디스크 LRU 순서 갱신
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self._remember(key, value)
+
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._evict()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _evict(self):
+        """오래 안 쓴 파일부터 지워서 개수/용량 한도를 맞춥니다."""
+        try:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".pkl"):
+                    continue
+                st_ = os.stat(os.path.join(self.directory, name))
+                entries.append((st_.st_mtime, st_.st_size, name))
+        except OSError:
+            return
+
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, name = entries.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+            with self._lock:
+                self._memory.pop(name[:-4], None)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, name))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """프로세스 전역 캐시 (모든 세션 공유)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+    return _cache
+
+
+def cached_run(strategy, params, version, fn):
+    """
+    캐시에 결과가 있으면 돌려주고, 없으면 fn()을 실행해 저장합니다.
+    반환: (결과, 캐시 적중 여부, 소요 시간(초))
+    """
+    cache = get_cache()
+    key = make_key(strategy, params, version)
+
+    t0 = time.perf_counter()
+    value = cache.get(key)
+    if value is not None:
+        return value, True, time.perf_counter() - t0
+
+    value = fn()
+    cache.put(key, value)
+    return value, False, time.perf_counter() - t0
+
+
+def cache_badge(hit, elapsed):
+    """캐시 적중 여부 표시"""
+    import streamlit as st
+
+    if hit:
+        st.caption(f"⚡ 캐시된 결과 사용 (재계산 생략, {elapsed*1000:.0f} ms)")
+    else:
+        st.caption(f"🧮 새로 계산함 ({elapsed:.2f} s) - 같은 설정은 다음부터 즉시 표시됩니다.")
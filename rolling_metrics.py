@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+from metrics import PERIODS_PER_YEAR
+
+# -----------------------------------------------------------------------------
+# 롤링 지표 (1/3/5년 CAGR, 변동성, Sharpe, MDD)
+# -----------------------------------------------------------------------------
+# rolling().apply(lambda)는 창마다 파이썬 함수를 다시 부르므로 O(T x 창 길이)입니다.
+# - CAGR/변동성/Sharpe: 로그 수익률, 수익률, 수익률 제곱의 누적합(prefix sum) 차이로 O(T)
+# - MDD: 창 안의 (최고, 최저, 최악 낙폭) 묶음을 두 개의 스택으로 관리하는 큐로 O(T)
+#   (앞 스택은 "자기보다 새로운 원소까지의 최고점"을 들고 있어서, 창에서 빠질 때 다시 계산하지 않습니다)
+
+WINDOWS = {'1Y': 252, '3Y': 756, '5Y': 1260}
+METRICS = ['CAGR', 'Volatility', 'Sharpe', 'MDD']
+
+
+def _prefix(values):
+    out = np.zeros(len(values) + 1)
+    np.cumsum(values, out=out[1:])
+    return out
+
+
+def _combine(a, b):
+    """(최고, 최저, 최악 낙폭) 묶음 결합 - a가 b보다 먼저인 구간 (로그 자산 기준)"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (a[0] if a[0] > b[0] else b[0],
+            a[1] if a[1] < b[1] else b[1],
+            min(a[2], b[2], b[1] - a[0]))
+
+
+def rolling_mdd(log_equity, size):
+    """
+    길이 size 창(자산 곡선 점 기준)의 최대 낙폭을 모든 시점에 대해 계산합니다.
+    log_equity: 로그 자산 배열, 반환: 창이 덜 찬 앞부분은 NaN
+    """
+    values = np.asarray(log_equity, dtype=np.float64).tolist()
+    out = np.full(len(values), np.nan)
+    front = []          # 오래된 원소 스택 (각 원소 = 자신부터 더 새로운 원소까지의 묶음)
+    back = []           # 새 원소 값
+    back_agg = None     # back 전체 묶음
+
+    for t, x in enumerate(values):
+        back.append(x)
+        back_agg = _combine(back_agg, (x, x, 0.0))
+
+        if t >= size:
+            if not front:
+                agg = None
+                for y in reversed(back):
+                    agg = _combine((y, y, 0.0), agg)
+                    front.append(agg)
+                back, back_agg = [], None
+            front.pop()
+
+        if t >= size - 1:
+            out[t] = _combine(front[-1] if front else None, back_agg)[2]
+    return np.expm1(out)
+
+
+def rolling_stats(returns, windows=WINDOWS, periods_per_year=PERIODS_PER_YEAR, risk_free=0.0):
+    """
+    일간 수익률 -> 롤링 지표 표 (컬럼: 'CAGR 1Y', 'Sharpe 3Y', ...)
+    Series면 표 하나, DataFrame이면 {컬럼: 표}
+    """
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+    tables = {}
+    for name in frame.columns:
+        r = frame[name].to_numpy(dtype=np.float64)
+        r = np.where(np.isfinite(r), r, 0.0)
+        n = len(r)
+        p_log, p_sum, p_sq = _prefix(np.log1p(r)), _prefix(r), _prefix(r * r)
+        log_equity = p_log  # 시작점(0) 포함, 길이 n+1
+
+        cols = {}
+        for label, w in windows.items():
+            if w < 2 or n < w:
+                for m in METRICS:
+                    cols[f"{m} {label}"] = np.full(n, np.nan)
+                continue
+            end = np.arange(1, n + 1)
+            start = end - w
+            ok = start >= 0
+            s = np.maximum(start, 0)
+
+            growth = p_log[end] - p_log[s]
+            mean = (p_sum[end] - p_sum[s]) / w
+            var = np.maximum((p_sq[end] - p_sq[s]) - w * mean * mean, 0.0) / (w - 1)
+            std = np.sqrt(var)
+
+            cagr = np.expm1(growth * periods_per_year / w)
+            vol = std * np.sqrt(periods_per_year)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                sharpe = np.where(std > 0, (mean - risk_free / periods_per_year) / std, np.nan) * np.sqrt(periods_per_year)
+
+            cols[f"CAGR {label}"] = np.where(ok, cagr, np.nan)
+            cols[f"Volatility {label}"] = np.where(ok, vol, np.nan)
+            cols[f"Sharpe {label}"] = np.where(ok, sharpe, np.nan)
+            cols[f"MDD {label}"] = rolling_mdd(log_equity, w + 1)[1:]
+
+        tables[name] = pd.DataFrame(cols, index=frame.index)
+
+    if isinstance(returns, pd.Series):
+        return next(iter(tables.values()))
+    return tables
+
+
+def show_rolling(curves, windows=WINDOWS):
+    """
+    롤링 지표 차트 (지표별 탭, 전략 x 기간별 선)
+    - curves: {이름: 자산 곡선 Series}
+    """
+    import streamlit as st
+    import charting
+
+    curves = {k: v.dropna() for k, v in curves.items() if v is not None and len(v.dropna()) > 0}
+    if not curves:
+        return
+    longest = max(len(v) for v in curves.values())
+    windows = {k: w for k, w in windows.items() if w < longest}
+    if not windows:
+        return
+
+    tables = {name: rolling_stats(curve.pct_change().fillna(0), windows) for name, curve in curves.items()}
+    with st.expander("📈 롤링 지표 (1/3/5년)", expanded=False):
+        tabs = st.tabs(METRICS)
+        for tab, metric in zip(tabs, METRICS):
+            frame = pd.DataFrame({
+                f"{name} {label}": table[f"{metric} {label}"]
+                for name, table in tables.items() for label in windows
+            }).dropna(how='all')
+            with tab:
+                if frame.empty:
+                    st.caption("기간이 짧아 계산할 수 없습니다.")
+                    continue
+                minmax = tuple(frame.columns) if metric == 'MDD' else ()
+                st.line_chart(charting.decimate_frame(frame, minmax=minmax).astype(np.float32))
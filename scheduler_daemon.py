@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import argparse
+import traceback
+from datetime import datetime, timedelta, time as dtime
+from zoneinfo import ZoneInfo
+
+import kis_client
+import kis_trace
+import auto_trade
+import check_morning
+
+# -----------------------------------------------------------------------------
+# 상주 스케줄러 (장 마감 후 신호 -> 다음 장 시작에 주문 -> 주문 후 점검)
+# -----------------------------------------------------------------------------
+# 예전에는 morning_check.bat이 check_morning.py를 매번 새로 띄우고(input()에서 멈춤),
+# auto_trade.py는 손으로 실행했습니다.
+# 이 프로세스는 한 번 켜 두면 계속 살아 있으면서 정해진 시각(뉴욕 시간, 평일)에 작업을 실행합니다.
+# - signal (16:10): 장 마감 직후 (오늘 종가 포함) 일봉/200일선 갱신 + 토큰/거래소 캐시 예열, 내일 할 일 미리 출력
+# - trade  (09:35): auto_trade.main() - 캐시가 이미 데워져 있어서 바로 주문 경로로 들어감
+# - verify (09:50): check_morning.check() - 주문 결과 점검 (콘솔 입력을 기다리지 않음)
+# 파이썬/pandas/requests import, 토큰, 일봉, 거래소 정보는 프로세스 안에 계속 남아 있습니다.
+# 미국 공휴일은 따로 거르지 않습니다. (새 봉이 없고 주문은 거절되므로 그날은 아무 일도 없음)
+#
+# 실행: python scheduler_daemon.py             (상주 - start_scheduler.bat)
+#       python scheduler_daemon.py --once trade  (지금 한 번만)
+#       python scheduler_daemon.py --once verify (점검만 - morning_check.bat)
+#
+# 같은 계좌로 주문하는 프로세스가 둘 뜨지 않도록 잠금 파일(KIS_CACHE_DIR/scheduler.lock)을 잡습니다.
+# 상주 모드와 --once trade/signal은 잠금이 이미 잡혀 있으면 바로 종료합니다. (--once verify는 조회만 하므로 잠그지 않음)
+# 잠금은 OS 파일 잠금이라 프로세스가 죽으면 자동으로 풀립니다. (남은 파일을 지울 필요 없음)
+
+MARKET_TZ = ZoneInfo("America/New_York")
+JOBS = {
+    'signal': dtime(16, 10),
+    'trade': dtime(9, 35),
+    'verify': dtime(9, 50),
+}
+MAX_SLEEP = 60  # 긴 대기도 나눠서 (PC 절전/시계 변경 대응)
+LOCK_PATH = os.path.join(kis_client.TOKEN_DIR, "scheduler.lock")
+
+
+def log(message):
+    stamp = datetime.now(MARKET_TZ).strftime('%Y-%m-%d %H:%M:%S %Z')
+    print(f"[{stamp}] {message}", flush=True)
+
+
+def next_run(at, now):
+    """now 이후 가장 가까운 평일 at 시각 (뉴욕 시간)"""
+    day = now.date()
+    while True:
+        due = datetime.combine(day, at, tzinfo=MARKET_TZ)
+        if due > now and due.weekday() < 5:
+            return due
+        day += timedelta(days=1)
+
+
+def acquire_lock(path=LOCK_PATH):
+    """잠금 파일을 잡고 열린 파일을 돌려줌 (다른 프로세스가 잡고 있으면 None) - 프로세스가 끝날 때까지 닫지 않음"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    f = open(path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        try:
+            f.seek(0)
+            owner = f.read().strip()
+        except OSError:  # Windows: 잠긴 부분은 읽을 수도 없음
+            owner = ""
+        f.close()
+        log(f"⛔ 다른 스케줄러가 실행 중입니다 (pid {owner or '?'}, 잠금 {path}) - 종료합니다.")
+        return None
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+# -----------------------------------------------------------------------------
+# 작업
+# -----------------------------------------------------------------------------
+def run_signal():
+    """일봉/200일선 갱신 + 캐시 예열 (주문은 하지 않음)"""
+    client = auto_trade.get_client()
+    client.token()  # 만료가 가까우면 여기서 미리 갱신
+    close, ma200 = auto_trade.get_spy_ma200(client)
+    try:
+        check_morning.get_spy_ma200()  # 점검용 yfinance 일봉도 미리 갱신
+    except Exception as e:
+        log(f"⚠️ 점검용 일봉 갱신 실패 (점검 때 다시 시도): {e}")
+    for ticker in ("SPY", "UPRO"):
+        auto_trade.get_current_price(client, ticker)  # 거래소 캐시 확인
+    if close and ma200:
+        plan = "UPRO (상승장)" if close >= ma200 else "SPY (하락장)"
+        log(f"📌 다음 장 예정: {plan} | SPY 종가 ${close:.2f} / 200일선 ${ma200:.2f}")
+
+
+def run_trade():
+    auto_trade.main()
+
+
+def run_verify():
+    check_morning.check()
+
+
+RUNNERS = {'signal': run_signal, 'trade': run_trade, 'verify': run_verify}
+
+
+def run_job(name):
+    """작업 하나 실행 (예외가 나도 데몬은 계속)"""
+    log(f"▶️ {name} 시작")
+    kis_trace.start_run(name)
+    try:
+        RUNNERS[name]()
+    except Exception:
+        log(f"❌ {name} 오류\n{traceback.format_exc()}")
+    finally:
+        kis_trace.finish()
+    log(f"⏹️ {name} 끝")
+
+
+def run_forever():
+    log("🕰️ 스케줄러 시작 (뉴욕 시간 평일: " + ", ".join(f"{k} {v:%H:%M}" for k, v in JOBS.items()) + ")")
+    while True:
+        now = datetime.now(MARKET_TZ)
+        name, due = min(((k, next_run(at, now)) for k, at in JOBS.items()), key=lambda kv: kv[1])
+        log(f"⏳ 다음 작업: {name} @ {due:%Y-%m-%d %H:%M %Z}")
+        while True:
+            remaining = (due - datetime.now(MARKET_TZ)).total_seconds()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, MAX_SLEEP))
+        run_job(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="자동매매 상주 스케줄러")
+    parser.add_argument("--once", choices=sorted(RUNNERS), help="지금 한 작업만 실행하고 종료")
+    args = parser.parse_args()
+
+    lock = None
+    if args.once != 'verify':
+        lock = acquire_lock()
+        if lock is None:
+            return 1
+    if args.once:
+        run_job(args.once)
+        return 0
+    try:
+        run_forever()
+    except KeyboardInterrupt:
+        log("👋 스케줄러 종료")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+chcp 65001
+cd /d "C:\Users\sesyh\OneDrive\바탕 화면\STOCK BOT"
+rem 상주 스케줄러: 장 마감 후 신호 -> 다음 장 시작에 주문 -> 주문 후 점검
+rem 작업 스케줄러에 예전 morning_check.bat 작업이 있으면 지우고, 이 파일을 "로그온할 때" 한 번 실행하도록 등록하세요.
+rem (주문/점검은 이 프로세스가 정해진 시각에 직접 하므로 예전 작업이 남아 있으면 점검이 두 번 뜹니다)
+rem 이미 실행 중이면 잠금 파일(.cache\kis\scheduler.lock) 때문에 새로 띄운 쪽은 바로 종료됩니다.
+python scheduler_daemon.py
+pause
\ No newline at end of file
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 양도소득세 엔진 (매수 lot 단위 FIFO 매칭)
+# -----------------------------------------------------------------------------
+# 해외 주식/ETF 양도세는 "실제로 판 것"의 차익에만 붙습니다. (연간 손익 통산, 250만원 공제, 22%)
+# 자산 변동분으로 세금을 추정하면 평가이익에도 세금을 매기게 되므로,
+# 자산별 매수 lot(수량, 단가)을 배열로 들고 있다가 매도 시 먼저 산 것부터 매칭합니다.
+
+DEDUCTION = 2500000
+RATE = 0.22
+EPS = 1e-9
+
+
+class LotBook:
+    """자산별 매수 lot FIFO 장부 (수량/단가 배열 + 시작/끝 포인터)"""
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._qty = {}
+        self._cost = {}
+        self._head = {}
+        self._tail = {}
+        self._position = {}
+
+    def _ensure(self, asset):
+        if asset not in self._qty:
+            self._qty[asset] = np.zeros(self.capacity)
+            self._cost[asset] = np.zeros(self.capacity)
+            self._head[asset] = 0
+            self._tail[asset] = 0
+            self._position[asset] = 0.0
+
+    def _make_room(self, asset):
+        """끝까지 찼으면 앞쪽(이미 판 lot)을 당기고, 그래도 부족하면 두 배로 늘립니다."""
+        h, t = self._head[asset], self._tail[asset]
+        qty, cost = self._qty[asset], self._cost[asset]
+        n = t - h
+        size = len(qty) * 2 if n >= len(qty) // 2 else len(qty)
+
+        new_qty, new_cost = np.zeros(size), np.zeros(size)
+        new_qty[:n] = qty[h:t]
+        new_cost[:n] = cost[h:t]
+        self._qty[asset], self._cost[asset] = new_qty, new_cost
+        self._head[asset], self._tail[asset] = 0, n
+
+    def position(self, asset):
+        return self._position.get(asset, 0.0)
+
+    def held(self):
+        """수량이 남아 있는 자산 목록"""
+        return [a for a, q in self._position.items() if q > EPS]
+
+    def lots(self, asset):
+        """보유 lot (수량 배열, 단가 배열)"""
+        if asset not in self._qty:
+            return np.array([]), np.array([])
+        h, t = self._head[asset], self._tail[asset]
+        return self._qty[asset][h:t], self._cost[asset][h:t]
+
+    def buy(self, asset, qty, price):
+        if qty <= EPS:
+            return
+        self._ensure(asset)
+        if self._tail[asset] == len(self._qty[asset]):
+            self._make_room(asset)
+        t = self._tail[asset]
+        self._qty[asset][t] = qty
+        self._cost[asset][t] = price
+        self._tail[asset] = t + 1
+        self._position[asset] += qty
+
+    def sell(self, asset, qty, price):
+        """
+        먼저 산 lot부터 qty만큼 매도합니다.
+        반환: (실현 손익, 매도 원가)
+        """
+        if qty <= EPS or asset not in self._qty:
+            return 0.0, 0.0
+        h, t = self._head[asset], self._tail[asset]
+        q = self._qty[asset][h:t]
+        c = self._cost[asset][h:t]
+        if len(q) == 0:
+            return 0.0, 0.0
+
+        # 누적 수량에서 qty가 끝나는 lot 위치를 한 번에 찾습니다
+        cum = np.cumsum(q)
+        qty = min(qty, cum[-1])
+        k = int(np.searchsorted(cum, qty - EPS, side='left'))
+
+        basis = float(np.dot(q[:k], c[:k]))
+        taken = cum[k - 1] if k > 0 else 0.0
+        part = qty - taken
+        basis += part * c[k]
+        q[k] -= part
+        if q[k] <= EPS:
+            k += 1
+
+        self._head[asset] = h + k
+        self._position[asset] = max(self._position[asset] - qty, 0.0)
+        return qty * price - basis, basis
+
+
+class TaxEngine:
+    """리밸런싱 목표 금액으로 lot을 사고팔며 연도별 실현 손익과 세금을 계산합니다."""
+
+    def __init__(self, deduction=DEDUCTION, rate=RATE):
+        self.deduction = deduction
+        self.rate = rate
+        self.book = LotBook()
+        self._realized = {}
+        self._taxes = {}
+
+    def rebalance(self, date, prices, targets):
+        """
+        보유 금액을 targets(자산 -> 목표 금액)로 맞춥니다. 매도 먼저, 매수는 나중.
+        - prices: 자산 -> 가격 (dict 또는 Series)
+        targets에 없는 보유 자산은 전량 매도합니다.
+        """
+        year = pd.Timestamp(date).year
+        assets = set(targets) | set(self.book.held())
+
+        orders = []
+        for a in assets:
+            price = prices[a]
+            if not np.isfinite(price) or price <= 0:
+                continue
+            diff = targets.get(a, 0.0) / price - self.book.position(a)
+            orders.append((diff, a, price))
+
+        for diff, a, price in sorted(orders):
+            if diff < -EPS:
+                gain, _ = self.book.sell(a, -diff, price)
+                self._realized[year] = self._realized.get(year, 0.0) + gain
+            elif diff > EPS:
+                self.book.buy(a, diff, price)
+
+    def realized(self, year):
+        return self._realized.get(year, 0.0)
+
+    def tax_for(self, year):
+        """해당 연도 세금 (손익 통산 후 공제, 한 번만 계산해 기록)"""
+        taxable = max(0.0, self.realized(year) - self.deduction)
+        tax = taxable * self.rate
+        self._taxes[year] = tax
+        return tax
+
+    def yearly_frame(self):
+        """연도별 실현 손익 / 과세표준 / 세금 표"""
+        years = sorted(set(self._realized) | set(self._taxes))
+        gains = [self.realized(y) for y in years]
+        return pd.DataFrame({
+            'Realized_Gain': gains,
+            'Taxable': [max(0.0, g - self.deduction) for g in gains],
+            'Tax': [self._taxes.get(y, 0.0) for y in years],
+        }, index=pd.Index(years, name='Year'))
+
+
+def show_tax_table(table):
+    """연도별 양도세 내역 표시"""
+    import streamlit as st
+
+    if table is None or table.empty:
+        return
+    with st.expander("🧾 연도별 실현 손익 / 양도세 (FIFO)", expanded=False):
+        st.dataframe(table.style.format('{:,.0f}'))
@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# 투자 유니버스 편입 이력 (생존편향 보정용)
+# -----------------------------------------------------------------------------
+# 오늘 시가총액 상위 종목만으로 과거를 백테스트하면 "살아남은 종목"만 고르게 되어
+# 수익률이 과대평가됩니다. 여기서는 날짜 x 종목 편입 여부를 bool 비트맵으로 들고 있다가
+# 리밸런싱 시점마다 편입되지 않은 종목을 순위 계산에서 제외합니다.
+
+
+class MembershipBitmap:
+    """날짜 x 종목 편입 여부 비트맵"""
+
+    def __init__(self, dates, tickers, bits):
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = list(tickers)
+        self.bits = np.asarray(bits, dtype=bool)
+        self._col = {t: j for j, t in enumerate(self.tickers)}
+
+    @classmethod
+    def from_intervals(cls, intervals, dates):
+        """
+        편입 구간 테이블(Code, Start, End)로 비트맵을 만듭니다.
+        Start/End가 비어 있으면 전체 기간의 처음/끝으로 간주합니다.
+        """
+        dates = pd.DatetimeIndex(dates)
+        codes = intervals['Code'].astype(str)
+        tickers = list(dict.fromkeys(codes))
+        col = codes.map({t: j for j, t in enumerate(tickers)}).values
+
+        starts = pd.to_datetime(intervals['Start']).fillna(dates[0])
+        ends = pd.to_datetime(intervals['End']).fillna(dates[-1])
+        start_pos = dates.searchsorted(starts.values, side='left')
+        end_pos = dates.searchsorted(ends.values, side='right')
+
+        # 구간 시작 +1, 끝 다음날 -1 후 누적합 (구간 수와 무관하게 한 번에 계산)
+        delta = np.zeros((len(dates) + 1, len(tickers)), dtype=np.int32)
+        np.add.at(delta, (start_pos, col), 1)
+        np.add.at(delta, (end_pos, col), -1)
+        bits = np.cumsum(delta[:-1], axis=0) > 0
+        return cls(dates, tickers, bits)
+
+    def eligible(self, date):
+        """해당 날짜(또는 직전 거래일)에 편입된 종목 리스트"""
+        pos = self.dates.searchsorted(pd.Timestamp(date), side='right') - 1
+        if pos < 0:
+            return []
+        return [self.tickers[j] for j in np.flatnonzero(self.bits[pos])]
+
+    def aligned(self, index, columns):
+        """
+        가격 데이터프레임(index x columns)과 같은 모양의 bool 마스크를 만듭니다.
+        리밸런싱 루프에서는 이 배열의 한 행만 꺼내 쓰면 되므로 매번 정렬/조회할 필요가 없습니다.
+        비트맵에 없는 종목은 편입되지 않은 것으로 처리합니다.
+        """
+        rows = self.dates.searchsorted(pd.DatetimeIndex(index), side='right') - 1
+        cols = np.array([self._col.get(str(c), -1) for c in columns])
+
+        mask = np.zeros((len(rows), len(cols)), dtype=bool)
+        r_ok = rows >= 0
+        c_ok = cols >= 0
+        mask[np.ix_(r_ok, c_ok)] = self.bits[np.ix_(rows[r_ok], cols[c_ok])]
+        return mask
+
+    def mask(self, scores, date):
+        """점수 Series에서 해당 날짜에 편입되지 않은 종목을 제거합니다."""
+        keep = set(self.eligible(date))
+        return scores[[str(c) in keep for c in scores.index]]
+
+    def ranges(self):
+        """종목별 연속 편입 구간 [(시작일, 종료일), ...]"""
+        padded = np.zeros((len(self.dates) + 2, len(self.tickers)), dtype=np.int8)
+        padded[1:-1] = self.bits
+        d = np.diff(padded, axis=0)
+
+        # 열 우선으로 뽑아야 종목별로 시작/끝이 같은 순서로 나옵니다
+        s_col, s_row = np.nonzero(d.T == 1)
+        e_col, e_row = np.nonzero(d.T == -1)
+
+        out = {t: [] for t in self.tickers}
+        for j, rs, re_ in zip(s_col, s_row, e_row):
+            out[self.tickers[j]].append((self.dates[rs], self.dates[re_ - 1]))
+        return out
+
+
+# -----------------------------------------------------------------------------
+# 편입 구간 데이터 만들기
+# -----------------------------------------------------------------------------
+SURVIVORSHIP_NOTE = ("⚠️ 상장폐지 종목은 포함하지만, 현재 상장 종목은 **오늘 시가총액 상위 N개**로 고릅니다. "
+                     "과거 시점의 시총 순위는 쓰지 않으므로 '나중에 커진 종목'을 미리 아는 편향은 남아 있습니다.")
+
+
+def load_krx_intervals(market, start, codes=None):
+    """
+    KRX 상장/상장폐지 일자로 편입 구간 테이블을 만듭니다.
+    - market: 'KOSPI' / 'KOSDAQ'
+    - codes: 현재 상장 종목 중 포함할 코드 (None이면 시장 전체)
+    상장폐지 종목은 start 이후 상폐된 것을 모두 포함합니다.
+    과거 시점의 시가총액 순위는 없으므로, codes(오늘 시총 상위)로 거른 현재 종목은 그대로 남습니다.
+    (그 시점엔 상위가 아니었지만 나중에 커진 종목이 들어감 -> SURVIVORSHIP_NOTE)
+    """
+    import FinanceDataReader as fdr
+
+    start = pd.to_datetime(start)
+
+    listed = fdr.StockListing(f'{market}-DESC')
+    if 'Code' not in listed.columns and 'Symbol' in listed.columns:
+        listed['Code'] = listed['Symbol']
+    if codes is not None:
+        listed = listed[listed['Code'].isin(codes)]
+    listed = pd.DataFrame({
+        'Code': listed['Code'].astype(str),
+        'Name': listed.get('Name', listed['Code']),
+        'Start': pd.to_datetime(listed.get('ListingDate'), errors='coerce'),
+        'End': pd.NaT,
+        'Delisted': False,
+    })
+
+    try:
+        delisted = fdr.StockListing('KRX-DELISTING', start=start)
+        delisted = delisted[delisted['Market'].astype(str).str.upper().str.startswith(market)]
+        delisted = pd.DataFrame({
+            'Code': delisted['Symbol'].astype(str),
+            'Name': delisted['Name'],
+            'Start': delisted['ListingDate'],
+            'End': delisted['DelistingDate'],
+            'Delisted': True,
+        })
+    except Exception:
+        delisted = pd.DataFrame(columns=listed.columns)
+
+    intervals = pd.concat([listed, delisted], ignore_index=True)
+    intervals['Start'] = intervals['Start'].fillna(start).clip(lower=start)
+    return intervals.reset_index(drop=True)
+
+
+def load_membership_csv(path):
+    """
+    지수 편입 이력 CSV(Code, Start, End)를 읽습니다.
+    End가 비어 있으면 현재까지 편입된 종목입니다.
+    """
+    df = pd.read_csv(path, dtype={'Code': str})
+    df['Start'] = pd.to_datetime(df['Start'], errors='coerce')
+    df['End'] = pd.to_datetime(df.get('End'), errors='coerce')
+    if 'Delisted' not in df.columns:
+        df['Delisted'] = False
+    return df
+
+
+# -----------------------------------------------------------------------------
+# 편입 구간만 내려받기
+# -----------------------------------------------------------------------------
+def fetch_eligible_prices(bitmap, reader, lookback_months=0, on_progress=None, with_volume=False):
+    """
+    종목별로 편입되어 있던 구간만 다운로드해서 가격 데이터프레임을 만듭니다.
+    - reader(ticker, start, end): 종가 Series를 돌려주는 함수
+      (with_volume=True 이면 Close/Volume 컬럼이 있는 DataFrame을 돌려주고,
+       결과도 (가격, 거래량) 두 개를 돌려줍니다.)
+    - lookback_months: 모멘텀 계산을 위해 구간 시작보다 앞당겨 받을 개월 수
+    - on_progress(i, total, ticker): 진행 상황 콜백 (화면 표시용)
+    """
+    ranges = bitmap.ranges()
+    pad = pd.DateOffset(months=lookback_months)
+    all_prices = []
+    all_volumes = []
+    total = len(ranges)
+
+    for i, (ticker, spans) in enumerate(ranges.items()):
+        if on_progress:
+            on_progress(i, total, ticker)
+        if not spans:
+            continue
+
+        pieces = []
+        for s, e in spans:
+            try:
+                piece = reader(ticker, s - pad, e)
+                if piece is not None and len(piece) > 0:
+                    pieces.append(piece)
+            except Exception:
+                continue
+        if not pieces:
+            continue
+
+        series = pd.concat(pieces).sort_index()
+        series = series[~series.index.duplicated(keep='last')]
+        if with_volume:
+            all_volumes.append(series['Volume'].rename(ticker))
+            series = series['Close']
+        series.name = ticker
+        all_prices.append(series)
+
+    if not all_prices:
+        return (pd.DataFrame(), pd.DataFrame()) if with_volume else pd.DataFrame()
+    price_df = pd.concat(all_prices, axis=1).sort_index()
+    if with_volume:
+        return price_df, pd.concat(all_volumes, axis=1).sort_index()
+    return price_df